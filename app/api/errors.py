@@ -0,0 +1,47 @@
+"""
+Traducción de los errores de los servicios a respuestas HTTP, compartida por las rutas sync y async.
+"""
+
+from contextlib import contextmanager
+from fastapi import HTTPException, status
+from sqlalchemy.exc import OperationalError
+
+
+@contextmanager
+def service_errors(
+    db_detail: str = "Database error.",
+    internal_prefix: str = "Internal Server Error: ",
+    invalid_input: bool = True,
+):
+    """
+    Convierte las excepciones del bloque en HTTPException: ValueError -> 422 (si `invalid_input`),
+    OperationalError -> 500 con `db_detail` y cualquier otra -> 500 con el mensaje del error.
+    """
+    try:
+        yield
+    except HTTPException:
+        raise
+    except Exception as e:
+        if invalid_input and isinstance(e, ValueError):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        if isinstance(e, OperationalError):
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=db_detail)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"{internal_prefix}{str(e)}"
+        )
+
+
+@contextmanager
+def invalid_input_errors():
+    """ValueError del bloque (p. ej. un cursor inválido) -> 422."""
+    try:
+        yield
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(ve))
+
+
+def require_result(result, detail: str):
+    """404 si el servicio no devolvió datos."""
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    return result
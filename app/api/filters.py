@@ -0,0 +1,36 @@
+"""
+Parámetros de query para filtrar los endpoints analíticos.
+Los filtros se aplican en el WHERE de la consulta, antes de cargar datos.
+"""
+
+from fastapi import Query
+
+ROOMS_QUERY = Query(None, description="Only these rooms (repeat the parameter for several).")
+ARTICLES_QUERY = Query(None, description="Only these articles (repeat the parameter for several).")
+WEEKDAY_QUERY = Query(
+    None, pattern="^(monday|tuesday|wednesday|thursday|friday)$",
+    description="Only this weekday of the ranking.",
+)
+TOP_K_QUERY = Query(None, ge=1, description="Only the K best positions (per weekday in the ranking).")
+SINCE_QUERY = Query(
+    None, description="Only use history from this date (YYYY-MM-DD). Models are fitted on the fly.",
+)
+LOOKBACK_QUERY = Query(
+    None, ge=0,
+    description="Training window in days back from today, overriding TRAINING_LOOKBACK_DAYS "
+                "(0 = full history). Models are fitted on the fly.",
+)
+
+
+def filter_params(**filters) -> dict:
+    """Parámetros de filtro como clave de cache (listas como tuplas, fechas en ISO)."""
+    params = {}
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = tuple(value)
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        params[name] = value
+    return params
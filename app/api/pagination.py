@@ -0,0 +1,17 @@
+"""
+Parámetros de query comunes para paginar y elegir el formato de los endpoints analíticos.
+"""
+
+from fastapi import Query
+
+# Máximo de elementos por página
+MAX_PAGE_SIZE = 10000
+
+LIMIT_QUERY = Query(
+    None, ge=1, le=MAX_PAGE_SIZE, description="Page size. Without it the whole result is returned."
+)
+CURSOR_QUERY = Query(None, description="Cursor returned in the X-Next-Cursor header of the previous page.")
+FORMAT_QUERY = Query(
+    "json", alias="format", pattern="^(json|ndjson)$",
+    description="json (default) or ndjson (one object per line).",
+)
@@ -0,0 +1,114 @@
+"""
+Clases de respuesta y utilidades de paginación compartidas por las rutas.
+"""
+
+import base64
+import itertools
+import json
+from typing import Iterable, Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.core.metrics import STAGE_LATENCY
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el encoder estándar
+    orjson = None
+
+# Líneas NDJSON que se agrupan en cada chunk del stream
+NDJSON_CHUNK_LINES = 500
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Header con el cursor de la página siguiente (ausente en la última página)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def dumps(content) -> bytes:
+    """Serializa a JSON compacto en UTF-8 (orjson si está instalado)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class MeteredJSONResponse(JSONResponse):
+    """JSONResponse con orjson que registra el tiempo de serialización como etapa `response.render`."""
+
+    def render(self, content) -> bytes:
+        with STAGE_LATENCY.time(stage="response.render"):
+            return dumps(content)
+
+
+def ndjson_response(rows: Iterable, headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Respuesta NDJSON (un objeto JSON por línea) que se serializa por bloques a medida que se envía.
+    Las filas salen de un resultado ya calculado: no adelanta el primer byte, solo evita armar el cuerpo entero.
+    """
+
+    def stream():
+        lines = []
+        for row in rows:
+            lines.append(dumps(row))
+            if len(lines) >= NDJSON_CHUNK_LINES:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Posición codificada en el cursor (0 sin cursor). ValueError si es inválido."""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["offset"]
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor.")
+    return offset
+
+
+def page_bounds(total: int, limit: Optional[int], cursor: Optional[str]):
+    """
+    Rango [start, end) de la página pedida y el cursor de la siguiente (None si es la última).
+    Sin limit se devuelve todo desde el cursor.
+    """
+    start = min(decode_cursor(cursor), total)
+    end = total if limit is None else min(start + limit, total)
+    next_cursor = encode_cursor(end) if end < total else None
+    return start, end, next_cursor
+
+
+def cursor_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+
+def paginated_response(total: int, limit: Optional[int], cursor: Optional[str], output: str, page, rows):
+    """
+    Respuesta paginada sobre `total` elementos: `page(start, end)` arma el cuerpo JSON
+    y `rows(start, end)` los objetos NDJSON de la página. ValueError si el cursor es inválido.
+    """
+    start, end, next_cursor = page_bounds(total, limit, cursor)
+    headers = cursor_headers(next_cursor)
+
+    if output == "ndjson":
+        return ndjson_response(rows(start, end), headers)
+    return MeteredJSONResponse(page(start, end), headers=headers)
+
+
+def list_response(items: list, limit: Optional[int], cursor: Optional[str], output: str = "json"):
+    """Lista paginada: en JSON la página es una lista, en NDJSON una línea por elemento."""
+    return paginated_response(
+        len(items), limit, cursor, output,
+        page=lambda start, end: items[start:end],
+        rows=lambda start, end: itertools.islice(items, start, end),
+    )
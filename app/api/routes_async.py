@@ -0,0 +1,251 @@
+"""
+Versiones async de las rutas del microservicio (se registran con ASYNC_MODE=true).
+Los servicios son los mismos de las rutas sync y corren en el threadpool con una
+ThreadpoolSession: solo sus consultas pasan por la AsyncSession en el event loop,
+la decodificación, el ajuste de modelos y el armado de respuestas quedan fuera del loop.
+Los errores y las respuestas se arman con los mismos helpers que las rutas sync.
+"""
+
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.api.errors import service_errors
+from app.api.filters import ARTICLES_QUERY, LOOKBACK_QUERY, ROOMS_QUERY, SINCE_QUERY, TOP_K_QUERY, WEEKDAY_QUERY, filter_params
+from app.api.pagination import CURSOR_QUERY, FORMAT_QUERY, LIMIT_QUERY
+from app.api.routes_predict import room_result
+from app.api.routes_predict_ranking import ranking_errors, ranking_response
+from app.api.routes_seasonal import seasonal_errors, seasonal_response
+from app.api.routes_trending_resources import trending_errors, trending_response
+from app.core.cache import result_cache
+from app.core.config import settings
+from app.core.database import ThreadpoolSession, get_async_db
+from app.schemas.occupancy_ranking_schema import OccupancyRankingResponse
+from app.schemas.occupancy_schema import Occupancy
+from app.services.predict.hourly_occupancy_service import HourlyOccupancyService
+from app.services.predict.occupancy_ranking_service import OccupancyRankingService
+from app.services.predict.occupancy_service import OccupancyPredictionService
+from app.services.predict.seasonal_patterns_service import SeasonalPatternsService
+from app.services.predict.trending_resources_service import TrendingResourcesService
+
+router = APIRouter()
+
+
+async def in_threadpool(db: AsyncSession, compute):
+    """Ejecuta compute(session) en el threadpool; sus consultas vuelven al event loop."""
+    return await run_in_threadpool(compute, ThreadpoolSession(db))
+
+
+@router.get("/health", tags=["System"], summary="Check the status of the microservice")
+async def health_check():
+    """
+    System health check endpoint.
+    Returns basic information about the microservice's status, version, and environment.
+    """
+    return {
+        "status": "ok",
+        "app_name": settings.app_name,
+        "version": settings.app_version,
+        "environment": settings.env,
+    }
+
+
+@router.post(
+    "/occupancy",
+    tags=["Predictions"],
+    summary="Predicts the probability of a room being occupied",
+    responses={
+        404: {"description": "There is no historical data for the room."},
+        422: {"description": "Invalid data format."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def predict_occupancy(
+    request: Occupancy,
+    db: AsyncSession = Depends(get_async_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Predict the probability of a room being occupied between two dates
+    using historical data from reservation_history.
+    """
+    with service_errors():
+        result = await in_threadpool(
+            db,
+            lambda session: OccupancyPredictionService(session).predict_occupancy(
+                request.room_name, request.date_hour_start, request.date_hour_end, lookback_days
+            ),
+        )
+
+    return room_result(result, request.room_name)
+
+
+@router.post(
+    "/occupancy/batch",
+    tags=["Predictions"],
+    summary="Predicts the occupancy of several rooms and time windows in one call",
+    responses={
+        422: {"description": "Invalid data format."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def predict_occupancy_batch(
+    request: List[Occupancy],
+    db: AsyncSession = Depends(get_async_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Predict the occupancy probability for many (room, window) pairs.
+    The models of all requested rooms are loaded in a single query.
+    """
+    with service_errors():
+        return await in_threadpool(
+            db, lambda session: OccupancyPredictionService(session).predict_occupancy_batch(request, lookback_days)
+        )
+
+
+@router.post(
+    "/occupancy/hourly",
+    tags=["Predictions"],
+    summary="Predicts the occupancy of a room for each hourly slot of a time window",
+    responses={
+        404: {"description": "There is no historical data for the room."},
+        422: {"description": "Invalid data format or time window."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def predict_hourly_occupancy(
+    request: Occupancy,
+    db: AsyncSession = Depends(get_async_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Predict the probability of a room being occupied in each hourly slot of
+    `[date_hour_start, date_hour_end)`, within the training window or the last `lookback_days` days.
+    """
+    with service_errors():
+        result = await in_threadpool(
+            db,
+            lambda session: HourlyOccupancyService(session).predict_slots(
+                request.room_name, request.date_hour_start, request.date_hour_end, lookback_days
+            ),
+        )
+
+    return room_result(result, request.room_name)
+
+
+@router.get(
+    "/occupancy-ranking",
+    tags=["Predictions"],
+    summary="Predictive ranking of room occupancy by weekday",
+    response_model=OccupancyRankingResponse,
+    responses={
+        404: {"description": "No historical data found."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def get_occupancy_ranking(
+    db: AsyncSession = Depends(get_async_db),
+    rooms: Optional[List[str]] = ROOMS_QUERY,
+    weekday: Optional[str] = WEEKDAY_QUERY,
+    top_k: Optional[int] = TOP_K_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    output: str = FORMAT_QUERY,
+):
+    """
+    Generates a predictive ranking of room occupancy for the week (Monday to Friday).
+    Uses historical reservation data to estimate expected occupancy.
+    Supports `rooms`/`weekday`/`top_k`/`since`/`lookback_days` filters, `limit`/`cursor` pagination
+    and `format=ndjson` output.
+    """
+    with ranking_errors():
+        result = await result_cache.get_or_compute_async(
+            "occupancy-ranking",
+            filter_params(rooms=rooms, weekday=weekday, top_k=top_k, since=since, lookback_days=lookback_days),
+            lambda: in_threadpool(
+                db,
+                lambda session: OccupancyRankingService(session).predict_weekly_occupancy(
+                    rooms, weekday, top_k, since, lookback_days
+                ),
+            ),
+            db,
+        )
+
+    return ranking_response(result, limit, cursor, output)
+
+
+@router.get(
+    "/trending-resources",
+    tags=["Predictions"],
+    summary="Returns item usage trends",
+    responses={
+        404: {"description": "There is not enough historical data."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def get_trending_resources(
+    db: AsyncSession = Depends(get_async_db),
+    articles: Optional[List[str]] = ARTICLES_QUERY,
+    top_k: Optional[int] = TOP_K_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    output: str = FORMAT_QUERY,
+):
+    """
+    Returns item usage trends from reservation history.
+    If data is limited, use a simple comparison between the first and last records.
+    Supports `articles`/`top_k`/`since`/`lookback_days` filters, `limit`/`cursor` pagination
+    and `format=ndjson` output.
+    """
+    with trending_errors():
+        result = await result_cache.get_or_compute_async(
+            "trending-resources",
+            filter_params(articles=articles, top_k=top_k, since=since, lookback_days=lookback_days),
+            lambda: in_threadpool(
+                db,
+                lambda session: TrendingResourcesService(session).analyze_trending(
+                    articles, top_k, since, lookback_days
+                ),
+            ),
+            db,
+        )
+
+    return trending_response(result, limit, cursor, output)
+
+
+@router.get(
+    "/seasonal-patterns",
+    tags=["Predictions"],
+    summary="Analyze seasonal patterns of room usage",
+    responses={
+        404: {"description": "There is not enough historical data."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+async def get_seasonal_patterns(
+    db: AsyncSession = Depends(get_async_db),
+    rooms: Optional[List[str]] = ROOMS_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Detect recurring occupancy patterns (days of the week with the most and least reservations)
+    for each room. Supports `rooms`/`since`/`lookback_days` filters.
+    """
+    with seasonal_errors():
+        result = await result_cache.get_or_compute_async(
+            "seasonal-patterns",
+            filter_params(rooms=rooms, since=since, lookback_days=lookback_days),
+            lambda: in_threadpool(
+                db, lambda session: SeasonalPatternsService(session).analyze_patterns(rooms, since, lookback_days)
+            ),
+            db,
+        )
+
+    return seasonal_response(result)
@@ -0,0 +1,26 @@
+"""
+Ruta de métricas en formato de texto de Prometheus (/metrics).
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import render_metrics
+
+router = APIRouter()
+
+# Content-Type del formato de exposición de texto de Prometheus
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get(
+    "/metrics",
+    tags=["System"],
+    summary="Prometheus metrics",
+    response_class=PlainTextResponse,
+)
+def get_metrics():
+    """
+    Latency histograms per route and service stage, rows loaded, consumer throughput,
+    upsert latency and batch sizes, errors, pool checkout wait and cache hits.
+    """
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,20 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from app.core.database import SessionLocal
+from app.api.errors import require_result, service_errors
+from app.api.filters import LOOKBACK_QUERY
+from app.core.database import get_analytics_db
+from app.services.predict.hourly_occupancy_service import HourlyOccupancyService
 from app.services.predict.occupancy_service import OccupancyPredictionService
 from app.schemas.occupancy_schema import Occupancy
 
 router = APIRouter()
 
 
-# Dependencia de BD
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def room_result(result, room_name: str):
+    """La predicción de la sala, o 404 si no tiene historial."""
+    return require_result(result, f"There is no historical data for the room '{room_name}'")
 
 
 @router.post(
@@ -41,36 +40,105 @@ def get_db():
         500: {"description": "Internal Server Error."},
     },
 )
-def predict_occupancy(request: Occupancy, db: Session = Depends(get_db)):
+def predict_occupancy(
+    request: Occupancy,
+    db: Session = Depends(get_analytics_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
     """
     Predict the probability of a room being occupied between two dates
-    using historical data from reservation_history.
+    using historical data from reservation_history (within the training window).
     """
     service = OccupancyPredictionService(db)
 
-    try:
+    with service_errors():
         result = service.predict_occupancy(
-            request.room_name, request.date_hour_start, request.date_hour_end
-        )
-    except ValueError as ve:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(ve)
-        )
-    except OperationalError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database error.",
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Internal Server Error: {str(e)}",
+            request.room_name, request.date_hour_start, request.date_hour_end, lookback_days
         )
 
-    if result is None:
-        raise HTTPException(
-            status_code=404,
-            detail=f"There is no historical data for the room '{request.room_name}'",
+    return room_result(result, request.room_name)
+
+
+@router.post(
+    "/occupancy/batch",
+    tags=["Predictions"],
+    summary="Predicts the occupancy of several rooms and time windows in one call",
+    response_description="One prediction per requested item, in request order",
+    responses={
+        200: {
+            "description": "OK. Items that could not be predicted include an error message.",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"room": "sala1", "occupation_probability": 0.3, "trend": "low"},
+                        {"room": "sala9", "error": "There is no historical data for the room 'sala9'"},
+                    ]
+                }
+            },
+        },
+        422: {"description": "Invalid data format."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+def predict_occupancy_batch(
+    request: List[Occupancy],
+    db: Session = Depends(get_analytics_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Predict the occupancy probability for many (room, window) pairs.
+    The history of all requested rooms is loaded in a single query and each room is fitted once.
+    """
+    service = OccupancyPredictionService(db)
+
+    with service_errors():
+        return service.predict_occupancy_batch(request, lookback_days)
+
+
+@router.post(
+    "/occupancy/hourly",
+    tags=["Predictions"],
+    summary="Predicts the occupancy of a room for each hourly slot of a time window",
+    response_description="Prediction for the whole window and for each hourly slot",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "room": "sala1",
+                        "occupation_probability": 0.5,
+                        "peak_probability": 0.75,
+                        "trend": "medium",
+                        "slots": [
+                            {"start": "2025-10-20T14:00:00", "occupation_probability": 0.75},
+                            {"start": "2025-10-20T15:00:00", "occupation_probability": 0.25},
+                        ],
+                    }
+                }
+            },
+        },
+        404: {"description": "There is no historical data for the room."},
+        422: {"description": "Invalid data format or time window."},
+        500: {"description": "Internal Server Error."},
+    },
+)
+def predict_hourly_occupancy(
+    request: Occupancy,
+    db: Session = Depends(get_analytics_db),
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
+    """
+    Predict the probability of a room being occupied in each hourly slot of
+    `[date_hour_start, date_hour_end)`, from how often that weekday and hour was
+    occupied in the reservation history (within the training window, or the last
+    `lookback_days` days).
+    """
+    service = HourlyOccupancyService(db)
+
+    with service_errors():
+        result = service.predict_slots(
+            request.room_name, request.date_hour_start, request.date_hour_end, lookback_days
         )
 
-    return result
\ No newline at end of file
+    return room_result(result, request.room_name)
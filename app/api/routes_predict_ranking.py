@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from app.core.database import SessionLocal
+from app.api.errors import invalid_input_errors, require_result, service_errors
+from app.api.filters import LOOKBACK_QUERY, ROOMS_QUERY, SINCE_QUERY, TOP_K_QUERY, WEEKDAY_QUERY, filter_params
+from app.api.pagination import CURSOR_QUERY, FORMAT_QUERY, LIMIT_QUERY
+from app.api.responses import paginated_response
+from app.core.cache import result_cache
+from app.core.database import get_analytics_db
 from app.services.predict.occupancy_ranking_service import OccupancyRankingService
 from app.schemas.occupancy_ranking_schema import OccupancyRankingResponse
 
 router = APIRouter()
 
 
-# Dependencia de BD
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def ranking_errors():
+    return service_errors("Database connection error.", invalid_input=False)
+
+
+def ranking_response(result, limit, cursor, output):
+    """La página pedida del ranking (JSON o NDJSON), o 404 si no hay historial."""
+    require_result(result, "No historical reservation data available.")
+    with invalid_input_errors():
+        return paginated_response(
+            OccupancyRankingService.ranking_size(result), limit, cursor, output,
+            page=lambda start, end: OccupancyRankingService.ranking_page(result, start, end),
+            rows=lambda start, end: OccupancyRankingService.ranking_rows(result, start, end),
+        )
 
 
 @router.get(
@@ -35,29 +47,34 @@ def get_db():
         },
     },
 )
-def get_occupancy_ranking(db: Session = Depends(get_db)):
+def get_occupancy_ranking(
+    db: Session = Depends(get_analytics_db),
+    rooms: Optional[List[str]] = ROOMS_QUERY,
+    weekday: Optional[str] = WEEKDAY_QUERY,
+    top_k: Optional[int] = TOP_K_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    output: str = FORMAT_QUERY,
+):
     """
     Generates a predictive ranking of room occupancy for the week (Monday to Friday).
     Uses historical reservation data to estimate expected occupancy.
+
+    `rooms`, `weekday`, `top_k`, `since` and `lookback_days` narrow the ranking; rooms
+    and dates are filtered in the database query. With `limit`, each weekday list is cut to that many positions and the
+    `X-Next-Cursor` header carries the cursor of the next page.
+    `format=ndjson` returns one `{"day", "room", "expected_occupancy"}` object per line.
     """
     service = OccupancyRankingService(db)
 
-    try:
-        result = service.predict_weekly_occupancy()
-    except OperationalError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database connection error.",
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Internal Server Error: {str(e)}",
-        )
-
-    if result is None:
-        raise HTTPException(
-            status_code=404, detail="No historical reservation data available."
+    with ranking_errors():
+        result = result_cache.get_or_compute(
+            "occupancy-ranking",
+            filter_params(rooms=rooms, weekday=weekday, top_k=top_k, since=since, lookback_days=lookback_days),
+            lambda: service.predict_weekly_occupancy(rooms, weekday, top_k, since, lookback_days),
+            db,
         )
 
-    return result
\ No newline at end of file
+    return ranking_response(result, limit, cursor, output)
@@ -0,0 +1,80 @@
+"""
+Rutas de ingesta de reservas.
+POST /reservations/bulk recibe NDJSON (un ReservationCreate por línea) en streaming.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.bulk_ingest_service import BulkIngestService, IngestReport
+
+router = APIRouter()
+
+
+def _ingest_lines(db: Session, lines, first_line: int, report: IngestReport):
+    """Valida y guarda un lote de líneas; devuelve el error si el lote no se pudo guardar."""
+    reservations = BulkIngestService.validate_json_lines(lines, first_line, report)
+    return BulkIngestService.store(db, reservations, report)
+
+
+@router.post(
+    "/reservations/bulk",
+    tags=["Reservations"],
+    summary="Bulk upsert of reservations from an NDJSON body",
+    responses={
+        200: {
+            "description": "Reservations stored. Invalid lines are skipped and reported.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "received": 3,
+                        "stored": 2,
+                        "invalid": 1,
+                        "errors": [{"line": 2, "error": "room_name: Field required"}],
+                    }
+                }
+            },
+        },
+        500: {"description": "A batch could not be stored; earlier batches were committed."},
+    },
+)
+async def bulk_ingest(request: Request, db: Session = Depends(get_db)):
+    """
+    Reads the body as NDJSON (one reservation per line, `application/x-ndjson`) while it
+    arrives and stores it in batches of BULK_INGEST_BATCH_SIZE, one transaction per batch.
+    Existing reservations are updated (upsert by reservation_id).
+    """
+    batch_size = max(settings.bulk_ingest_batch_size, 1)
+    report = IngestReport()
+    lines, pending = [], b""
+    first_line = 1
+
+    async def flush(batch):
+        nonlocal first_line
+        error = await run_in_threadpool(_ingest_lines, db, batch, first_line, report)
+        if error is not None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=(
+                    f"Batch starting at line {first_line} could not be stored: {error}. "
+                    f"{report.stored} reservations were stored before it."
+                ),
+            )
+        first_line += len(batch)
+
+    async for chunk in request.stream():
+        # La última línea puede estar incompleta hasta el próximo chunk
+        *complete, pending = (pending + chunk).split(b"\n")
+        lines.extend(complete)
+        while len(lines) >= batch_size:
+            await flush(lines[:batch_size])
+            del lines[:batch_size]
+
+    if pending:
+        lines.append(pending)
+    if lines:
+        await flush(lines)
+
+    return report.as_dict()
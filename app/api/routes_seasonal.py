@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from app.core.database import SessionLocal
+from app.api.errors import require_result, service_errors
+from app.api.filters import LOOKBACK_QUERY, ROOMS_QUERY, SINCE_QUERY, filter_params
+from app.core.cache import result_cache
+from app.core.database import get_analytics_db
 from app.services.predict.seasonal_patterns_service import SeasonalPatternsService
 
 router = APIRouter()
 
 
-# Dependencia de BD
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def seasonal_errors():
+    return service_errors("Database connection error.", internal_prefix="", invalid_input=False)
+
+
+def seasonal_response(result):
+    """Los patrones por sala, o 404 si no hay historial."""
+    return require_result(result, "No historical data found.")
 
 
 @router.get(
@@ -40,27 +44,25 @@ def get_db():
         },
     },
 )
-def get_seasonal_patterns(db: Session = Depends(get_db)):
+def get_seasonal_patterns(
+    db: Session = Depends(get_analytics_db),
+    rooms: Optional[List[str]] = ROOMS_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+):
     """
     Detect recurring occupancy patterns (days of the week with the most and least reservations)
     for each room.
 
+    `rooms`, `since` and `lookback_days` are filtered in the database query.
     """
-    try:
+    with seasonal_errors():
         service = SeasonalPatternsService(db)
-        result = service.analyze_patterns()
-    except OperationalError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database connection error."
+        result = result_cache.get_or_compute(
+            "seasonal-patterns",
+            filter_params(rooms=rooms, since=since, lookback_days=lookback_days),
+            lambda: service.analyze_patterns(rooms, since, lookback_days),
+            db,
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
-
-    if not result:
-        raise HTTPException(status_code=404, detail="No historical data found.")
 
-    return result
\ No newline at end of file
+    return seasonal_response(result)
@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from app.core.database import SessionLocal
+from app.api.errors import invalid_input_errors, require_result, service_errors
+from app.api.filters import ARTICLES_QUERY, LOOKBACK_QUERY, SINCE_QUERY, TOP_K_QUERY, filter_params
+from app.api.pagination import CURSOR_QUERY, FORMAT_QUERY, LIMIT_QUERY
+from app.api.responses import list_response
+from app.core.cache import result_cache
+from app.core.database import get_analytics_db
 from app.services.predict.trending_resources_service import TrendingResourcesService
 
 router = APIRouter()
 
-# Dependencia de BD
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+def trending_errors():
+    return service_errors("Database connection error.", internal_prefix="", invalid_input=False)
+
+
+def trending_response(result, limit, cursor, output):
+    """La página pedida de tendencias (JSON o NDJSON), o 404 si no hay historial."""
+    require_result(result, "No historical data found.")
+    with invalid_input_errors():
+        return list_response(result, limit, cursor, output)
 
 @router.get(
     "/trending-resources",
@@ -39,26 +47,31 @@ def get_db():
         },
     },
 )
-def get_trending_resources(db: Session = Depends(get_db)):
+def get_trending_resources(
+    db: Session = Depends(get_analytics_db),
+    articles: Optional[List[str]] = ARTICLES_QUERY,
+    top_k: Optional[int] = TOP_K_QUERY,
+    since: Optional[date] = SINCE_QUERY,
+    lookback_days: Optional[int] = LOOKBACK_QUERY,
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    output: str = FORMAT_QUERY,
+):
     """
     Returns item usage trends from reservation history.
     If data is limited, use a simple comparison between the first and last records.
+
+    `articles`, `top_k`, `since` and `lookback_days` narrow the result; articles and
+    dates are filtered in the database query. With `limit`, the list is paginated and the `X-Next-Cursor` header carries the
+    cursor of the next page. `format=ndjson` returns one article per line.
     """
-    try:
+    with trending_errors():
         service = TrendingResourcesService(db)
-        result = service.analyze_trending()
-    except OperationalError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database connection error."
+        result = result_cache.get_or_compute(
+            "trending-resources",
+            filter_params(articles=articles, top_k=top_k, since=since, lookback_days=lookback_days),
+            lambda: service.analyze_trending(articles, top_k, since, lookback_days),
+            db,
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
-
-    if not result:
-        raise HTTPException(status_code=404, detail="No historical data found.")
 
-    return result
\ No newline at end of file
+    return trending_response(result, limit, cursor, output)
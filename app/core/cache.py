@@ -0,0 +1,244 @@
+"""
+Caché en proceso de resultados de los endpoints analíticos.
+Las entradas se invalidan por TTL y por una versión de datos guardada en la base (tabla
+data_versions), que se incrementa en la misma transacción de cada escritura: así una
+escritura de cualquier proceso (otro worker, el consumer, el backfill) invalida las cachés
+de todos.
+También la caché de idempotencia de la ingesta (hash del último contenido guardado por reserva).
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import ERRORS, REGISTRY, CallbackMetric
+from app.schemas.data_version_schema import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# La versión es la suma de los contadores de todas las filas
+_VERSION_QUERY = select(func.coalesce(func.sum(DataVersion.version), 0))
+
+
+def bump_data_version(db: Session):
+    """
+    Marca que los datos cambiaron, dentro de la transacción de la escritura (llamar antes del commit).
+    El contador está repartido en DATA_VERSION_SHARDS filas y cada transacción incrementa una al
+    azar: las escrituras concurrentes no esperan todas por la misma fila.
+    """
+    table = DataVersion.__table__
+    shard = random.randrange(settings.data_version_shards) + 1
+    result = db.execute(update(table).where(table.c.id == shard).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        db.execute(insert(table).values(id=shard, version=1))
+
+
+def commit_data_version(db: Session):
+    """
+    Incrementa la versión en una transacción propia, para trabajos que ya confirmaron sus cambios
+    en varias transacciones (reentrenamiento de modelos).
+    """
+    try:
+        bump_data_version(db)
+        db.commit()
+    except Exception as e:
+        # Los datos ya están confirmados: las entradas cacheadas vencen por TTL
+        db.rollback()
+        ERRORS.inc(component="data_version")
+        logger.error(f"Error bumping data version: {e}")
+
+
+def ensure_data_version_shards(db: Session):
+    """Crea las filas del contador que falten (al iniciar), así la ingesta solo las actualiza."""
+    table = DataVersion.__table__
+    existing = set(db.execute(select(table.c.id)).scalars())
+    missing = [
+        {"id": shard, "version": 0}
+        for shard in range(1, settings.data_version_shards + 1)
+        if shard not in existing
+    ]
+    try:
+        if missing:
+            db.execute(insert(table), missing)
+        db.commit()
+    except IntegrityError:
+        # Otro proceso las creó al mismo tiempo
+        db.rollback()
+
+
+def get_data_version(db: Session) -> int:
+    return int(db.execute(_VERSION_QUERY).scalar())
+
+
+async def get_data_version_async(db) -> int:
+    return int((await db.execute(_VERSION_QUERY)).scalar())
+
+
+class ResultCache:
+    """
+    Caché LRU acotada por cantidad de entradas, con TTL por entrada.
+    La clave es (endpoint, parámetros); una entrada calculada con una versión
+    de datos anterior se considera vencida.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(endpoint: str, params):
+        return (endpoint, tuple(sorted((params or {}).items())))
+
+    def _enabled(self):
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def _lookup(self, key, version):
+        """Devuelve (True, valor) si hay una entrada vigente para la versión actual."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires_at, value = entry
+                if entry_version == version and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+        return False, None
+
+    def _store(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, endpoint: str, params, compute, db: Session):
+        """
+        Devuelve el resultado cacheado o lo calcula con `compute()` y lo guarda.
+        La versión de datos se lee con `db`, la misma sesión con la que se calcula el resultado.
+        """
+        if not self._enabled():
+            return compute()
+
+        key = self._key(endpoint, params)
+        version = get_data_version(db)
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+
+        # Se calcula fuera del lock para no bloquear otros endpoints
+        value = compute()
+        self._store(key, version, value)
+        return value
+
+    async def get_or_compute_async(self, endpoint: str, params, compute, db):
+        """Igual que get_or_compute, pero `compute()` es una corrutina y `db` una AsyncSession."""
+        if not self._enabled():
+            return await compute()
+
+        key = self._key(endpoint, params)
+        version = await get_data_version_async(db)
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+
+        value = await compute()
+        self._store(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+result_cache = ResultCache(settings.result_cache_ttl_seconds, settings.result_cache_max_entries)
+
+REGISTRY.register(CallbackMetric(
+    "result_cache_requests_total", "Result cache lookups by outcome.", "counter",
+    lambda: [({"result": "hit"}, result_cache.hits), ({"result": "miss"}, result_cache.misses)],
+))
+
+
+class IdempotencyCache:
+    """
+    LRU acotada reservation_id -> hash del contenido guardado por última vez, con TTL opcional.
+    Se llena con cada escritura confirmada y con las filas que la ingesta ya leyó de la base;
+    el TTL acota cuánto puede quedar desactualizada si otro proceso escribe la misma reserva.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.changed = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.max_entries > 0
+
+    def matches(self, reservation_id: int, content_hash: bytes) -> bool:
+        """True si el último contenido guardado de la reserva tiene el mismo hash."""
+        if not self.enabled():
+            return False
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(reservation_id)
+            if entry is None or (self.ttl_seconds > 0 and entry[1] <= now):
+                self._entries.pop(reservation_id, None)
+                self.misses += 1
+                return False
+            if entry[0] != content_hash:
+                self.changed += 1
+                return False
+            self._entries.move_to_end(reservation_id)
+            self.hits += 1
+            return True
+
+    def remember(self, hashes):
+        """Registra el contenido guardado (dict reservation_id -> hash)."""
+        if not self.enabled() or not hashes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for reservation_id, content_hash in hashes.items():
+                self._entries[reservation_id] = (content_hash, expires_at)
+                self._entries.move_to_end(reservation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+idempotency_cache = IdempotencyCache(settings.idempotency_cache_max_entries, settings.idempotency_cache_ttl_seconds)
+
+REGISTRY.register(CallbackMetric(
+    "idempotency_cache_requests_total",
+    "Ingest idempotency cache lookups: hit (unchanged, no DB access), changed or miss.", "counter",
+    lambda: [
+        ({"result": "hit"}, idempotency_cache.hits),
+        ({"result": "changed"}, idempotency_cache.changed),
+        ({"result": "miss"}, idempotency_cache.misses),
+    ],
+))
+REGISTRY.register(CallbackMetric(
+    "idempotency_cache_entries", "Reservations in the ingest idempotency cache.", "gauge",
+    lambda: [({}, len(idempotency_cache))],
+))
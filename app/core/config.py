@@ -14,7 +14,88 @@ class Settings(BaseSettings):
     app_version: str = os.getenv("APP_VERSION", "1.0.0")
     database_url: str = os.getenv("DATABASE_URL", "")
     admin_database_url: str = os.getenv("ADMIN_DATABASE_URL", "")
+    # Base de solo lectura para las consultas analíticas (réplica); vacío = DATABASE_URL
+    analytics_database_url: str = os.getenv("ANALYTICS_DATABASE_URL", "")
+
+    # Pool de conexiones
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+    # Modo async: rutas async def con AsyncSession (p. ej. sqlite+aiosqlite:// o mysql+aiomysql://)
+    async_mode: bool = os.getenv("ASYNC_MODE", "false").lower() in ("1", "true", "yes")
+    async_database_url: str = os.getenv("ASYNC_DATABASE_URL", "")
     env: str = os.getenv("ENV", "development")
     external_api_url: str = os.getenv("EXTERNAL_API_URL", "https://api-reservas-demo.com")
 
+    # Logging: nivel, formato ("text" o "json") y muestreo de los eventos por mensaje (1 de cada N)
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "text")
+    log_sample_every: int = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+    # Modo debug del consumer: muestra cada mensaje recibido y su resultado por stdout
+    consumer_debug: bool = os.getenv("CONSUMER_DEBUG", "false").lower() in ("1", "true", "yes")
+
+    # RabbitMQ (con RABBITMQ_ENABLED=false no se inicia el consumer)
+    rabbitmq_enabled: bool = os.getenv("RABBITMQ_ENABLED", "true").lower() in ("1", "true", "yes")
+    rabbitmq_host: str = os.getenv("RABBITMQ_HOST", "localhost")
+    rabbitmq_port: int = int(os.getenv("RABBITMQ_PORT", "5672"))
+    rabbitmq_user: str = os.getenv("RABBITMQ_USER", "admin")
+    rabbitmq_password: str = os.getenv("RABBITMQ_PASSWORD", "admin")
+    rabbitmq_queue: str = os.getenv("RABBITMQ_QUEUE", "reservations")
+    # "single": un commit por mensaje | "batch": upsert masivo por lote
+    rabbitmq_consumer_mode: str = os.getenv("RABBITMQ_CONSUMER_MODE", "single")
+    rabbitmq_prefetch_count: int = int(os.getenv("RABBITMQ_PREFETCH_COUNT", "1000"))
+    rabbitmq_batch_size: int = int(os.getenv("RABBITMQ_BATCH_SIZE", "500"))
+    rabbitmq_batch_max_linger_ms: int = int(os.getenv("RABBITMQ_BATCH_MAX_LINGER_MS", "200"))
+    # Workers en paralelo (reparto por reservation_id) y tamaño de la cola de cada uno
+    rabbitmq_workers: int = int(os.getenv("RABBITMQ_WORKERS", "1"))
+    rabbitmq_worker_queue_size: int = int(os.getenv("RABBITMQ_WORKER_QUEUE_SIZE", "1000"))
+    # Escrituras fallidas: los errores transitorios de la base se reencolan con backoff exponencial
+    # por worker; los demás van a la cola de dead-letter para revisarlos y reenviarlos
+    rabbitmq_retry_backoff_ms: int = int(os.getenv("RABBITMQ_RETRY_BACKOFF_MS", "500"))
+    rabbitmq_retry_backoff_max_ms: int = int(os.getenv("RABBITMQ_RETRY_BACKOFF_MAX_MS", "30000"))
+    rabbitmq_dead_letter_queue: str = os.getenv(
+        "RABBITMQ_DEAD_LETTER_QUEUE", os.getenv("RABBITMQ_QUEUE", "reservations") + ".dead-letter"
+    )
+
+    # Caché de resultados analíticos (TTL 0 la desactiva)
+    result_cache_ttl_seconds: float = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+    result_cache_max_entries: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+    # Filas entre las que se reparte el contador de versión de datos (menos contención al escribir)
+    data_version_shards: int = max(1, int(os.getenv("DATA_VERSION_SHARDS", "16")))
+
+    # Caché de idempotencia de la ingesta: reservation_id -> hash del último contenido guardado
+    # (0 entradas la desactiva; el TTL acota lo desactualizada que puede quedar con varios procesos)
+    idempotency_cache_max_entries: int = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "100000"))
+    idempotency_cache_ttl_seconds: float = float(os.getenv("IDEMPOTENCY_CACHE_TTL_SECONDS", "600"))
+
+    # Reentrenamiento en segundo plano de los modelos por sala/artículo
+    # (0 = se reentrenan en línea, después de cada commit del consumer)
+    model_refresh_interval_seconds: float = float(os.getenv("MODEL_REFRESH_INTERVAL_SECONDS", "30"))
+    # Ventana de entrenamiento en días hacia atrás desde hoy (0 = todo el historial)
+    training_lookback_days: int = int(os.getenv("TRAINING_LOOKBACK_DAYS", "0"))
+    # Recarga periódica del cubo de ocupación horaria en memoria (0 = solo deltas locales)
+    hourly_cube_reload_seconds: float = float(os.getenv("HOURLY_CUBE_RELOAD_SECONDS", "300"))
+
+    # Retención del historial crudo: las reservas con más de RETENTION_DAYS (0 = sin límite)
+    # se quitan de reservation_history; sus conteos quedan en los rollups.
+    # "archive": se mueven a reservation_history_archive | "delete": se borran
+    retention_days: int = int(os.getenv("RETENTION_DAYS", "0"))
+    retention_mode: str = os.getenv("RETENTION_MODE", "archive")
+    retention_batch_size: int = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+    retention_interval_seconds: float = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+    # MySQL: particionar el archivo por mes de date_hour_start
+    retention_partition_archive: bool = os.getenv("RETENTION_PARTITION_ARCHIVE", "false").lower() in ("1", "true", "yes")
+
+    # Reservas por transacción en la carga masiva (CLI de backfill y POST /reservations/bulk)
+    bulk_ingest_batch_size: int = int(os.getenv("BULK_INGEST_BATCH_SIZE", "1000"))
+
+    # Snapshot columnar del historial mapeado en memoria (vacío = los servicios leen la base)
+    history_snapshot_dir: str = os.getenv("HISTORY_SNAPSHOT_DIR", "")
+    # Sin agregados ni reconstrucciones en este tiempo el snapshot se considera desactualizado
+    history_snapshot_max_age_seconds: float = float(os.getenv("HISTORY_SNAPSHOT_MAX_AGE_SECONDS", "7200"))
+    history_snapshot_rebuild_seconds: float = float(os.getenv("HISTORY_SNAPSHOT_REBUILD_SECONDS", "3600"))
+
 settings = Settings()
\ No newline at end of file
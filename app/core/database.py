@@ -1,14 +1,20 @@
-from sqlalchemy import create_engine, text
+import fcntl
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from anyio import from_thread
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.engine import make_url
-import pymysql
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 from app.core.config import settings
+from app.core.metrics import ERRORS, POOL_CHECKOUT_WAIT, REGISTRY, CallbackMetric
 
 Base = declarative_base()
 
 def ensure_database_exists():
-    """Crea la base de datos MySQL si no existe."""
+    """Crea la base de datos MySQL si no existe (otros motores no requieren acceso admin)."""
     db_url = settings.database_url
     admin_url = settings.admin_database_url
 
@@ -18,6 +24,9 @@ def ensure_database_exists():
     try:
         parsed = make_url(db_url)
         db_name = parsed.database
+        if parsed.get_backend_name() != "mysql":
+            # SQLite crea el archivo al conectar; PostgreSQL se provisiona aparte
+            return
         if not db_name:
             raise RuntimeError("Could not extract database name from DATABASE_URL")
     except Exception as e:
@@ -47,17 +56,344 @@ def ensure_database_exists():
         print("Error connecting to MySQL (admin):", e)
         raise
 
+def is_transient_error(error: Exception) -> bool:
+    """
+    Errores de la base que pueden resolverse solos (conexión caída, timeout del pool,
+    deadlock o lock wait): reintentar la misma escritura más tarde tiene sentido.
+    """
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+def engine_options(url: str):
+    """Opciones de pool configurables desde Settings."""
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    # SQLite usa pools propios (un archivo local o memoria): no se dimensionan
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return options
+
 def get_engine():
     ensure_database_exists()
-    return create_engine(settings.database_url, echo=False, future=True)
+    return create_engine(
+        settings.database_url, echo=False, future=True, **engine_options(settings.database_url)
+    )
+
+def get_analytics_engine():
+    """Engine de lectura para los servicios de predicción (réplica opcional)."""
+    if not settings.analytics_database_url:
+        return engine
+    return create_engine(
+        settings.analytics_database_url,
+        echo=False,
+        future=True,
+        **engine_options(settings.analytics_database_url),
+    )
+
+# Los engines se crean en configure_database() (hook de arranque), no al importar el módulo:
+# así la app se puede importar sin una base alcanzable
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# Lecturas analíticas: misma base que la ingesta salvo que se configure una réplica
+analytics_engine = None
+AnalyticsSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+_configure_lock = threading.Lock()
+
+
+def configure_database():
+    """Crea los engines y vincula SessionLocal/AnalyticsSessionLocal (idempotente)."""
+    global engine, analytics_engine
+    if engine is None:
+        with _configure_lock:
+            if engine is None:
+                engine = get_engine()
+                analytics_engine = get_analytics_engine()
+                SessionLocal.configure(bind=engine)
+                AnalyticsSessionLocal.configure(bind=analytics_engine)
+    return engine
+
+
+def dispose_database():
+    """Cierra las conexiones de los pools (apagado de la app)."""
+    for eng in {id(e): e for e in (engine, analytics_engine) if e is not None}.values():
+        eng.dispose()
+
+
+def _open_session(session_factory, engine_name: str):
+    """Abre la sesión y toma la conexión del pool midiendo la espera."""
+    configure_database()
+    db = session_factory()
+    started = time.perf_counter()
+    try:
+        db.connection()
+    except OperationalError:
+        # La ruta vuelve a intentarlo al consultar y responde con su propio error
+        ERRORS.inc(component="db_connect")
+    else:
+        POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, engine=engine_name)
+    return db
+
+
+def _pool_status():
+    if engine is None:
+        return
+    engines = {"primary": engine}
+    if analytics_engine is not engine:
+        engines["analytics"] = analytics_engine
+    for name, eng in engines.items():
+        pool = eng.pool
+        if hasattr(pool, "checkedout"):
+            yield {"engine": name, "state": "checked_out"}, pool.checkedout()
+            yield {"engine": name, "state": "idle"}, pool.checkedin()
+
+
+REGISTRY.register(CallbackMetric(
+    "db_pool_connections", "Pooled connections by state.", "gauge", lambda: list(_pool_status()),
+))
+
+
+@contextmanager
+def job_lock(name: str):
+    """
+    Lock con nombre para que un trabajo periódico (retención, refresco de modelos) corra en
+    un solo proceso a la vez aunque lo inicien todos los workers de la API y el consumer.
+    No espera: entrega True si se obtuvo y False si otro proceso lo tiene.
+    MySQL usa GET_LOCK y PostgreSQL pg_try_advisory_lock, sobre una conexión propia que
+    lo retiene hasta salir del bloque; SQLite, un flock sobre un archivo junto a la base.
+    """
+    eng = configure_database()
+    dialect = eng.dialect.name
+
+    if dialect in ("mysql", "postgresql"):
+        if dialect == "mysql":
+            acquire = text("SELECT GET_LOCK(:name, 0)").bindparams(name=name)
+            release = text("SELECT RELEASE_LOCK(:name)").bindparams(name=name)
+        else:
+            key = zlib.crc32(name.encode())
+            acquire = text("SELECT pg_try_advisory_lock(:key)").bindparams(key=key)
+            release = text("SELECT pg_advisory_unlock(:key)").bindparams(key=key)
+
+        with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            acquired = bool(conn.execute(acquire).scalar())
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(release)
+        return
+
+    database = eng.url.database
+    if dialect != "sqlite" or not database or database == ":memory:":
+        # Base de un solo proceso (o sin lock con nombre disponible)
+        yield True
+        return
+
+    with open(f"{database}.{name}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_db():
+    """Dependencia de BD (base primaria, lectura y escritura)."""
+    db = _open_session(SessionLocal, "primary")
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_analytics_db():
+    """Dependencia de BD para las consultas analíticas (réplica si está configurada)."""
+    db = _open_session(AnalyticsSessionLocal, "analytics")
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Drivers async equivalentes a los drivers sync soportados
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+}
 
-# Crear engine y SessionLocal después de validar configuración
-engine = get_engine()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = None
+AsyncSessionLocal = None
 
-def init_db():
-    """Crea las tablas si no existen."""
-    from app.schemas.history_schema import ReservationHistory
+
+def get_async_url():
+    """URL async configurada o derivada de la URL analítica/primaria cambiando el driver."""
+    if settings.async_database_url:
+        return settings.async_database_url
+
+    url = make_url(settings.analytics_database_url or settings.database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for '{backend}'. Set ASYNC_DATABASE_URL.")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def get_async_sessionmaker():
+    """Crea el AsyncEngine la primera vez que se usa (los drivers async son opcionales)."""
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_url = get_async_url()
+        async_engine = create_async_engine(async_url, echo=False, **engine_options(async_url))
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+
+async def dispose_async_database():
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+async def get_async_db():
+    """Dependencia de BD para las rutas async."""
+    async with get_async_sessionmaker()() as db:
+        started = time.perf_counter()
+        try:
+            await db.connection()
+        except OperationalError:
+            ERRORS.inc(component="db_connect")
+        else:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, engine="async")
+        yield db
+
+
+class ThreadpoolSession:
+    """
+    Vista síncrona de una AsyncSession para correr los servicios en el threadpool.
+    Cada consulta se despacha al event loop (anyio.from_thread) y el resto del trabajo
+    (decodificación, NumPy, ajuste de modelos) queda en el hilo, fuera del loop.
+    Cubre lo que usan las lecturas de los servicios: execute(), con o sin stream_results.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    def execute(self, stmt, params=None):
+        options = stmt.get_execution_options()
+        if options.get("stream_results"):
+            result = from_thread.run(self._db.stream, stmt, params)
+            return _StreamedResult(result, options.get("yield_per"))
+        return from_thread.run(self._db.execute, stmt, params)
+
+
+class _StreamedResult:
+    """Resultado en streaming de ThreadpoolSession: cada bloque de filas se lee en el event loop."""
+
+    def __init__(self, result, size):
+        self._result = result
+        self._size = size
+
+    def partitions(self, size=None):
+        size = size or self._size
+        while True:
+            rows = from_thread.run(self._result.fetchmany, size)
+            if not rows:
+                return
+            yield rows
+
+def init_db(refresh_models: bool = True):
+    """
+    Crea las tablas si no existen. Con refresh_models=False no reentrena los modelos
+    (p. ej. el backfill, que los refresca al terminar la carga).
+    """
+    from app.schemas.history_schema import ReservationHistory, ReservationArticle, ReservationHistoryArchive
+    from app.schemas.rollup_schema import (
+        RoomDailyCount, ArticleDailyCount, RoomHourlyCount, RoomWeekdayCount, CompactionWatermark,
+    )
+    from app.schemas.trend_model_schema import TrendModel, TrendModelDirty, TrendModelWindow
+    from app.schemas.data_version_schema import DataVersion
+    from app.core.cache import ensure_data_version_shards
+    from app.services.rollup_service import RollupService
+    from app.services.reservations_sinc import DataCollectorService
+    from app.services.predict.model_registry import ModelRegistry
+    configure_database()
     print("Checking tables in the database")
     Base.metadata.create_all(bind=engine)
-    print("Database and tables ready.")
\ No newline at end of file
+    removed_duplicates = ensure_indexes()
+
+    # Poblar la tabla de artículos y los rollups en bases que ya tenían historial
+    db = SessionLocal()
+    try:
+        ensure_data_version_shards(db)
+        DataCollectorService.backfill_articles(db)
+        if removed_duplicates:
+            RollupService.rebuild(db)
+        else:
+            RollupService.ensure_populated(db)
+
+        # Reentrenar los modelos guardados con el estado actual de los rollups
+        if refresh_models:
+            ModelRegistry.refresh_all(db)
+    finally:
+        db.close()
+    print("Database and tables ready.")
+
+
+def ensure_indexes():
+    """
+    Crea o actualiza los índices declarados en los modelos sobre tablas existentes.
+    create_all solo crea índices al crear la tabla, por eso las bases previas no los tienen.
+    Devuelve la cantidad de filas duplicadas eliminadas antes de crear el índice único.
+    """
+    inspector = inspect(engine)
+    removed = 0
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {ix["name"]: ix for ix in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            columns = [c.name for c in index.columns]
+            current = existing.get(index.name)
+
+            if current is not None:
+                if current["column_names"] == columns and bool(current["unique"]) == bool(index.unique):
+                    continue
+                # Índice con el mismo nombre pero otra definición: se reemplaza
+                print(f"Upgrading index {index.name}")
+                index.drop(bind=engine)
+
+            if index.unique and table.name == "reservation_history":
+                removed += _delete_duplicate_reservations()
+
+            print(f"Creating index {index.name}")
+            index.create(bind=engine)
+
+    return removed
+
+
+def _delete_duplicate_reservations():
+    """Deja una sola fila (la más reciente) por reservation_id."""
+    with engine.begin() as conn:
+        result = conn.execute(
+            text(
+                "DELETE FROM reservation_history WHERE id NOT IN ("
+                "SELECT id FROM (SELECT MAX(id) AS id FROM reservation_history "
+                "GROUP BY reservation_id) AS keep_rows)"
+            )
+        )
+    if result.rowcount:
+        print(f"Removed {result.rowcount} duplicated reservations.")
+    return max(result.rowcount, 0)
\ No newline at end of file
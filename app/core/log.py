@@ -0,0 +1,83 @@
+"""
+Configuración de logging del microservicio.
+Nivel y formato (texto o JSON, una línea por evento) salen de LOG_LEVEL y LOG_FORMAT.
+Los campos pasados en `extra` se agregan al evento, así los logs del consumer se pueden
+filtrar por reservation_id, resultado, etc. Para los eventos por mensaje se usa LogSampler,
+que deja pasar uno de cada LOG_SAMPLE_EVERY.
+"""
+
+import itertools
+import json
+import logging
+from datetime import datetime, timezone
+from app.core.config import settings
+
+# Atributos propios de LogRecord: lo demás viene de `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _extra_fields(record: logging.LogRecord):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con timestamp, nivel, logger, mensaje y los campos de `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            event["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto con los campos de `extra` como key=value al final."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class LogSampler:
+    """
+    Deja pasar uno de cada `every` eventos (el primero siempre pasa).
+    Con every <= 1 no muestrea.
+    """
+
+    def __init__(self, every: int = None):
+        self.every = settings.log_sample_every if every is None else every
+        self._counter = itertools.count()
+
+    def __call__(self) -> bool:
+        if self.every <= 1:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+def configure_logging():
+    """Instala el handler del proceso según LOG_LEVEL y LOG_FORMAT (idempotente)."""
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+
+    formatter = JsonFormatter() if settings.log_format == "json" else TextFormatter()
+    for handler in root.handlers:
+        if getattr(handler, "_prediction_service", False):
+            handler.setFormatter(formatter)
+            return
+
+    handler = logging.StreamHandler()
+    handler._prediction_service = True
+    handler.setFormatter(formatter)
+    root.addHandler(handler)
@@ -0,0 +1,278 @@
+"""
+Métricas del microservicio en formato de texto de Prometheus (expuestas en /metrics).
+Implementación mínima y thread-safe: contadores, histogramas y métricas calculadas
+al momento del scrape, sin dependencias externas.
+"""
+
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Buckets (segundos) para latencias de rutas, etapas y upserts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets para cantidades (filas cargadas, tamaño de lote)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        return self.header() + self.samples()
+
+
+class Counter(_Metric):
+    """Valor que solo crece (usar rate() en Prometheus para obtener por segundo)."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Distribución acumulada por buckets, con suma y cantidad de observaciones."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = key + (("le", _format_value(float(bound))),)
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class RateMeter(_Metric):
+    """Eventos por segundo en una ventana deslizante (gauge)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, window_seconds: float = 60.0):
+        super().__init__(name, documentation)
+        self.window_seconds = window_seconds
+        self._events = deque()
+        self._started = time.monotonic()
+
+    def mark(self, amount: int = 1):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, amount))
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._events and self._events[0][0] < now - self.window_seconds:
+            self._events.popleft()
+
+    def value(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            total = sum(amount for _, amount in self._events)
+        # Al arrancar la ventana todavía no está completa
+        elapsed = min(self.window_seconds, max(now - self._started, 1e-9))
+        return total / elapsed
+
+    def samples(self):
+        return [f"{self.name} {_format_value(self.value())}"]
+
+
+class CallbackMetric(_Metric):
+    """Métrica leída al momento del scrape; `collect()` devuelve [(dict de labels, valor)]."""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(sorted(labels.items()))} {_format_value(value)}"
+            for labels, value in self.collect()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Rutas HTTP
+HTTP_REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.",
+    ("method", "route", "status"),
+))
+
+# Etapas internas de los servicios (consulta, hidratación, ajuste, ranking...)
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "service_stage_duration_seconds", "Latency of each service stage.", ("stage",),
+))
+ROWS_LOADED = REGISTRY.register(Histogram(
+    "db_rows_loaded", "Rows loaded from the database per query.", ("source",), buckets=SIZE_BUCKETS,
+))
+
+# Ingesta
+UPSERT_LATENCY = REGISTRY.register(Histogram(
+    "reservation_upsert_duration_seconds", "Latency of reservation upserts (including commit).", ("mode",),
+))
+UPSERT_BATCH_SIZE = REGISTRY.register(Histogram(
+    "reservation_upsert_batch_size", "Reservations per upsert.", ("mode",), buckets=SIZE_BUCKETS,
+))
+UPSERTS_SKIPPED = REGISTRY.register(Counter(
+    "reservation_upserts_skipped_total",
+    "Reservations received without changes, by how it was detected (cache hit or DB read).", ("reason",),
+))
+CONSUMER_MESSAGES = REGISTRY.register(Counter(
+    "consumer_messages_total", "RabbitMQ messages processed by outcome.", ("outcome",),
+))
+CONSUMER_RATE = REGISTRY.register(RateMeter(
+    "consumer_messages_per_second", "RabbitMQ messages settled per second (last 60s).",
+))
+
+# Errores por componente
+ERRORS = REGISTRY.register(Counter("errors_total", "Errors by component.", ("component",)))
+
+# Pool de conexiones
+POOL_CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection.", ("engine",),
+))
+
+
+def timed(stage: str):
+    """Decorador: registra la duración de la función en service_stage_duration_seconds."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with STAGE_LATENCY.time(stage=stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide la latencia de cada request por ruta (plantilla, no URL)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # El router guarda la ruta resuelta en el scope
+            route = scope.get("route")
+            HTTP_REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            )
+            if status["code"] >= 500:
+                ERRORS.inc(component="http")
@@ -1,84 +1,434 @@
 import pika
+import functools
+import queue
 import threading
 import logging
-import json
+import time
 
+from pydantic import ValidationError
+from app.core.config import settings
 from app.core.database import SessionLocal
-from app.schemas.sync_schema import ReservationCreate
+from app.core.log import LogSampler
+from app.core.metrics import CONSUMER_MESSAGES, CONSUMER_RATE, ERRORS, REGISTRY, CallbackMetric
+from app.schemas.sync_schema import decode_reservations
 from app.services.reservations_sinc import DataCollectorService
 
 
 logger = logging.getLogger(__name__)
 
-def debug_reservation_json(data, db):
-    """Debug y mapeo nativo de un objeto ReservationResponseDTO en JSON"""
-    try:
-        json_data = json.loads(data)
-        reservation = ReservationCreate(**json_data)
-        print("\n" + "="*50)
-        print("📨 MENSAJE RESERVA RECIBIDO (TIPADO)")
-        print("="*50)
-        print(reservation.model_dump_json(indent=4))
-        print("="*50)
-
-        # Guardar en DB (upsert)
-        collector = DataCollectorService(db)
-        result = collector.store_data(reservation)
-        print(f"📌 Resultado DB: {result}")
-        return result
-
-    except json.JSONDecodeError as e:
-        print(f"❌ Error decodificando JSON: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ Error mapeando al esquema: {e}")
-        return None
-
-
-def callback(ch, method, properties, body):
+# Muestreo de los logs por mensaje (resultados y mensajes inválidos)
+_result_sample = LogSampler()
+_failure_sample = LogSampler()
+_reject_sample = LogSampler()
+
+# Intervalo con el que el hilo de la conexión revisa el pedido de parada
+POLL_SECONDS = 0.1
+
+# Tiempo máximo para procesar los mensajes ya recibidos al apagar
+DRAIN_TIMEOUT_SECONDS = 30
+
+# Mensajes ya recibidos por pika que se decodifican juntos en una sola validación
+DECODE_BATCH_SIZE = 500
+
+def _log_result(result):
+    """Resultado de un guardado: muestreado en el log, o cada uno en modo debug."""
+    if result.get("status") != "success":
+        if settings.consumer_debug or _failure_sample():
+            logger.error("Reservation not stored", extra=dict(result, sample_every=_failure_sample.every))
+    elif (settings.consumer_debug or _result_sample()) and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Reservation stored", extra=result)
+
+
+def _settle(ch, items, results):
+    """
+    Confirma en orden los mensajes (delivery_tag, reserva) ya procesados: ack si se guardó y
+    dead-letter si falló por sus datos. Se detiene en el primer error transitorio de la base
+    y devuelve los mensajes desde ahí, sin confirmar (también los que no llegaron a intentarse):
+    el worker los reintenta en el mismo orden antes de tomar otros, así una versión posterior
+    de una reserva nunca se guarda antes que la anterior.
+    """
+    acked = []
+    settled = 0
+    for (delivery_tag, reservation), result in zip(items, results):
+        if result.get("status") == "success":
+            acked.append(delivery_tag)
+        elif result.get("retryable"):
+            break
+        else:
+            ch.dead_letter(delivery_tag, reservation.model_dump_json().encode(), result.get("error") or "unknown error")
+            CONSUMER_MESSAGES.inc(outcome="dead_lettered")
+        settled += 1
+
+    if acked:
+        # Ack individual: con varios workers los tags del canal no son consecutivos por worker
+        ch.basic_ack_many(acked)
+        CONSUMER_MESSAGES.inc(len(acked), outcome="acked")
+    CONSUMER_RATE.mark(settled)
+    return items[settled:]
+
+
+def _dead_letter_all(ch, items, error: str):
+    """Publica los mensajes en la cola de dead-letter (no quedan sin confirmar ocupando el prefetch)."""
+    for delivery_tag, reservation in items:
+        ch.dead_letter(delivery_tag, reservation.model_dump_json().encode(), error)
+    CONSUMER_MESSAGES.inc(len(items), outcome="dead_lettered")
+    CONSUMER_RATE.mark(len(items))
+
+
+def _requeue(ch, items):
+    """Devuelve los mensajes a RabbitMQ, en orden, para otro intento (apagado)."""
+    for delivery_tag, _ in items:
+        ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+    CONSUMER_MESSAGES.inc(len(items), outcome="requeued")
+
+
+def _reject_invalid(ch, delivery_tag, error):
+    """Descarta un mensaje que no se puede decodificar (reencolarlo no lo arreglaría)."""
+    if settings.consumer_debug or _reject_sample():
+        logger.warning("Invalid message rejected", extra={"error": str(error), "sample_every": _reject_sample.every})
+    ch.basic_reject(delivery_tag=delivery_tag, requeue=False)
+    CONSUMER_MESSAGES.inc(outcome="rejected")
+    ERRORS.inc(component="consumer_decode")
+    CONSUMER_RATE.mark()
+
+
+def _store_one(reservation):
+    """Guarda una reserva con su propio commit. Devuelve [resultado]."""
     db = SessionLocal()
     try:
-        json_data = json.loads(body)
-        reservation = ReservationCreate(**json_data)
         result = DataCollectorService.store_data(reservation, db)  # <- llamado estático
-        print(f"📌 Resultado DB: {result}")
-    except Exception as e:
-        print(f"❌ Error procesando mensaje: {e}")
+        _log_result(result)
+        return [result]
     finally:
         db.close()
 
+
+def _store_batch(reservations):
+    """
+    Guarda el lote con un único upsert. Si falla por sus datos se reintenta reserva por reserva
+    para aislar a la culpable; ante un error transitorio se corta ahí (el resto espera al reintento).
+    Devuelve un resultado por reserva intentada, en orden.
+    """
+    db = SessionLocal()
+    try:
+        # store_batch devuelve un resultado por reservation_id: se reparte entre sus mensajes
+        by_id = {r["reservation_id"]: r for r in DataCollectorService.store_batch(reservations, db)}
+        results = [by_id[reservation.reservation_id] for reservation in reservations]
+
+        if all(r["status"] == "success" for r in results):
+            if settings.consumer_debug:
+                for result in results:
+                    _log_result(result)
+            logger.debug("Batch stored", extra={"batch_size": len(reservations)})
+            return results
+
+        logger.error("Error storing batch", extra={"batch_size": len(reservations), "error": results[0].get("error")})
+        if results[0].get("retryable"):
+            # La base no está disponible: reintentar reserva por reserva no serviría
+            return results
+
+        results = []
+        for reservation in reservations:
+            result = DataCollectorService.store_data(reservation, db)
+            _log_result(result)
+            results.append(result)
+            if result.get("retryable"):
+                break
+        return results
+    finally:
+        db.close()
+
+
+class _ThreadsafeChannel:
+    """
+    Envía acks/nacks al hilo dueño de la conexión: pika no es thread-safe y
+    los workers no pueden usar el canal directamente.
+    """
+
+    def __init__(self, connection, channel):
+        self._connection = connection
+        self._channel = channel
+
+    def _call(self, fn, *args, **kwargs):
+        self._connection.add_callback_threadsafe(functools.partial(fn, *args, **kwargs))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self._call(self._channel.basic_ack, delivery_tag=delivery_tag, multiple=multiple)
+
+    def basic_ack_many(self, delivery_tags):
+        def ack_all():
+            for delivery_tag in delivery_tags:
+                self._channel.basic_ack(delivery_tag=delivery_tag)
+        self._call(ack_all)
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self._call(self._channel.basic_nack, delivery_tag=delivery_tag, requeue=requeue)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self._call(self._channel.basic_reject, delivery_tag=delivery_tag, requeue=requeue)
+
+    def dead_letter(self, delivery_tag, body: bytes, error: str):
+        """Publica el mensaje (persistente) en la cola de dead-letter y recién después confirma el original."""
+        def publish_and_ack():
+            self._channel.basic_publish(
+                exchange="",
+                routing_key=settings.rabbitmq_dead_letter_queue,
+                body=body,
+                properties=pika.BasicProperties(delivery_mode=2, headers={"x-error": error[:1000]}),
+            )
+            self._channel.basic_ack(delivery_tag=delivery_tag)
+        self._call(publish_and_ack)
+
+
+class ConsumerPool:
+    """
+    Consumer con N workers. El hilo de la conexión decodifica los mensajes y los
+    reparte por reservation_id: una misma reserva siempre va al mismo worker, así
+    sus modificaciones se aplican en orden. Las colas de los workers son acotadas
+    (backpressure) y al detenerse se procesa lo ya recibido antes de cerrar.
+    """
+
+    def __init__(self, workers: int, queue_size: int, batch_mode: bool):
+        self.queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in range(max(workers, 1))]
+        self.batch_mode = batch_mode
+        self._stopping = threading.Event()
+        self._workers = []
+        self._connection = None
+        self._channel = None
+
+    def route(self, reservation_id: int) -> int:
+        """Índice del worker de una reserva (hash de reservation_id)."""
+        return hash(reservation_id) % len(self.queues)
+
+    def run(self, connection, channel):
+        """Consume hasta que se llame a stop(). Se ejecuta en el hilo de la conexión."""
+        self._connection, self._channel = connection, channel
+        threadsafe_channel = _ThreadsafeChannel(connection, channel)
+        self._workers = [
+            threading.Thread(
+                target=self._worker, args=(q, threadsafe_channel), name=f"rabbitmq-worker-{i}", daemon=True
+            )
+            for i, q in enumerate(self.queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        pending = []
+        try:
+            # inactivity_timeout: se revisa periódicamente el pedido de parada
+            # (y pika envía los acks encolados por los workers)
+            for method, properties, body in channel.consume(
+                queue=settings.rabbitmq_queue, inactivity_timeout=POLL_SECONDS
+            ):
+                if self._stopping.is_set():
+                    break
+                if method is not None:
+                    pending.append((method, body))
+                    # Mientras pika tenga mensajes ya recibidos se juntan para validarlos de una vez
+                    if len(pending) < DECODE_BATCH_SIZE and channel.get_waiting_message_count():
+                        continue
+                if pending:
+                    self._dispatch(channel, pending)
+                    pending = []
+        finally:
+            if pending:
+                self._dispatch(channel, pending)
+            self._drain()
+
+    def _dispatch(self, channel, messages):
+        """Decodifica los mensajes (method, body) en lote y los reparte entre los workers."""
+        decoded = decode_reservations([body for _, body in messages])
+        for (method, _), reservation in zip(messages, decoded):
+            if isinstance(reservation, ValidationError):
+                # Mensaje inválido: no tiene sentido reencolarlo
+                _reject_invalid(channel, method.delivery_tag, reservation)
+                continue
+            if settings.consumer_debug:
+                logger.debug("Reservation received", extra={"reservation": reservation.model_dump(mode="json")})
+
+            item = (method.delivery_tag, reservation)
+            self._put(self.queues[self.route(reservation.reservation_id)], item)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _put(self, q, item, deadline=None):
+        """Encola esperando lugar; mientras tanto sigue atendiendo la conexión (acks, heartbeats)."""
+        while True:
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                if deadline is None and self._stopping.is_set():
+                    # El mensaje no se confirmó: RabbitMQ lo reentrega al cerrar la conexión
+                    return False
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                self._connection.process_data_events(time_limit=0)
+
+    def _drain(self):
+        """Deja de recibir, espera a que los workers vacíen sus colas y envía los acks pendientes."""
+        deadline = time.monotonic() + DRAIN_TIMEOUT_SECONDS
+        try:
+            # Los mensajes recibidos por pika pero aún no entregados se reencolan
+            self._channel.cancel()
+        except Exception as e:
+            logger.error(f"Error cancelando el consumer: {e}")
+
+        for q in self.queues:
+            self._put(q, None, deadline)
+
+        try:
+            while any(w.is_alive() for w in self._workers) and time.monotonic() < deadline:
+                self._connection.process_data_events(time_limit=POLL_SECONDS)
+            self._connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.error(f"Error enviando acks pendientes: {e}")
+
+    def _next_batch(self, q):
+        """Primer mensaje (bloqueante) y, en modo batch, los que lleguen hasta llenar el lote o vencer la espera."""
+        item = q.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        batch_size = max(settings.rabbitmq_batch_size, 1) if self.batch_mode else 1
+        deadline = time.monotonic() + settings.rabbitmq_batch_max_linger_ms / 1000
+
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    @staticmethod
+    def retry_delay(failures: int) -> float:
+        """Espera (segundos) tras `failures` escrituras reencoladas seguidas: backoff exponencial acotado."""
+        delay_ms = settings.rabbitmq_retry_backoff_ms * 2 ** min(failures - 1, 20)
+        return min(delay_ms, settings.rabbitmq_retry_backoff_max_ms) / 1000
+
+    def _worker(self, q, channel):
+        done = False
+        # Mensajes ya tomados que fallaron con un error transitorio: se reintentan antes que los siguientes
+        pending = []
+        failures = 0
+        while pending or not done:
+            if pending:
+                if self._stopping.is_set():
+                    # Al apagar se reencolan sin esperar, junto con todo lo que quedó detrás en la cola
+                    self._requeue_rest(channel, q, pending, done)
+                    return
+                batch = pending
+            else:
+                batch, done = self._next_batch(q)
+                if not batch:
+                    continue
+
+            try:
+                reservations = [reservation for _, reservation in batch]
+                results = _store_batch(reservations) if self.batch_mode else _store_one(reservations[0])
+            except Exception as e:
+                ERRORS.inc(component="consumer")
+                logger.error(f"Error en worker del consumer: {e}")
+                # Sin confirmar ocuparían el prefetch hasta que se cierre el canal
+                _dead_letter_all(channel, batch, f"Consumer worker error: {e}")
+                pending, failures = [], 0
+                continue
+
+            pending = _settle(channel, batch, results)
+            failures = failures + 1 if pending else 0
+            # Base caída: no volver a intentar enseguida (stop() interrumpe la espera)
+            if failures:
+                self._stopping.wait(self.retry_delay(failures))
+
+    @staticmethod
+    def _requeue_rest(channel, q, pending, done):
+        """Reencola los mensajes pendientes y los que siguen en la cola del worker, en orden."""
+        _requeue(channel, pending)
+        while not done:
+            try:
+                item = q.get(timeout=DRAIN_TIMEOUT_SECONDS)
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            _requeue(channel, [item])
+
+
+_pool = None
+_connection_thread = None
+
+
+def _queue_depths():
+    if _pool is None:
+        return []
+    return [({"worker": str(i)}, q.qsize()) for i, q in enumerate(_pool.queues)]
+
+
+REGISTRY.register(CallbackMetric(
+    "consumer_worker_queue_depth", "Messages waiting in each consumer worker queue.", "gauge", _queue_depths,
+))
+
+
 def start_rabbitmq_consumer():
-    """Inicia el consumer de RabbitMQ en un hilo separado"""
+    """Inicia el consumer de RabbitMQ (hilo de conexión + workers) en segundo plano"""
+    global _pool, _connection_thread
+
+    _pool = ConsumerPool(
+        workers=settings.rabbitmq_workers,
+        queue_size=settings.rabbitmq_worker_queue_size,
+        batch_mode=settings.rabbitmq_consumer_mode == "batch",
+    )
+
     def _consumer_thread():
         try:
-            credentials = pika.PlainCredentials(username='admin', password='admin')
+            credentials = pika.PlainCredentials(
+                username=settings.rabbitmq_user, password=settings.rabbitmq_password
+            )
             connection = pika.BlockingConnection(
                 pika.ConnectionParameters(
-                    host='localhost',
-                    port=5672,
+                    host=settings.rabbitmq_host,
+                    port=settings.rabbitmq_port,
                     credentials=credentials,
                     virtual_host='/'
                 )
             )
 
             channel = connection.channel()
-            channel.queue_declare(queue='reservations', durable=True)
+            channel.queue_declare(queue=settings.rabbitmq_queue, durable=True)
+            # Escrituras que fallaron por un error no transitorio (se revisan y reenvían a mano)
+            channel.queue_declare(queue=settings.rabbitmq_dead_letter_queue, durable=True)
+            # Limita los mensajes sin confirmar (ack manual tras el commit)
+            channel.basic_qos(prefetch_count=settings.rabbitmq_prefetch_count)
 
-            channel.basic_consume(
-                queue='reservations',
-                on_message_callback=callback,
-                auto_ack=True
-            )
-
-            print(' [*] Esperando mensajes JSON de reservas...')
             logger.info(' [*] RabbitMQ Consumer esperando mensajes JSON...')
 
-            channel.start_consuming()
+            try:
+                _pool.run(connection, channel)
+            finally:
+                connection.close()
 
         except Exception as e:
-            print(f"❌ Error en RabbitMQ: {e}")
+            ERRORS.inc(component="consumer")
             logger.error(f"Error en RabbitMQ: {e}")
 
-    thread = threading.Thread(target=_consumer_thread, daemon=True)
-    thread.start()
-    logger.info("✅ RabbitMQ Consumer iniciado en segundo plano")
+    _connection_thread = threading.Thread(target=_consumer_thread, name="rabbitmq-connection", daemon=True)
+    _connection_thread.start()
+    logger.info(f"✅ RabbitMQ Consumer iniciado en segundo plano ({len(_pool.queues)} workers)")
+
+
+def stop_rabbitmq_consumer():
+    """Detiene el consumer procesando los mensajes ya recibidos (apagado ordenado)."""
+    if _pool is None:
+        return
+    _pool.stop()
+    if _connection_thread is not None:
+        _connection_thread.join(timeout=DRAIN_TIMEOUT_SECONDS + 5)
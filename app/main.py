@@ -3,15 +3,49 @@ Punto de entrada del microservicio de predicción de reservas.
 Expone los endpoints definidos y configura la documentación Swagger y ReDoc.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.api.responses import MeteredJSONResponse
 from app.api.routes_health import router as health_router
+from app.api.routes_metrics import router as metrics_router
 from app.api.routes_predict import router as predict_router
 from app.api.routes_predict_ranking import router as ranking_router
+from app.api.routes_reservations import router as reservations_router
 from app.api.routes_trending_resources import router as trending_router
 from app.api.routes_seasonal import router as seasonal_router
 from app.core.config import settings
-from app.core.database import init_db
-from app.core.rabbitMq import start_rabbitmq_consumer
+from app.core.database import dispose_async_database, dispose_database, init_db
+from app.core.log import configure_logging
+from app.core.metrics import MetricsMiddleware
+from app.services.predict.history_snapshot import start_snapshot_job
+from app.services.predict.model_registry import start_model_refresher
+from app.services.retention_service import start_retention_job
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque: crea los engines y las tablas, inicia el consumer (si está habilitado),
+    el reentrenamiento de modelos, la retención y el snapshot del historial.
+    Nada de esto ocurre al importar la app.
+    """
+    configure_logging()
+    print("Initializing database connection")
+    init_db()
+    if settings.rabbitmq_enabled:
+        # Import diferido: pika y el consumer solo se cargan si se usan
+        from app.core.rabbitMq import start_rabbitmq_consumer
+        start_rabbitmq_consumer()
+    start_model_refresher()
+    start_retention_job()
+    start_snapshot_job()
+    yield
+    if settings.rabbitmq_enabled:
+        from app.core.rabbitMq import stop_rabbitmq_consumer
+        stop_rabbitmq_consumer()
+    dispose_database()
+    await dispose_async_database()
+
 
 def create_app() -> FastAPI:
     """
@@ -29,21 +63,30 @@ def create_app() -> FastAPI:
             "name": "MIT License",
             "url": "https://opensource.org/licenses/MIT",
         },
+        default_response_class=MeteredJSONResponse,
+        lifespan=lifespan,
     )
 
-    # Inicializa base y tablas al inicio
-    @app.on_event("startup")
-    def startup_event():
-        print("Initializing database connection")
-        start_rabbitmq_consumer()
-        init_db()
-
-    # Registrar rutas
-    app.include_router(health_router, prefix="/api/v1")
-    app.include_router(predict_router, prefix="/api/v1")
-    app.include_router(ranking_router, prefix="/api/v1")
-    app.include_router(trending_router, prefix="/api/v1")
-    app.include_router(seasonal_router, prefix="/api/v1")
+    # Latencia por ruta para /metrics
+    app.add_middleware(MetricsMiddleware)
+
+    # Registrar rutas (versiones async con AsyncSession si ASYNC_MODE está activo)
+    if settings.async_mode:
+        # Import diferido: el modo async requiere greenlet y un driver async
+        from app.api.routes_async import router as async_router
+        app.include_router(async_router, prefix="/api/v1")
+    else:
+        app.include_router(health_router, prefix="/api/v1")
+        app.include_router(predict_router, prefix="/api/v1")
+        app.include_router(ranking_router, prefix="/api/v1")
+        app.include_router(trending_router, prefix="/api/v1")
+        app.include_router(seasonal_router, prefix="/api/v1")
+
+    # La ingesta masiva escribe con la sesión sync de la base primaria en ambos modos
+    app.include_router(reservations_router, prefix="/api/v1")
+
+    # Formato Prometheus, fuera del prefijo de la API
+    app.include_router(metrics_router)
 
     return app
 
@@ -0,0 +1,14 @@
+from sqlalchemy import BigInteger, Column, Integer
+from app.core.database import Base
+
+
+class DataVersion(Base):
+    """
+    Contador de versión de los datos, repartido en DATA_VERSION_SHARDS filas (id 1..N).
+    Cada escritura incrementa una fila dentro de su transacción; las cachés de resultados de
+    todos los procesos comparan la suma para saber si una entrada quedó vieja.
+    """
+    __tablename__ = "data_versions"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -1,11 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, Index
 from app.core.database import Base
 
 class ReservationHistory(Base):
     __tablename__ = "reservation_history"
+    __table_args__ = (
+        # Historial de una sala ordenado por fecha (WHERE room_name = ? ORDER BY date_hour_start)
+        Index("ix_reservation_history_room_start", "room_name", "date_hour_start"),
+        # Filtros por rango de fechas sin sala (retención; rollups posteriores a la compactación)
+        Index("ix_reservation_history_date_hour_start", "date_hour_start"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    reservation_id = Column(Integer, nullable=False)
+    reservation_id = Column(Integer, nullable=False, unique=True, index=True)
     
     # Room
     room_name = Column(String(100), nullable=False)
@@ -17,4 +23,40 @@ class ReservationHistory(Base):
     articles = Column(Text)
     date_hour_start = Column(DateTime, nullable=False)
     date_hour_end = Column(DateTime, nullable=False)
-    fetched_at = Column(DateTime, nullable=False) 
\ No newline at end of file
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class ReservationArticle(Base):
+    """
+    Artículos de cada reserva normalizados (una fila por artículo).
+    Se reemplazan completos cada vez que la reserva se crea o actualiza.
+    """
+    __tablename__ = "reservation_articles"
+    __table_args__ = (
+        # Conteos por artículo y fecha con un GROUP BY sobre el índice
+        Index("ix_reservation_articles_article_date", "article", "date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    reservation_id = Column(Integer, nullable=False, index=True)
+    article = Column(String(150), nullable=False)
+    # Fecha de inicio de la reserva (date_hour_start.date())
+    date = Column(Date, nullable=False)
+
+
+class ReservationHistoryArchive(Base):
+    """
+    Reservas antiguas movidas fuera de reservation_history por la compactación.
+    Sus conteos siguen en los rollups; si la reserva vuelve a llegar se reactiva.
+    La clave incluye date_hour_start para poder particionar la tabla por mes.
+    """
+    __tablename__ = "reservation_history_archive"
+
+    reservation_id = Column(Integer, primary_key=True, autoincrement=False)
+    date_hour_start = Column(DateTime, primary_key=True)
+    room_name = Column(String(100), nullable=False)
+    people_email = Column(String(150), nullable=False)
+    articles = Column(Text)
+    date_hour_end = Column(DateTime, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
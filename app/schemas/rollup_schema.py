@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, String, Date, Index
+from app.core.database import Base
+
+
+class RoomDailyCount(Base):
+    """Cantidad de reservas por sala y día (rollup de reservation_history)."""
+    __tablename__ = "room_daily_counts"
+    __table_args__ = (
+        # Ventanas de entrenamiento sin filtrar por sala (date >= inicio)
+        Index("ix_room_daily_counts_date", "date"),
+    )
+
+    room_name = Column(String(100), primary_key=True)
+    date = Column(Date, primary_key=True)
+    reservations = Column(Integer, nullable=False, default=0)
+
+
+class ArticleDailyCount(Base):
+    """Cantidad de apariciones de cada artículo por día (rollup de reservation_history)."""
+    __tablename__ = "article_daily_counts"
+    __table_args__ = (
+        Index("ix_article_daily_counts_date", "date"),
+    )
+
+    article = Column(String(150), primary_key=True)
+    date = Column(Date, primary_key=True)
+    reservations = Column(Integer, nullable=False, default=0)
+
+
+class RoomHourlyCount(Base):
+    """Reservas que ocupan cada franja horaria de una sala (hora 0..23 de cada día)."""
+    __tablename__ = "room_hourly_counts"
+    __table_args__ = (
+        Index("ix_room_hourly_counts_date", "date"),
+    )
+
+    room_name = Column(String(100), primary_key=True)
+    date = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    reservations = Column(Integer, nullable=False, default=0)
+
+
+class RoomWeekdayCount(Base):
+    """Cantidad de reservas por sala y día de la semana (0=lunes .. 6=domingo)."""
+    __tablename__ = "room_weekday_counts"
+
+    room_name = Column(String(100), primary_key=True)
+    weekday = Column(Integer, primary_key=True)
+    reservations = Column(Integer, nullable=False, default=0)
+
+
+class CompactionWatermark(Base):
+    """
+    Fecha hasta la que se compactó el historial (fila única, id=1).
+    Los rollups anteriores a esa fecha ya no se pueden recalcular desde reservation_history.
+    """
+    __tablename__ = "compaction_watermark"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    compacted_before = Column(Date, nullable=False)
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
+import logging
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from datetime import datetime
-from typing import Optional, List
-import json
+from typing import List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
 
 class ReservationCreate(BaseModel):
     reservation_id: int
@@ -22,20 +24,36 @@ class ReservationCreate(BaseModel):
         "json_encoders": {datetime: lambda dt: dt.strftime("%Y-%m-%d %H:%M:%S")}
     }
 
-def map_reservation_json(data: bytes) -> Optional[ReservationCreate]:
-    """Recibe bytes JSON y los mapea al esquema ReservationCreate"""
+# Validación directa desde bytes JSON (una sola pasada, sin dict intermedio)
+RESERVATION = TypeAdapter(ReservationCreate)
+RESERVATION_LIST = TypeAdapter(List[ReservationCreate])
+
+
+def decode_reservation(data: Union[bytes, str]) -> ReservationCreate:
+    """Decodifica y valida un mensaje JSON. Lanza ValidationError si es inválido."""
+    return ReservationCreate.model_validate_json(data)
+
+
+def decode_reservations(messages: Sequence[bytes]) -> List[Union[ReservationCreate, ValidationError]]:
+    """
+    Decodifica un lote de mensajes JSON, en orden. Se valida el lote completo como un
+    array en una sola llamada; si algún mensaje es inválido se valida uno por uno y
+    su posición queda con el ValidationError.
+    """
+    if not messages:
+        return []
     try:
-        json_data = json.loads(data)
-        reservation = ReservationCreate(**json_data)
-        print("\n" + "="*50)
-        print("📨 MENSAJE RESERVA RECIBIDO (TIPADO)")
-        print("="*50)
-        print(reservation.model_dump_json(indent=4))
-        print("="*50)
-        return reservation
-    except json.JSONDecodeError as e:
-        print(f"❌ Error decodificando JSON: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ Error mapeando al esquema: {e}")
-        return None
+        decoded = RESERVATION_LIST.validate_json(b"[" + b",".join(messages) + b"]")
+        # Un mensaje con varios objetos separados por coma correría las posiciones
+        if len(decoded) == len(messages):
+            return decoded
+    except ValidationError:
+        pass
+
+    decoded = []
+    for message in messages:
+        try:
+            decoded.append(decode_reservation(message))
+        except ValidationError as e:
+            decoded.append(e)
+    return decoded
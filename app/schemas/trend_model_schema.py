@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text
+from app.core.database import Base
+
+
+class TrendModel(Base):
+    """
+    Parámetros del modelo de tendencia ajustado para una sala o un artículo.
+    Se recalculan en segundo plano cuando cambian los rollups de esa clave.
+    """
+    __tablename__ = "trend_models"
+
+    kind = Column(String(20), primary_key=True)  # "room" | "article"
+    key = Column(String(150), primary_key=True)
+
+    n_points = Column(Integer, nullable=False)
+    slope = Column(Float(precision=53), nullable=False)
+    intercept = Column(Float(precision=53), nullable=False)
+    mean = Column(Float(precision=53), nullable=False)
+    # Denominador de normalización: max(percentil 90, máximo, capacidad por defecto)
+    denom = Column(Float(precision=53), nullable=False)
+    first_value = Column(Float(precision=53), nullable=False)
+    last_value = Column(Float(precision=53), nullable=False)
+    # Última fecha con datos usada en el entrenamiento
+    last_date = Column(Date, nullable=False)
+    # Promedios por weekday (JSON) para las series demasiado cortas para una recta
+    fallback = Column(Text)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class TrendModelDirty(Base):
+    """
+    Salas y artículos cuyos rollups cambiaron desde el último reentrenamiento de su modelo.
+    Se marca en la misma transacción que la ingesta, así el refresco de cualquier proceso
+    ve los cambios hechos por todos (API, consumer, backfill).
+    """
+    __tablename__ = "trend_models_dirty"
+
+    kind = Column(String(20), primary_key=True)  # "room" | "article"
+    key = Column(String(150), primary_key=True)
+    # Se incrementa con cada marca: el refresco borra la fila solo si no cambió mientras reentrenaba
+    version = Column(Integer, nullable=False, default=1)
+
+
+class TrendModelWindow(Base):
+    """
+    Inicio de la ventana de entrenamiento del último reentrenamiento completo (fila única, id=1;
+    NULL = todo el historial). Lo comparten los procesos para detectar el cambio de día una sola vez.
+    """
+    __tablename__ = "trend_model_window"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    window_start = Column(Date)
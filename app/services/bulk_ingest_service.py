@@ -0,0 +1,114 @@
+"""
+Ingesta masiva de reservas (backfill por CLI y POST /reservations/bulk).
+Los registros se validan por lotes con un TypeAdapter de pydantic y cada lote válido
+se guarda con el upsert multi-fila de DataCollectorService.store_batch (un commit por lote).
+"""
+
+from typing import List, Optional
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.schemas.sync_schema import RESERVATION, RESERVATION_LIST, ReservationCreate, decode_reservations
+from app.services.reservations_sinc import DataCollectorService
+from app.services.rollup_service import split_articles
+
+# Errores de validación que se informan en detalle (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 100
+
+
+def _first_error(error: ValidationError) -> str:
+    detail = error.errors()[0]
+    location = ".".join(str(part) for part in detail["loc"])
+    return f"{location}: {detail['msg']}" if location else detail["msg"]
+
+
+class IngestReport:
+    """Conteos de una ingesta masiva y los primeros registros rechazados (número de línea y error)."""
+
+    def __init__(self):
+        self.received = 0
+        self.stored = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, line: int, error: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "stored": self.stored,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
+
+
+class BulkIngestService:
+
+    @staticmethod
+    def validate_json_lines(lines, first_line: int, report: IngestReport) -> List[ReservationCreate]:
+        """
+        Valida un lote de líneas JSON (bytes o str) con decode_reservations: el lote entero
+        en una sola pasada o, si hay líneas inválidas, línea por línea para descartar solo
+        esas. Las líneas en blanco se ignoran.
+        """
+        numbered = [(first_line + i, line) for i, line in enumerate(lines) if line.strip()]
+        report.received += len(numbered)
+        if not numbered:
+            return []
+
+        raw = [line.encode() if isinstance(line, str) else line for _, line in numbered]
+        valid = []
+        for (line_number, _), decoded in zip(numbered, decode_reservations(raw)):
+            if isinstance(decoded, ValidationError):
+                report.reject(line_number, _first_error(decoded))
+            else:
+                valid.append(decoded)
+        return valid
+
+    @staticmethod
+    def validate_records(records, first_line: int, report: IngestReport) -> List[ReservationCreate]:
+        """
+        Valida un lote de dicts (p. ej. filas de un CSV). `articles` puede venir como lista
+        o como texto separado por comas, igual que en reservation_history.
+        """
+        records = [
+            dict(record, articles=split_articles(record["articles"]) or None)
+            if isinstance(record.get("articles"), str) else record
+            for record in records
+        ]
+        report.received += len(records)
+        try:
+            return RESERVATION_LIST.validate_python(records)
+        except ValidationError as e:
+            # loc[0] es la posición del registro inválido dentro del lote
+            invalid = {detail["loc"][0] for detail in e.errors()}
+
+        valid = []
+        for i, record in enumerate(records):
+            if i not in invalid:
+                valid.append(RESERVATION.validate_python(record))
+                continue
+            try:
+                RESERVATION.validate_python(record)
+            except ValidationError as error:
+                report.reject(first_line + i, _first_error(error))
+        return valid
+
+    @staticmethod
+    def store(db: Session, reservations: List[ReservationCreate], report: IngestReport) -> Optional[str]:
+        """
+        Guarda un lote validado en una transacción (upsert multi-fila).
+        Devuelve el error si el lote no se pudo guardar (no se guardó ninguna reserva del lote).
+        """
+        if not reservations:
+            return None
+
+        results = DataCollectorService.store_batch(reservations, db)
+        failed = [r for r in results if r["status"] != "success"]
+        if failed:
+            return failed[0]["error"]
+
+        report.stored += len(reservations)
+        return None
@@ -0,0 +1,72 @@
+"""
+Expansión vectorizada de intervalos [inicio, fin) en franjas horarias.
+La usan el rollup horario (sala x día x hora) y las predicciones por franja.
+"""
+
+import numpy as np
+
+HOUR = "datetime64[h]"
+
+# Franjas máximas por intervalo: acota la expansión ante datos erróneos (31 días)
+MAX_INTERVAL_HOURS = 24 * 31
+
+
+def slot_counts(starts, ends):
+    """
+    Primera franja y cantidad de franjas horarias de cada intervalo [inicio, fin).
+    La franja de inicio se cuenta aunque el fin no la supere (intervalos vacíos o invertidos).
+    """
+    starts = np.asarray(starts, dtype="datetime64[us]")
+    ends = np.asarray(ends, dtype="datetime64[us]")
+
+    first = starts.astype(HOUR)
+    # Fin redondeado hacia arriba a la hora: 10:30 ocupa la franja de las 10
+    last = ends.astype(HOUR)
+    last = last + (ends > last.astype("datetime64[us]")).astype(np.int64)
+
+    lengths = np.clip((last - first).astype(np.int64), 1, MAX_INTERVAL_HOURS)
+    return first, lengths
+
+
+def expand_hourly_slots(starts, ends):
+    """
+    Expande cada intervalo en sus franjas horarias sin loops por fila.
+    Devuelve (fila de origen de cada franja, franja como datetime64[h]).
+    """
+    first, lengths = slot_counts(starts, ends)
+    total = int(lengths.sum())
+
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    # Posición de cada franja dentro de su intervalo: 0, 1, .., length-1
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    slots = np.repeat(first, lengths) + offsets.astype("timedelta64[h]")
+    return rows, slots
+
+
+def split_slots(slots):
+    """Separa franjas datetime64[h] en (día datetime64[D], hora 0..23)."""
+    days = slots.astype("datetime64[D]")
+    hours = (slots - days.astype(HOUR)).astype(np.int64)
+    return days, hours
+
+
+def sum_by_slot(codes, slots, weights):
+    """
+    Suma `weights` por (código de clave, franja). Devuelve (códigos, franjas, totales)
+    ordenados por código y franja, sin los totales en cero.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if not len(codes):
+        return codes, np.empty(0, dtype=HOUR), np.empty(0, dtype=np.int64)
+
+    # Clave combinada código x franja en un solo int64 para agrupar con np.unique
+    hours = slots.astype(np.int64)
+    base = hours.min()
+    span = int(hours.max() - base) + 1
+    combined = codes * span + (hours - base)
+
+    unique, inverse = np.unique(combined, return_inverse=True)
+    totals = np.rint(np.bincount(inverse.ravel(), weights=weights, minlength=len(unique))).astype(np.int64)
+    keep = totals != 0
+    unique = unique[keep]
+    return unique // span, (unique % span + base).astype(HOUR), totals[keep]
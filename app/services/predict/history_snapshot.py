@@ -0,0 +1,560 @@
+"""
+Snapshot columnar del historial en disco, mapeado en memoria.
+Guarda por reserva la sala y los artículos (códigos de diccionario), el día y el
+inicio/fin en archivos binarios de ancho fijo (uno por columna) más un manifest.json.
+Cada proceso los mapea con np.memmap en modo lectura: los workers comparten las mismas
+páginas del sistema operativo y las columnas se leen sin copiarlas ni pasar por la base.
+
+La ingesta agrega las reservas confirmadas al final de las columnas; la versión previa
+de una reserva modificada queda marcada en la columna `dead`. Un hilo en segundo plano
+reconstruye el snapshot desde la base cada HISTORY_SNAPSHOT_REBUILD_SECONDS (descarta las
+filas muertas e incorpora lo escrito por procesos sin snapshot). Si el snapshot no existe,
+no se actualizó en HISTORY_SNAPSHOT_MAX_AGE_SECONDS o no cubre el período pedido
+(días compactados antes de construirlo), los servicios leen los rollups de la base.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import ERRORS, ROWS_LOADED, STAGE_LATENCY, timed
+from app.services.hourly_slots import expand_hourly_slots, split_slots, sum_by_slot
+from app.services.predict.history_loader import ColumnarResult, load_history, weekday_of
+from app.services.rollup_service import RollupKey, RollupService, split_articles
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+# Lo toma durante toda la reconstrucción el proceso que la hace (no bloquea la ingesta)
+REBUILD_LOCK_FILE = ".rebuild.lock"
+
+# Columnas por fila. `article_offsets` tiene una entrada más (CSR): los artículos de la
+# fila i son article_ids[article_offsets[i]:article_offsets[i + 1]]
+ROW_COLUMNS = {
+    "reservation_id": np.dtype(np.int64),
+    "room": np.dtype(np.int32),
+    "date": np.dtype("datetime64[D]"),
+    "start": np.dtype("datetime64[us]"),
+    "end": np.dtype("datetime64[us]"),
+    "dead": np.dtype(np.uint8),
+}
+OFFSETS = "article_offsets"
+ARTICLE_IDS = "article_ids"
+
+# Filas agregadas desde el último índice ordenado antes de reconstruirlo (escritor)
+INDEX_TAIL_LIMIT = 50000
+
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _map(path: str, dtype, length: int):
+    """Vista de solo lectura de las primeras `length` entradas de una columna."""
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+
+class HistorySnapshot:
+    """
+    Vista de lectura de una versión del snapshot. Las columnas son memmaps
+    (sin copia); `rooms` y `articles` son los diccionarios de los códigos.
+    """
+
+    def __init__(self, directory: str, manifest):
+        self.manifest = manifest
+        self.rooms = manifest["rooms"]
+        self.articles = manifest["articles"]
+        complete_from = manifest["complete_from"]
+        self.complete_from = date.fromisoformat(complete_from) if complete_from else None
+
+        rows = manifest["rows"]
+        path = os.path.join(directory, manifest["generation"])
+        self.columns = {
+            name: _map(_column_path(path, name), dtype, rows) for name, dtype in ROW_COLUMNS.items()
+        }
+        self.columns[OFFSETS] = _map(_column_path(path, OFFSETS), np.int64, rows + 1)
+        self.columns[ARTICLE_IDS] = _map(_column_path(path, ARTICLE_IDS), np.int32, manifest["article_rows"])
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def covers(self, since: Optional[date]) -> bool:
+        """True si el snapshot tiene todas las reservas desde `since` (None = todo el historial)."""
+        if self.complete_from is None:
+            return True
+        return since is not None and since >= self.complete_from
+
+    def _rows(self, since: Optional[date] = None):
+        """Índices de las filas vigentes con día >= since."""
+        mask = self["dead"] == 0
+        if since is not None:
+            mask &= self["date"] >= np.datetime64(since, "D")
+        return np.flatnonzero(mask)
+
+    @staticmethod
+    def _codes_of(labels, keys):
+        index = {label: i for i, label in enumerate(labels)}
+        return np.array([index[k] for k in keys if k in index], dtype=np.int32)
+
+    @staticmethod
+    def _result(codes, labels):
+        """
+        Recodifica `codes` sobre las etiquetas presentes ordenadas alfabéticamente,
+        como las devuelve load_columns. Devuelve (códigos, etiquetas).
+        """
+        present = np.unique(codes)
+        ordered = sorted(range(len(present)), key=lambda i: labels[present[i]])
+        remap = np.zeros(len(labels), dtype=np.int32)
+        remap[present[ordered]] = np.arange(len(present), dtype=np.int32)
+        names = [labels[present[i]] for i in ordered]
+        return remap[codes] if len(codes) else codes.astype(np.int32), names
+
+    @timed("snapshot.daily_counts")
+    def daily_counts(self, kind: str, keys=None, since: Optional[date] = None) -> ColumnarResult:
+        """
+        Reservas por clave (sala o artículo) y día desde `since`, ordenadas por clave y fecha:
+        lo mismo que leer room_daily_counts / article_daily_counts.
+        """
+        rows = self._rows(since)
+        if kind == "room":
+            labels = self.rooms
+            codes = self["room"][rows]
+            days = self["date"][rows]
+        else:
+            labels = self.articles
+            offsets = self[OFFSETS]
+            counts = offsets[rows + 1] - offsets[rows]
+            # Posiciones en article_ids de los artículos de cada fila seleccionada
+            positions = np.repeat(offsets[rows] - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+            codes = self[ARTICLE_IDS][positions]
+            days = np.repeat(self["date"][rows], counts)
+
+        if keys is not None:
+            keep = np.isin(codes, self._codes_of(labels, keys))
+            codes, days = codes[keep], days[keep]
+
+        if not len(codes):
+            data = {"key": np.empty(0, dtype=np.int32), "date": days, "count": np.empty(0)}
+            return ColumnarResult(data, {"key": []})
+
+        # Conteo denso clave x día: las celdas no vacías salen ordenadas por clave y día
+        day_numbers = days.astype(np.int64)
+        first_day = day_numbers.min()
+        span = int(day_numbers.max() - first_day) + 1
+        totals = np.bincount(codes.astype(np.int64) * span + (day_numbers - first_day))
+        cells = np.flatnonzero(totals)
+
+        cell_codes = (cells // span).astype(np.int32)
+        key_codes, names = self._result(cell_codes, labels)
+        # Las etiquetas ordenadas pueden cambiar el orden de las claves: reordenar por código nuevo
+        order = np.argsort(key_codes, kind="stable")
+        data = {
+            "key": key_codes[order],
+            "date": ((cells % span) + first_day).astype("datetime64[D]")[order],
+            "count": totals[cells].astype(np.float64)[order],
+        }
+        ROWS_LOADED.observe(len(cells), source="snapshot")
+        return ColumnarResult(data, {"key": names})
+
+    @timed("snapshot.weekday_counts")
+    def weekday_counts(self, rooms=None, since: Optional[date] = None) -> ColumnarResult:
+        """Reservas por sala y día de la semana desde `since` (sin la sala vacía)."""
+        rows = self._rows(since)
+        codes = self["room"][rows]
+        excluded = self._codes_of(self.rooms, [""])
+        keep = ~np.isin(codes, excluded)
+        if rooms is not None:
+            keep &= np.isin(codes, self._codes_of(self.rooms, rooms))
+        codes, days = codes[keep], self["date"][rows][keep]
+
+        totals = np.bincount(codes.astype(np.int64) * 7 + weekday_of(days), minlength=len(self.rooms) * 7)
+        cells = np.flatnonzero(totals)
+        room_codes, names = self._result((cells // 7).astype(np.int32), self.rooms)
+        data = {"room": room_codes, "weekday": (cells % 7).astype(np.int8), "count": totals[cells]}
+        ROWS_LOADED.observe(len(cells), source="snapshot")
+        return ColumnarResult(data, {"room": names})
+
+    @timed("snapshot.hourly_counts")
+    def hourly_counts(self, since: Optional[date] = None) -> ColumnarResult:
+        """Reservas por sala, día y hora desde `since`: lo mismo que leer room_hourly_counts."""
+        mask = (self["dead"] == 0) & ~np.isnat(self["end"])
+        if since is not None:
+            # Las reservas que empiezan antes de `since` pueden ocupar franjas posteriores
+            mask &= self["end"] > np.datetime64(since, "us")
+        rows = np.flatnonzero(mask)
+
+        slot_rows, slots = expand_hourly_slots(self["start"][rows], self["end"][rows])
+        codes, slots, totals = sum_by_slot(self["room"][rows][slot_rows], slots, np.ones(len(slot_rows)))
+        days, hours = split_slots(slots)
+        if since is not None:
+            keep = days >= np.datetime64(since, "D")
+            codes, days, hours, totals = codes[keep], days[keep], hours[keep], totals[keep]
+
+        room_codes, names = self._result(codes.astype(np.int32), self.rooms)
+        data = {"room": room_codes, "date": days, "hour": hours, "count": totals.astype(np.int32)}
+        ROWS_LOADED.observe(len(totals), source="snapshot")
+        return ColumnarResult(data, {"room": names})
+
+
+class HistorySnapshotStore:
+    """
+    Directorio del snapshot: lectura (con la vista cacheada por proceso), agregado
+    incremental y reconstrucción. Las escrituras de distintos procesos se serializan
+    con un flock sobre el directorio.
+    """
+
+    def __init__(self):
+        self._view = None
+        self._view_stat = None
+        # Índice del escritor: reservation_id ordenados de la generación actual + filas agregadas después
+        self._index = None
+
+    @property
+    def directory(self) -> str:
+        return settings.history_snapshot_dir
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest):
+        # Reemplazo atómico: los lectores ven el manifest anterior o el nuevo completo
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path())
+
+    @contextmanager
+    def _locked(self, name: str = LOCK_FILE, wait: bool = True):
+        """flock sobre `name` en el directorio. Con `wait=False` devuelve False si otro proceso lo tiene."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def open(self) -> Optional[HistorySnapshot]:
+        """Vista vigente del snapshot, o None si está deshabilitado, no existe o está desactualizado."""
+        if not self.directory:
+            return None
+        try:
+            stat = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            return None
+
+        view = self._view
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if view is None or self._view_stat != key:
+            manifest = self._read_manifest()
+            if manifest is None:
+                return None
+            try:
+                with STAGE_LATENCY.time(stage="snapshot.open"):
+                    view = HistorySnapshot(self.directory, manifest)
+            except OSError as e:
+                # Generación borrada entre leer el manifest y mapearla: los servicios leen la base
+                logger.warning(f"History snapshot {manifest['generation']} unavailable: {e}")
+                return None
+            self._view, self._view_stat = view, key
+
+        if time.time() - view.manifest["synced_at"] > settings.history_snapshot_max_age_seconds:
+            return None
+        return view
+
+    @timed("snapshot.rebuild")
+    def rebuild(self, db: Session, only_if_due: bool = False) -> Optional[int]:
+        """
+        Escribe una generación nueva del snapshot desde reservation_history. Devuelve las filas.
+        Con `only_if_due` no hace nada (None) si otro proceso ya lo reconstruyó en este intervalo
+        o lo está reconstruyendo.
+
+        La generación se construye fuera del lock de escritura (la ingesta sigue agregando a la
+        vigente); al publicarla se reaplican las filas agregadas desde el inicio de la construcción.
+        Sin snapshot previo se construye con el lock tomado, para no perder esos agregados.
+        """
+        with self._locked(REBUILD_LOCK_FILE, wait=not only_if_due) as acquired:
+            if not acquired:
+                return None
+            with self._locked():
+                previous = self._read_manifest()
+                if only_if_due and not self._due(previous):
+                    return None
+                if previous is None:
+                    return self._build(db, 1)
+                base_rows = previous["rows"]
+
+            number = self._build(db, previous["number"] + 1, publish=False)
+            with self._locked():
+                current = self._read_manifest()
+                manifest = self._replay(previous, current, base_rows, number)
+                self._write_manifest(manifest)
+                self._remove_generations(keep={manifest["generation"], previous["generation"]})
+                return manifest["rows"]
+
+    def _build(self, db: Session, number: int, publish: bool = True):
+        """
+        Escribe la generación `number` desde la base. Con `publish` escribe su manifest y
+        devuelve las filas; si no, devuelve el manifest sin publicarlo.
+        """
+        generation = f"gen-{number}"
+        path = os.path.join(self.directory, generation)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        complete_from = RollupService.compacted_before(db)
+        history = load_history(
+            db, ["reservation_id", "room_name", "date_hour_start", "date_hour_end", "articles"]
+        )
+        starts = history["date_hour_start"]
+        article_lists = [split_articles(a) for a in history["articles"]]
+        articles = sorted({a for names in article_lists for a in names})
+        article_index = {a: i for i, a in enumerate(articles)}
+        article_ids = np.fromiter(
+            (article_index[a] for names in article_lists for a in names), dtype=np.int32
+        )
+        offsets = np.zeros(len(history) + 1, dtype=np.int64)
+        np.cumsum([len(names) for names in article_lists], out=offsets[1:])
+
+        columns = {
+            "reservation_id": history["reservation_id"],
+            "room": history["room_name"],
+            "date": starts.astype("datetime64[D]"),
+            "start": starts,
+            "end": history["date_hour_end"],
+            "dead": np.zeros(len(history), dtype=np.uint8),
+            OFFSETS: offsets,
+            ARTICLE_IDS: article_ids,
+        }
+        for name, values in columns.items():
+            dtype = ROW_COLUMNS.get(name, values.dtype)
+            np.ascontiguousarray(values, dtype=dtype).tofile(_column_path(path, name))
+
+        now = time.time()
+        manifest = {
+            "number": number,
+            "generation": generation,
+            "rows": len(history),
+            "article_rows": len(article_ids),
+            "rooms": history.categories["room_name"],
+            "articles": articles,
+            "complete_from": complete_from.isoformat() if complete_from else None,
+            "built_at": now,
+            "synced_at": now,
+        }
+        if not publish:
+            return manifest
+        self._write_manifest(manifest)
+        self._remove_generations(keep={generation})
+        return len(history)
+
+    def _replay(self, previous, current, base_rows: int, manifest):
+        """
+        Agrega a la generación nueva (`manifest`) las filas que la ingesta escribió en la
+        vigente (`current`) desde `base_rows`. Las que ya estaban en la base al construirla
+        quedan como versiones muertas. Devuelve el manifest a publicar.
+        """
+        path = os.path.join(self.directory, current["generation"])
+        rows = current["rows"]
+        if current["generation"] != previous["generation"] or rows <= base_rows:
+            return manifest
+
+        offsets = _map(_column_path(path, OFFSETS), np.int64, rows + 1)
+        article_ids = _map(_column_path(path, ARTICLE_IDS), np.int32, current["article_rows"])
+        rids = _map(_column_path(path, "reservation_id"), np.int64, rows)
+        room_codes = _map(_column_path(path, "room"), np.int32, rows)
+        starts = _map(_column_path(path, "start"), ROW_COLUMNS["start"], rows)
+        ends = _map(_column_path(path, "end"), ROW_COLUMNS["end"], rows)
+
+        # Las versiones repetidas de una reserva se resuelven en orden: queda la última
+        keys = {}
+        for row in range(base_rows, rows):
+            rid = int(rids[row])
+            keys.pop(rid, None)
+            keys[rid] = RollupKey(
+                current["rooms"][room_codes[row]],
+                starts[row].item(),
+                tuple(current["articles"][a] for a in article_ids[offsets[row]:offsets[row + 1]]),
+                ends[row].item(),
+            )
+        return self._append_rows(manifest, keys)
+
+    def _remove_generations(self, keep):
+        """
+        Borra las generaciones que no están en `keep`. La anterior a la publicada se conserva
+        un ciclo más: un lector que leyó su manifest todavía puede mapearla.
+        """
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @timed("snapshot.append")
+    def append(self, keys):
+        """
+        Agrega las reservas confirmadas (dict reservation_id -> RollupKey) y marca como
+        muertas sus versiones anteriores. No hace nada si el snapshot no existe.
+        """
+        if not self.directory or not keys:
+            return
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is None:
+                return
+            self._append_rows(manifest, keys)
+
+    def _append_rows(self, manifest, keys):
+        """Agrega `keys` a la generación de `manifest` y publica el manifest resultante (con el lock tomado)."""
+        path = os.path.join(self.directory, manifest["generation"])
+        rows, article_rows = manifest["rows"], manifest["article_rows"]
+
+        # Descartar restos de un agregado interrumpido antes de escribir el manifest
+        for name, dtype in ROW_COLUMNS.items():
+            os.truncate(_column_path(path, name), rows * dtype.itemsize)
+        os.truncate(_column_path(path, OFFSETS), (rows + 1) * 8)
+        os.truncate(_column_path(path, ARTICLE_IDS), article_rows * 4)
+
+        previous_rows = self._lookup(manifest, path, list(keys))
+
+        rooms = {room: i for i, room in enumerate(manifest["rooms"])}
+        articles = {article: i for i, article in enumerate(manifest["articles"])}
+        room_codes, article_ids, counts = [], [], []
+        for key in keys.values():
+            room_codes.append(rooms.setdefault(key.room_name, len(rooms)))
+            article_ids.extend(articles.setdefault(a, len(articles)) for a in key.articles)
+            counts.append(len(key.articles))
+
+        starts = np.array([key.date_hour_start for key in keys.values()], dtype="datetime64[us]")
+        new_columns = {
+            "reservation_id": np.fromiter(keys, dtype=np.int64, count=len(keys)),
+            "room": np.array(room_codes, dtype=np.int32),
+            "date": starts.astype("datetime64[D]"),
+            "start": starts,
+            "end": np.array([key.date_hour_end for key in keys.values()], dtype="datetime64[us]"),
+            "dead": np.zeros(len(keys), dtype=np.uint8),
+            OFFSETS: article_rows + np.cumsum(counts, dtype=np.int64),
+            ARTICLE_IDS: np.array(article_ids, dtype=np.int32),
+        }
+        for name, values in new_columns.items():
+            with open(_column_path(path, name), "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=ROW_COLUMNS.get(name, values.dtype)).tobytes())
+
+        updated = dict(
+            manifest,
+            rows=rows + len(keys),
+            article_rows=article_rows + len(article_ids),
+            rooms=list(rooms),
+            articles=list(articles),
+            synced_at=time.time(),
+        )
+        self._write_manifest(updated)
+
+        # Las versiones previas se marcan después de publicar las nuevas
+        if len(previous_rows):
+            dead = np.memmap(_column_path(path, "dead"), dtype=np.uint8, mode="r+", shape=(rows,))
+            dead[previous_rows] = 1
+            dead.flush()
+
+        self._index["tail"].update(
+            (rid, rows + i) for i, rid in enumerate(new_columns["reservation_id"].tolist())
+        )
+        self._index["rows"] = rows + len(keys)
+        return updated
+
+    def _lookup(self, manifest, path: str, reservation_ids):
+        """Filas vigentes de las reservas pedidas (índice del escritor, se actualiza si otro proceso agregó filas)."""
+        rows = manifest["rows"]
+        index = self._index
+        if (
+            index is None
+            or index["generation"] != manifest["generation"]
+            or index["rows"] > rows
+            or len(index["tail"]) + rows - index["rows"] > INDEX_TAIL_LIMIT
+        ):
+            rids = _map(_column_path(path, "reservation_id"), np.int64, rows)
+            order = np.argsort(rids, kind="stable")
+            index = self._index = {
+                "generation": manifest["generation"], "rows": rows,
+                "sorted": np.asarray(rids[order]), "order": order, "tail": {},
+            }
+        elif index["rows"] < rows:
+            # Filas agregadas por otro proceso desde la última vez
+            rids = _map(_column_path(path, "reservation_id"), np.int64, rows)
+            index["tail"].update((rid, index["rows"] + i) for i, rid in enumerate(rids[index["rows"]:].tolist()))
+            index["rows"] = rows
+
+        found = []
+        sorted_rids, order, tail = index["sorted"], index["order"], index["tail"]
+        for rid in reservation_ids:
+            row = tail.get(rid)
+            if row is None:
+                # La última aparición es la versión más reciente
+                pos = np.searchsorted(sorted_rids, rid, side="right") - 1
+                if pos >= 0 and sorted_rids[pos] == rid:
+                    row = int(order[pos])
+            if row is not None:
+                found.append(row)
+        return np.array(found, dtype=np.int64)
+
+    @staticmethod
+    def _due(manifest) -> bool:
+        return manifest is None or time.time() - manifest["built_at"] >= settings.history_snapshot_rebuild_seconds
+
+    def needs_rebuild(self) -> bool:
+        return self._due(self._read_manifest())
+
+
+history_snapshot = HistorySnapshotStore()
+
+
+def start_snapshot_job():
+    """Construye el snapshot al arrancar y lo reconstruye periódicamente (si HISTORY_SNAPSHOT_DIR está definido)"""
+    if not settings.history_snapshot_dir:
+        return
+
+    def _snapshot_thread():
+        from app.core.database import SessionLocal
+
+        while True:
+            # Con varios workers solo reconstruye el primero que encuentra el snapshot vencido
+            if history_snapshot.needs_rebuild():
+                db = SessionLocal()
+                try:
+                    rows = history_snapshot.rebuild(db, only_if_due=True)
+                    if rows is not None:
+                        logger.info(f"History snapshot rebuilt with {rows} reservations")
+                except Exception as e:
+                    ERRORS.inc(component="snapshot")
+                    logger.error(f"Error rebuilding history snapshot: {e}")
+                finally:
+                    db.close()
+            time.sleep(min(settings.history_snapshot_rebuild_seconds, 60))
+
+    thread = threading.Thread(target=_snapshot_thread, name="history-snapshot", daemon=True)
+    thread.start()
+    logger.info("History snapshot job started")
@@ -0,0 +1,246 @@
+"""
+Predicción de ocupación por franja horaria.
+Con una ventana de entrenamiento global (TRAINING_LOOKBACK_DAYS) usa un cubo en memoria
+(sala x día x hora) que se carga del rollup room_hourly_counts dentro de la ventana y se
+actualiza con los deltas de cada ingesta confirmada en este proceso. Sin ventana (el cubo
+crecería con toda la antigüedad de la tabla) o con otro `lookback_days` se lee el rollup
+de la sala pedida.
+"""
+
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import timed
+from app.schemas.rollup_schema import RoomHourlyCount
+from app.services.hourly_slots import expand_hourly_slots, split_slots
+from app.services.predict.history_loader import CATEGORY, DATE, load_columns, weekday_of
+from app.services.predict.history_snapshot import history_snapshot
+from app.services.predict.model_registry import lookback_start
+from app.services.predict.occupancy_service import OccupancyPredictionService
+
+HOURS_PER_DAY = 24
+
+# Ventana máxima de una predicción por franjas (31 días)
+MAX_PREDICTION_HOURS = 24 * 31
+
+# Días libres que se agregan al final del cubo al extenderlo: las reservas futuras
+# no obligan a copiar el arreglo entero (con el lock tomado) en cada ingesta
+CUBE_GROWTH_DAYS = 30
+
+
+def slot_probabilities_of(occupied, first_day):
+    """
+    Matriz (weekday, hora) con la fracción de días de cada weekday en que la franja estuvo
+    ocupada (`occupied[día, hora]` desde `first_day`), entre el primer y el último día con
+    reservas. None si no hay datos.
+    """
+    used = np.flatnonzero(occupied.any(axis=1))
+    if not len(used):
+        return None
+    occupied = occupied[used[0]:used[-1] + 1]
+
+    weekdays = weekday_of(first_day + used[0] + np.arange(len(occupied)))
+    occupied_days = np.zeros((7, HOURS_PER_DAY))
+    np.add.at(occupied_days, weekdays, occupied)
+    n_days = np.bincount(weekdays, minlength=7)[:, None]
+    return np.divide(occupied_days, n_days, out=np.zeros_like(occupied_days), where=n_days > 0)
+
+
+class HourlyOccupancyCube:
+    """
+    Conteos densos `counts[sala, día, hora]` desde `first_day` (datetime64[D]).
+    `rooms` mapea cada sala a su índice en el primer eje.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rooms = {}
+        self.counts = np.zeros((0, 0, HOURS_PER_DAY), dtype=np.int32)
+        self.first_day = None
+        self._loaded_at = None
+        self._window_start = None
+
+    def is_stale(self) -> bool:
+        """Sin cargar, con la ventana de entrenamiento desplazada o vencido el intervalo de recarga."""
+        if self._loaded_at is None or lookback_start() != self._window_start:
+            return True
+        # La recarga periódica incorpora lo ingerido por otros procesos
+        interval = settings.hourly_cube_reload_seconds
+        return interval > 0 and time.monotonic() - self._loaded_at >= interval
+
+    def ensure_loaded(self, db: Session):
+        if self.is_stale():
+            self.load(db)
+        return self
+
+    @timed("hourly.load")
+    def load(self, db: Session):
+        """
+        Arma el cubo desde el rollup horario, o desde el snapshot del historial si está vigente
+        (solo los días de la ventana de entrenamiento).
+        """
+        window_start = lookback_start()
+        snapshot = history_snapshot.open()
+        if snapshot is not None and snapshot.covers(window_start):
+            data = snapshot.hourly_counts(window_start)
+        else:
+            stmt = select(
+                RoomHourlyCount.room_name, RoomHourlyCount.date, RoomHourlyCount.hour, RoomHourlyCount.reservations
+            )
+            if window_start is not None:
+                stmt = stmt.where(RoomHourlyCount.date >= window_start)
+            data = load_columns(db, stmt, {"room": CATEGORY, "date": DATE, "hour": np.int64, "count": np.int32})
+
+        labels = data.labels("room")
+        first_day = data["date"].min() if len(data) else None
+        day_index = (data["date"] - first_day).astype(np.int64) if len(data) else data["date"].astype(np.int64)
+        n_days = int(day_index.max()) + 1 if len(data) else 0
+
+        counts = np.zeros((len(labels), n_days, HOURS_PER_DAY), dtype=np.int32)
+        counts[data["room"], day_index, data["hour"]] = data["count"]
+
+        with self._lock:
+            self.rooms = {room: i for i, room in enumerate(labels)}
+            self.counts = counts
+            self.first_day = first_day
+            self._window_start = window_start
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Marca el cubo como vencido: la próxima consulta lo recarga desde el rollup."""
+        with self._lock:
+            self._loaded_at = None
+
+    def apply_deltas(self, deltas):
+        """
+        Suma los deltas del rollup horario ({(sala, fecha, hora): delta}) al cubo ya cargado.
+        Si todavía no se cargó no hace nada: la carga leerá el estado confirmado.
+        """
+        if not deltas or self._loaded_at is None:
+            return
+
+        rooms = [key[0] for key in deltas]
+        days = np.array([key[1] for key in deltas], dtype="datetime64[D]")
+        hours = np.array([key[2] for key in deltas], dtype=np.int64)
+        values = np.fromiter(deltas.values(), dtype=np.int32, count=len(deltas))
+
+        with self._lock:
+            if self._window_start is not None:
+                keep = days >= np.datetime64(self._window_start)
+                rooms = [room for room, k in zip(rooms, keep) if k]
+                days, hours, values = days[keep], hours[keep], values[keep]
+                if not len(days):
+                    return
+
+            self._grow(rooms, days)
+            room_index = np.array([self.rooms[room] for room in rooms], dtype=np.int64)
+            day_index = (days - self.first_day).astype(np.int64)
+
+            np.add.at(self.counts, (room_index, day_index, hours), values)
+
+    def _grow(self, rooms, days):
+        """Agrega al cubo las salas nuevas y extiende el eje de días para cubrir `days`."""
+        new_rooms = [room for room in dict.fromkeys(rooms) if room not in self.rooms]
+        if new_rooms:
+            for room in new_rooms:
+                self.rooms[room] = len(self.rooms)
+            n_days = self.counts.shape[1]
+            self.counts = np.concatenate(
+                [self.counts, np.zeros((len(new_rooms), n_days, HOURS_PER_DAY), dtype=np.int32)]
+            )
+
+        low, high = days.min(), days.max()
+        if self.first_day is None:
+            self.first_day = low
+        # Ambos márgenes se miden desde el first_day anterior al relleno
+        before = max(int((self.first_day - low).astype(np.int64)), 0)
+        after = max(int((high - self.first_day).astype(np.int64)) + 1 - self.counts.shape[1], 0)
+        if after:
+            after += CUBE_GROWTH_DAYS
+        if before or after:
+            self.counts = np.pad(self.counts, ((0, 0), (before, after), (0, 0)))
+            self.first_day = self.first_day - before
+
+    def slot_probabilities(self, room_name: str):
+        """Probabilidades (weekday, hora) de la sala según el cubo (ver slot_probabilities_of)."""
+        with self._lock:
+            index = self.rooms.get(room_name)
+            if index is None:
+                return None
+            occupied = self.counts[index] > 0
+            first_day = self.first_day
+
+        return slot_probabilities_of(occupied, first_day)
+
+
+hourly_cube = HourlyOccupancyCube()
+
+
+class HourlyOccupancyService:
+    """Predice la ocupación de una sala en cada franja horaria de una ventana."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def predict_slots(self, room_name: str, date_hour_start: str, date_hour_end: str, lookback_days=None):
+        start_date, end_date = OccupancyPredictionService.parse_dates(date_hour_start, date_hour_end)
+        self.check_window(start_date, end_date)
+
+        if lookback_days is None and lookback_start() is not None:
+            probabilities = hourly_cube.ensure_loaded(self.db).slot_probabilities(room_name)
+        else:
+            probabilities = self.room_slot_probabilities(self.db, room_name, lookback_start(lookback_days))
+
+        return self.predict_from_probabilities(room_name, probabilities, start_date, end_date)
+
+    @staticmethod
+    def check_window(start_date: datetime, end_date: datetime):
+        if end_date <= start_date:
+            raise ValueError("date_hour_end must be later than date_hour_start.")
+        if (end_date - start_date).total_seconds() > MAX_PREDICTION_HOURS * 3600:
+            raise ValueError(f"The time window cannot exceed {MAX_PREDICTION_HOURS} hours.")
+
+    @staticmethod
+    @timed("hourly.room_load")
+    def room_slot_probabilities(db: Session, room_name: str, since=None):
+        """Probabilidades (weekday, hora) de una sala leídas del rollup horario, con días desde `since`."""
+        stmt = select(RoomHourlyCount.date, RoomHourlyCount.hour).where(
+            RoomHourlyCount.room_name == room_name, RoomHourlyCount.reservations > 0
+        )
+        if since is not None:
+            stmt = stmt.where(RoomHourlyCount.date >= since)
+        data = load_columns(db, stmt, {"date": DATE, "hour": np.int64})
+        if not len(data):
+            return None
+
+        first_day = data["date"].min()
+        day_index = (data["date"] - first_day).astype(np.int64)
+        occupied = np.zeros((int(day_index.max()) + 1, HOURS_PER_DAY), dtype=bool)
+        occupied[day_index, data["hour"]] = True
+        return slot_probabilities_of(occupied, first_day)
+
+    @staticmethod
+    @timed("hourly.predict")
+    def predict_from_probabilities(room_name: str, probabilities, start_date: datetime, end_date: datetime):
+        if probabilities is None:
+            return None
+
+        _, slots = expand_hourly_slots([start_date], [end_date])
+        days, hours = split_slots(slots)
+        slot_probability = probabilities[weekday_of(days), hours]
+
+        probability = float(slot_probability.mean())
+        return {
+            "room": room_name,
+            "occupation_probability": round(probability, 2),
+            "peak_probability": round(float(slot_probability.max()), 2),
+            "trend": OccupancyPredictionService.trend_of(probability),
+            "slots": [
+                {"start": start, "occupation_probability": round(value, 2)}
+                for start, value in zip(np.datetime_as_string(slots, unit="s").tolist(), slot_probability.tolist())
+            ],
+        }
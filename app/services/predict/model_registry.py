@@ -0,0 +1,375 @@
+"""
+Registro persistente de modelos de tendencia por sala y por artículo.
+Los parámetros ajustados se guardan en la tabla trend_models y se recalculan
+en segundo plano solo para las claves cuyos rollups cambiaron, que quedan marcadas
+en trend_models_dirty por la transacción que los cambió.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+from app.core.cache import commit_data_version
+from app.core.config import settings
+from app.core.metrics import ERRORS, STAGE_LATENCY, timed
+from app.schemas.rollup_schema import ArticleDailyCount, RoomDailyCount
+from app.schemas.trend_model_schema import TrendModel, TrendModelDirty, TrendModelWindow
+from app.services.predict.history_loader import CATEGORY, DATE, load_columns, weekday_of
+from app.services.predict.history_snapshot import history_snapshot
+from app.services.predict.trend_engine import fit_linear_trends
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+# Valor por defecto para normalizar cuando no conocemos la capacidad real de la sala
+DEFAULT_ROOM_CAPACITY = 10
+
+# Rollup diario del que se entrena cada tipo de modelo
+MODEL_SOURCES = {
+    "room": (RoomDailyCount, RoomDailyCount.room_name),
+    "article": (ArticleDailyCount, ArticleDailyCount.article),
+}
+
+# Tamaño máximo de las listas IN al refrescar claves puntuales
+KEYS_PER_QUERY = 500
+
+
+def lookback_start(lookback_days: Optional[int] = None) -> Optional[date]:
+    """
+    Primer día de la ventana de entrenamiento (None = todo el historial).
+    Sin `lookback_days` se usa la ventana global de settings.
+    """
+    days = settings.training_lookback_days if lookback_days is None else lookback_days
+    if days <= 0:
+        return None
+    return date.today() - timedelta(days=days)
+
+
+def training_window(since=None, lookback_days: Optional[int] = None) -> Optional[date]:
+    """Fecha desde la que se entrena una consulta: la más reciente entre `since` y la ventana."""
+    starts = [start for start in (since, lookback_start(lookback_days)) if start is not None]
+    return max(starts, default=None)
+
+
+class ModelRegistry:
+    """
+    Entrena, guarda y sirve los modelos de tendencia.
+    Un modelo es un dict con n_points, slope, intercept, mean, denom,
+    first_value, last_value, last_date y fallback (promedios por weekday).
+    """
+
+    @staticmethod
+    def compute_models(db: Session, kind: str, keys=None, since=None):
+        """
+        Ajusta los modelos desde los rollups sin guardarlos (todas las claves si keys es None).
+        Con `since` solo se usan los días desde esa fecha.
+        Los conteos salen del snapshot del historial si está vigente y cubre el período.
+        """
+        snapshot = history_snapshot.open()
+        if snapshot is not None and snapshot.covers(since):
+            history = snapshot.daily_counts(kind, keys, since)
+        else:
+            source, key_column = MODEL_SOURCES[kind]
+            stmt = (
+                select(key_column, source.date, source.reservations)
+                .order_by(key_column.asc(), source.date.asc())
+            )
+            if keys is not None:
+                stmt = stmt.where(key_column.in_(list(keys)))
+            if since is not None:
+                stmt = stmt.where(source.date >= since)
+
+            history = load_columns(db, stmt, {"key": CATEGORY, "date": DATE, "count": np.float64})
+        if not len(history):
+            return []
+
+        with STAGE_LATENCY.time(stage="models.fit"):
+            return ModelRegistry._fit_models(kind, history)
+
+    @staticmethod
+    def _fit_models(kind: str, history):
+        labels = history.labels("key")
+        y = history["count"]
+        weekdays = weekday_of(history["date"])
+
+        fit = fit_linear_trends(history["key"], y, len(labels))
+
+        # Normalización: max(percentil 90, máximo, capacidad); el percentil 90 nunca supera al máximo
+        denom = np.maximum(fit.maximum, max(DEFAULT_ROOM_CAPACITY, 1.0))
+        first, last = fit.first_of(y), fit.last_of(y)
+        last_dates = fit.last_of(history["date"]).astype(object)
+
+        models = []
+        for i, key in enumerate(labels):
+            fallback = None
+            if fit.n[i] < 3:
+                # Promedio histórico por día de semana para series cortas
+                rows = fit.rows_of(i)
+                fallback = {
+                    int(wk): float(y[rows][weekdays[rows] == wk].mean())
+                    for wk in np.unique(weekdays[rows])
+                }
+
+            models.append({
+                "kind": kind,
+                "key": key,
+                "n_points": int(fit.n[i]),
+                "slope": float(fit.slope[i]),
+                "intercept": float(fit.intercept[i]),
+                "mean": float(fit.mean[i]),
+                "denom": float(denom[i]),
+                "first_value": float(first[i]),
+                "last_value": float(last[i]),
+                "last_date": last_dates[i],
+                "fallback": fallback,
+            })
+
+        return models
+
+    @staticmethod
+    @timed("models.load")
+    def load_models(db: Session, kind: str, keys=None):
+        """Devuelve los modelos guardados, ordenados por clave."""
+        stmt = select(TrendModel.__table__).where(TrendModel.kind == kind)
+        if keys is not None:
+            stmt = stmt.where(TrendModel.key.in_(list(keys)))
+
+        models = []
+        for row in db.execute(stmt).mappings():
+            model = dict(row)
+            if model["fallback"]:
+                model["fallback"] = {int(k): v for k, v in json.loads(model["fallback"]).items()}
+            models.append(model)
+
+        return sorted(models, key=lambda m: m["key"])
+
+    @staticmethod
+    def select_models(db: Session, kind: str, keys=None, since=None, lookback_days=None):
+        """
+        Modelos para una consulta filtrada, ordenados por clave: los guardados
+        (ventana global) o, si se pide otro período (`since` o `lookback_days`),
+        ajustados al vuelo sobre ese período.
+        """
+        if since is None and lookback_days is None:
+            return ModelRegistry.load_models(db, kind, keys)
+        return ModelRegistry.compute_models(db, kind, keys, training_window(since, lookback_days))
+
+    @staticmethod
+    def get_models(db: Session, kind: str, keys, lookback_days=None):
+        """
+        Modelos guardados de las claves pedidas; las que aún no tienen modelo se ajustan al vuelo.
+        Con `lookback_days` todos se ajustan al vuelo sobre esa ventana.
+        """
+        if lookback_days is not None:
+            models = ModelRegistry.compute_models(db, kind, keys, lookback_start(lookback_days))
+            return {m["key"]: m for m in models}
+
+        models = {m["key"]: m for m in ModelRegistry.load_models(db, kind, keys)}
+        missing = [k for k in keys if k not in models]
+        if missing:
+            models.update({m["key"]: m for m in ModelRegistry.compute_models(db, kind, missing, lookback_start())})
+        return models
+
+    @staticmethod
+    @timed("models.refresh")
+    def refresh(db: Session, kind: str, keys=None) -> int:
+        """Reentrena y guarda los modelos de las claves (todas si keys es None) con la ventana global."""
+        key_batches = [None] if keys is None else [
+            list(keys)[i:i + KEYS_PER_QUERY] for i in range(0, len(keys), KEYS_PER_QUERY)
+        ]
+        table = TrendModel.__table__
+        updated_at = datetime.utcnow()
+        since = lookback_start()
+        refreshed = 0
+
+        try:
+            for batch in key_batches:
+                models = ModelRegistry.compute_models(db, kind, batch, since)
+
+                # Las claves sin datos (p. ej. una sala que quedó vacía) pierden su modelo
+                stmt = delete(table).where(table.c.kind == kind)
+                if batch is not None:
+                    stmt = stmt.where(table.c.key.in_(batch))
+                db.execute(stmt)
+
+                if models:
+                    db.execute(
+                        insert(table),
+                        [
+                            dict(
+                                m,
+                                fallback=json.dumps(m["fallback"]) if m["fallback"] else None,
+                                updated_at=updated_at,
+                            )
+                            for m in models
+                        ],
+                    )
+                refreshed += len(models)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return refreshed
+
+    @classmethod
+    def refresh_all(cls, db: Session):
+        window_start = lookback_start()
+        pending = cls.pending_dirty(db)
+        for kind in MODEL_SOURCES:
+            ModelRegistry.refresh(db, kind)
+        cls._clear_dirty(db, pending)
+        cls._save_window(db, window_start)
+
+    @staticmethod
+    def _save_window(db: Session, window_start: Optional[date]):
+        """Guarda el inicio de la ventana con la que se reentrenaron todos los modelos."""
+        table = TrendModelWindow.__table__
+        result = db.execute(update(table).where(table.c.id == 1).values(window_start=window_start))
+        if result.rowcount == 0:
+            db.execute(insert(table).values(id=1, window_start=window_start))
+        db.commit()
+
+    @staticmethod
+    def window_moved(db: Session) -> bool:
+        """True si la ventana global avanzó desde el último reentrenamiento completo (de cualquier proceso)."""
+        row = db.execute(select(TrendModelWindow.window_start).where(TrendModelWindow.id == 1)).first()
+        # No retener la transacción de lectura mientras se reentrena
+        db.rollback()
+        return row is None or row.window_start != lookback_start()
+
+    @staticmethod
+    def mark_dirty(db: Session, kind: str, keys):
+        """
+        Marca en trend_models_dirty claves cuyos datos cambiaron, dentro de la transacción
+        actual (se confirman junto con los datos).
+        """
+        if not keys:
+            return
+        # Orden fijo para que dos transacciones no tomen los locks en orden inverso
+        rows = [{"kind": kind, "key": key, "version": 1} for key in sorted(keys)]
+        table = TrendModelDirty.__table__
+        upsert = RollupService.increment_statement(db, table, "version")
+        if upsert is not None:
+            db.execute(upsert, rows)
+            return
+        for row in rows:
+            result = db.execute(
+                update(table)
+                .where(table.c.kind == kind, table.c.key == row["key"])
+                .values(version=table.c.version + 1)
+            )
+            if result.rowcount == 0:
+                db.execute(insert(table).values(**row))
+
+    @staticmethod
+    def mark_dirty_from_rollups(db: Session, deltas):
+        """Marca las salas y artículos afectados por los deltas de RollupService (antes del commit)."""
+        ModelRegistry.mark_dirty(db, "room", {key[0] for key in deltas.get(RoomDailyCount, {})})
+        ModelRegistry.mark_dirty(db, "article", {key[0] for key in deltas.get(ArticleDailyCount, {})})
+
+    @staticmethod
+    def refresh_after_commit(db: Session):
+        """Sin refresco en segundo plano, reentrena en el momento las claves marcadas."""
+        if settings.model_refresh_interval_seconds > 0:
+            return
+        try:
+            ModelRegistry.refresh_dirty(db)
+        except Exception as e:
+            # Los datos ya están confirmados: el error no debe afectar al guardado
+            ERRORS.inc(component="model_refresh")
+            logger.error(f"Error refreshing trend models: {e}")
+
+    @staticmethod
+    def pending_dirty(db: Session):
+        """Marcas pendientes: {(kind, key): version}."""
+        table = TrendModelDirty.__table__
+        pending = {(row.kind, row.key): row.version for row in db.execute(select(table))}
+        # No retener la transacción de lectura mientras se reentrena
+        db.rollback()
+        return pending
+
+    @staticmethod
+    def _clear_dirty(db: Session, pending):
+        """Borra las marcas reentrenadas que no volvieron a cambiar desde que se leyeron."""
+        if not pending:
+            return
+        table = TrendModelDirty.__table__
+        db.execute(
+            delete(table).where(
+                table.c.kind == bindparam("dirty_kind"),
+                table.c.key == bindparam("dirty_key"),
+                table.c.version == bindparam("dirty_version"),
+            ),
+            [
+                {"dirty_kind": kind, "dirty_key": key, "dirty_version": version}
+                for (kind, key), version in pending.items()
+            ],
+        )
+        db.commit()
+
+    @classmethod
+    def refresh_dirty(cls, db: Session) -> int:
+        """
+        Reentrena solo las claves marcadas en trend_models_dirty (por cualquier proceso).
+        Devuelve la cantidad de claves procesadas. Si falla, las marcas quedan para el próximo ciclo.
+        """
+        pending = cls.pending_dirty(db)
+        if not pending:
+            return 0
+
+        by_kind = {}
+        for kind, key in pending:
+            by_kind.setdefault(kind, []).append(key)
+        for kind, keys in by_kind.items():
+            ModelRegistry.refresh(db, kind, sorted(keys))
+
+        cls._clear_dirty(db, pending)
+        return len(pending)
+
+    @classmethod
+    def run_once(cls, session_factory):
+        """Un ciclo del refresco: todos los modelos si cambió la ventana, si no solo las claves marcadas."""
+        db = session_factory()
+        try:
+            if cls.window_moved(db):
+                # Cambió el día: los días que salieron de la ventana dejan de contar
+                cls.refresh_all(db)
+                commit_data_version(db)
+            elif cls.refresh_dirty(db):
+                # Los resultados cacheados usaban los modelos anteriores
+                commit_data_version(db)
+        finally:
+            db.close()
+
+
+def start_model_refresher():
+    """Inicia el reentrenamiento periódico de modelos en un hilo separado"""
+    interval = settings.model_refresh_interval_seconds
+    if interval <= 0:
+        # Sin hilo: DataCollectorService reentrena en línea tras cada commit
+        return
+
+    def _refresher_thread():
+        from app.core.database import SessionLocal, job_lock
+
+        while True:
+            time.sleep(interval)
+            try:
+                # Cada proceso inicia el hilo, pero solo uno reentrena a la vez
+                with job_lock("trend_model_refresh") as acquired:
+                    if acquired:
+                        ModelRegistry.run_once(SessionLocal)
+            except Exception as e:
+                ERRORS.inc(component="model_refresh")
+                logger.error(f"Error refreshing trend models: {e}")
+
+    thread = threading.Thread(target=_refresher_thread, daemon=True)
+    thread.start()
+    logger.info("Trend model refresher started")
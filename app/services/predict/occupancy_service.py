@@ -1,91 +1,113 @@
 from datetime import datetime
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from sqlalchemy.orm import Session
-from app.schemas.history_schema import ReservationHistory
-
-# Valor por defecto para normalizar la probabilidad cuando no se conoce la capacidad real
-DEFAULT_ROOM_CAPACITY = 10
+from app.core.metrics import timed
+from app.services.predict.model_registry import ModelRegistry
 
 class OccupancyPredictionService:
     """
     Servicio encargado de predecir la ocupación de salas
     usando datos históricos de la tabla reservation_history.
+    Las predicciones salen de los modelos guardados por ModelRegistry.
     """
 
     def __init__(self, db: Session):
         self.db = db
 
-    def predict_occupancy(self, room_name: str, date_hour_start: str, date_hour_end: str):
+    def predict_occupancy(self, room_name: str, date_hour_start: str, date_hour_end: str, lookback_days=None):
         """Predicts the probability of occupancy for a specific room."""
 
+        start_date, end_date = self.parse_dates(date_hour_start, date_hour_end)
+
+        # Modelo guardado de la sala (se ajusta al vuelo si todavía no existe o si se pide otra ventana)
+        fit = ModelRegistry.get_models(self.db, "room", [room_name], lookback_days).get(room_name)
+
+        if fit is None:
+            return None
+
+        return self.predict_from_fit(room_name, fit, start_date, end_date)
+
+    def predict_occupancy_batch(self, items, lookback_days=None):
+        """
+        Predicts the occupancy of several (room, window) pairs.
+        Loads the models of all rooms in one query and reuses each fit for every window.
+        Returns one result per item, in request order; failed items carry an `error`.
+        """
+        # Un único acceso al registro para todas las salas pedidas
+        room_names = sorted({item.room_name for item in items})
+        fits = ModelRegistry.get_models(self.db, "room", room_names, lookback_days)
+
+        return self.predict_batch_from_fits(items, fits)
+
+    @staticmethod
+    @timed("occupancy.predict")
+    def predict_batch_from_fits(items, fits):
+        """Resuelve cada ítem del lote con los modelos ya cargados (dict sala -> modelo)."""
+        results = []
+        for item in items:
+            try:
+                start_date, end_date = OccupancyPredictionService.parse_dates(
+                    item.date_hour_start, item.date_hour_end
+                )
+            except ValueError as ve:
+                results.append({"room": item.room_name, "error": str(ve)})
+                continue
+
+            fit = fits.get(item.room_name)
+            if fit is None:
+                results.append({
+                    "room": item.room_name,
+                    "error": f"There is no historical data for the room '{item.room_name}'",
+                })
+                continue
+
+            results.append(
+                OccupancyPredictionService.predict_from_fit(item.room_name, fit, start_date, end_date)
+            )
+
+        return results
+
+    @staticmethod
+    def parse_dates(date_hour_start: str, date_hour_end: str):
         # Convertir fechas a objetos datetime
         try:
             start_date = datetime.fromisoformat(date_hour_start)
             end_date = datetime.fromisoformat(date_hour_end)
         except ValueError:
             raise ValueError("Invalid date format.. Use YYYY-MM-DD o YYYY-MM-DDTHH:MM:SS")
+        return start_date, end_date
 
-        # Obtener los registros históricos de la sala
-        records = (
-            self.db.query(ReservationHistory)
-            .filter(ReservationHistory.room_name == room_name)
-            .order_by(ReservationHistory.date_hour_start.asc())
-            .all()
-        )
-
-        if not records:
-            return None
-
-        # Convertir los registros a un DataFrame
-        df = pd.DataFrame([{
-            "date": r.date_hour_start.date()
-        } for r in records])
-
-        # Agrupar por día (conteo de reservas por fecha)
-        df_grouped = df.groupby("date").size().reset_index(name="reservas")
-        df_grouped = df_grouped.sort_values("date")
-        df_grouped["t"] = np.arange(len(df_grouped))
-
-        # series de valores históricos
-        y = df_grouped["reservas"].astype(float)
+    @staticmethod
+    def predict_from_fit(room_name: str, fit, start_date: datetime, end_date: datetime):
+        n_points = fit["n_points"]
 
-        # Si hay pocos puntos históricos, evitar entrenamiento de modelo
-        if len(df_grouped) < 2:
+        # Si hay pocos puntos históricos no hay tendencia
+        if n_points < 2:
             # usar la media histórica como predicción simple
-            mean_pred = float(y.mean())
+            mean_pred = fit["mean"]
         else:
-            # Entrenar modelo de regresión lineal
-            X = df_grouped[["t"]]
-            model = LinearRegression()
-            model.fit(X, y)
-
             # Calcular predicciones para el rango futuro
             dias_pred = (end_date - start_date).days + 1
-            t_future = np.arange(len(df_grouped), len(df_grouped) + dias_pred).reshape(-1, 1)
-            preds = model.predict(t_future)
+            t_future = np.arange(n_points, n_points + dias_pred)
+            preds = fit["intercept"] + fit["slope"] * t_future
 
             # Evitar predicciones negativas
             preds = np.clip(preds, 0, None)
             mean_pred = float(np.mean(preds))
 
-        # Normalización: usa el máximo histórico o un valor por defecto de capacidad
-        percentile_90 = float(np.percentile(y, 90)) if len(y) > 0 else 0.0
-        denom = max(percentile_90, float(y.max()), DEFAULT_ROOM_CAPACITY, 1.0)
+        probability = min(mean_pred / fit["denom"], 1.0)
 
-        probability = min(mean_pred / denom, 1.0)
+        return {
+            "room": room_name,
+            "occupation_probability": round(probability,2),
+            "trend": OccupancyPredictionService.trend_of(probability)
+        }
 
+    @staticmethod
+    def trend_of(probability: float) -> str:
         # Determinar tendencia y recomendación
         if probability > 0.7:
-            trend = "high"            
+            return "high"
         elif probability > 0.4:
-            trend = "medium"
-        else:
-            trend = "low"
-
-        return {
-            "room": room_name,
-            "occupation_probability": round(probability,2),
-            "trend": trend
-        }
\ No newline at end of file
+            return "medium"
+        return "low"
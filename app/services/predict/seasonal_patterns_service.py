@@ -1,6 +1,15 @@
-import pandas as pd
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
 from sqlalchemy.orm import Session
-from app.schemas.history_schema import ReservationHistory
+from app.core.metrics import timed
+from app.schemas.rollup_schema import RoomDailyCount, RoomWeekdayCount
+from app.services.predict.history_loader import CATEGORY, load_columns
+from app.services.predict.history_snapshot import history_snapshot
+from app.services.predict.model_registry import training_window
+from app.services.sql_expressions import sql_weekday
+
+# Nombres de los días según date.weekday() (0=lunes .. 6=domingo)
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
 
 
 class SeasonalPatternsService:
@@ -12,42 +21,57 @@ class SeasonalPatternsService:
     def __init__(self, db: Session):
         self.db = db
 
-    def analyze_patterns(self):
-        records = (
-            self.db.query(ReservationHistory)
-            .order_by(ReservationHistory.date_hour_start.asc())
-            .all()
-        )
+    def analyze_patterns(self, rooms=None, since=None, lookback_days=None):
+        """Patrones de todas las salas, o solo de `rooms`, con datos desde `since` y dentro de la ventana."""
+        history = self.load_weekday_counts(self.db, rooms, training_window(since, lookback_days))
 
-        if not records:
+        if not len(history):
             return None
 
-        # Transformar datos en DataFrame
-        df = pd.DataFrame(
-            [
-                {
-                    "room": r.room_name,
-                    "weekday": r.date_hour_start.strftime("%A").lower(),  # día en texto
-                }
-                for r in records
-                if r.date_hour_start is not None and r.room_name
-            ]
-        )
-
-        if df.empty:
-            return None
+        return self.peak_and_low(history)
+
+    @staticmethod
+    def load_weekday_counts(db: Session, rooms=None, since=None):
+        """
+        Conteo de reservas por sala y día de la semana (rollup).
+        Con `since` se agrega en SQL el rollup diario desde esa fecha.
+        Si el snapshot del historial está vigente y cubre el período se cuenta desde ahí.
+        """
+        snapshot = history_snapshot.open()
+        if snapshot is not None and snapshot.covers(since):
+            return snapshot.weekday_counts(rooms, since)
+
+        if since is None:
+            room_column = RoomWeekdayCount.room_name
+            stmt = (
+                select(room_column, RoomWeekdayCount.weekday, RoomWeekdayCount.reservations)
+                .where(room_column != "")
+            )
+        else:
+            room_column = RoomDailyCount.room_name
+            weekday = sql_weekday(RoomDailyCount.date)
+            stmt = (
+                select(room_column, weekday, cast(func.sum(RoomDailyCount.reservations), Integer))
+                .where(room_column != "", RoomDailyCount.date >= since)
+                .group_by(room_column, weekday)
+            )
+
+        if rooms is not None:
+            stmt = stmt.where(room_column.in_(list(rooms)))
+
+        return load_columns(db, stmt, {"room": CATEGORY, "weekday": np.int8, "count": np.int64})
 
-        # Agrupar por sala y día
-        df_grouped = (
-            df.groupby(["room", "weekday"])
-            .size()
-            .reset_index(name="count")
-            .sort_values(["room", "weekday"])
-        )
+    @staticmethod
+    @timed("seasonal.peak_low")
+    def peak_and_low(history):
+        """Día de la semana con más y con menos reservas de cada sala."""
+        df_grouped = history.to_frame()
+        df_grouped["weekday"] = np.asarray(WEEKDAY_NAMES)[df_grouped["weekday"].to_numpy()]
+        df_grouped = df_grouped.sort_values(["room", "weekday"])
 
         # Calcular días pico y bajos
         results = {}
-        for room_name, room_data in df_grouped.groupby("room"):
+        for room_name, room_data in df_grouped.groupby("room", observed=True):
             if len(room_data) == 0:
                 continue
 
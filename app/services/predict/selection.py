@@ -0,0 +1,30 @@
+"""
+Selección de los K mejores puntajes sin ordenar todo el arreglo.
+"""
+
+from typing import Optional
+import numpy as np
+
+
+def top_k_indices(scores, k: Optional[int] = None) -> np.ndarray:
+    """
+    Índices de los `k` mayores puntajes, de mayor a menor. Los empates se
+    resuelven por índice (como un sort estable descendente), así el resultado
+    coincide con ordenar todo y cortar en k.
+    Usa np.partition para ubicar el umbral en O(n) y solo ordena los elegidos.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(scores)
+    if k is None or k >= n:
+        chosen = np.arange(n)
+    elif k <= 0:
+        return np.empty(0, dtype=np.int64)
+    else:
+        # k-ésimo mayor puntaje: todo lo que lo supera entra, y del empate los de menor índice
+        threshold = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+        chosen = np.concatenate([above, ties])
+
+    # lexsort: la última clave es la principal (puntaje desc), luego índice asc
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
@@ -0,0 +1,85 @@
+"""
+Ajuste de tendencias lineales para muchos grupos (salas, artículos) a la vez.
+Reemplaza un LinearRegression por grupo con reducciones agrupadas de NumPy:
+cada serie se ajusta contra t = 0..n-1 (su posición en orden cronológico).
+"""
+
+import numpy as np
+
+
+class TrendFit:
+    """
+    Resultado del ajuste por grupo. Todos los arrays están indexados por código de grupo.
+    - n: puntos de la serie
+    - slope / intercept: recta de mínimos cuadrados y = intercept + slope * t
+    - mean / maximum: media y máximo de la serie
+    """
+
+    def __init__(self, order, starts, counts, slope, intercept, mean, maximum):
+        self.order = order
+        self.starts = starts
+        self.n = counts
+        self.slope = slope
+        self.intercept = intercept
+        self.mean = mean
+        self.maximum = maximum
+
+    @property
+    def last_index(self):
+        return self.starts + self.n - 1
+
+    def first_of(self, values):
+        """Primer valor (cronológico) de `values` en cada grupo."""
+        return values[self.order[self.starts]]
+
+    def last_of(self, values):
+        """Último valor (cronológico) de `values` en cada grupo."""
+        return values[self.order[self.last_index]]
+
+    def rows_of(self, group):
+        """Índices de las filas originales del grupo, en orden cronológico."""
+        start = self.starts[group]
+        return self.order[start:start + self.n[group]]
+
+    def predict(self, t):
+        """Evalúa la recta de cada grupo en `t` (array de forma (grupos, k))."""
+        return self.intercept[:, None] + self.slope[:, None] * t
+
+
+def fit_linear_trends(codes, y, n_groups: int) -> TrendFit:
+    """
+    Ajusta y ~ t para todos los grupos en una pasada.
+    `codes` asigna cada fila a un grupo (0..n_groups-1) y dentro de cada grupo las filas
+    deben venir en orden cronológico. Todos los grupos deben tener al menos una fila.
+
+    Usa las sumas agrupadas de t, y, t·y y t² en su forma centrada
+    (Σ(t-t̄)(y-ȳ) / Σ(t-t̄)²), que es la misma solución de mínimos cuadrados
+    que LinearRegression pero sin cancelación numérica en series largas.
+    Los grupos con un solo punto quedan con pendiente 0 e intercepto igual a su media.
+    """
+    codes = np.asarray(codes)
+    y = np.asarray(y, dtype=np.float64)
+
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+
+    g = codes[order]
+    y_sorted = y[order]
+    t = (np.arange(len(g)) - np.repeat(starts, counts)).astype(np.float64)
+
+    n = counts.astype(np.float64)
+    t_mean = np.bincount(g, weights=t, minlength=n_groups) / n
+    y_mean = np.bincount(g, weights=y_sorted, minlength=n_groups) / n
+
+    dt = t - t_mean[g]
+    s_tt = np.bincount(g, weights=dt * dt, minlength=n_groups)
+    s_ty = np.bincount(g, weights=dt * (y_sorted - y_mean[g]), minlength=n_groups)
+
+    slope = np.divide(s_ty, s_tt, out=np.zeros(n_groups), where=s_tt > 0)
+    intercept = y_mean - slope * t_mean
+
+    maximum = np.full(n_groups, -np.inf)
+    np.maximum.at(maximum, g, y_sorted)
+
+    return TrendFit(order, starts, counts, slope, intercept, y_mean, maximum)
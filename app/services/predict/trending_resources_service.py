@@ -1,86 +1,65 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from sqlalchemy.orm import Session
-from app.schemas.history_schema import ReservationHistory 
+from app.core.metrics import timed
+from app.services.predict.model_registry import ModelRegistry
+from app.services.predict.selection import top_k_indices
 
 
 class TrendingResourcesService:
     """
     Analiza la tendencia de uso de artículos en las reservas.
     Devuelve un listado con la variación esperada y un índice de confianza.
+    Los parámetros de cada artículo salen de los modelos guardados por ModelRegistry.
     """
 
     def __init__(self, db: Session):
         self.db = db
 
-    def analyze_trending(self):
-        records = (
-            self.db.query(ReservationHistory)
-            .order_by(ReservationHistory.date_hour_start.asc())
-            .all()
-        )
+    def analyze_trending(self, articles=None, top_k=None, since=None, lookback_days=None):
+        """Tendencias de todos los artículos, o solo de `articles`, con datos desde `since` y dentro de la ventana."""
+        models = ModelRegistry.select_models(self.db, "article", articles, since, lookback_days)
 
-        if not records:
+        if not models:
             return None
 
-        rows = []
-        for r in records:
-            if not r.articles:
-                continue
-
-            # Separamos por comas
-            articles = [a.strip() for a in r.articles.split(",") if a.strip()]
-
-            for art in articles:
-                rows.append({
-                    "article": art,
-                    "date": r.date_hour_start.date(),
-                })
-
-        if not rows:
-            return None
-
-        df = pd.DataFrame(rows)
-
-        # Agrupar por fecha y artículo
-        df_grouped = (
-            df.groupby(["article", "date"])
-            .size()
-            .reset_index(name="count")
-            .sort_values(["article", "date"])
-        )
-
+        return self.rank_models(models, top_k)
+
+    @staticmethod
+    @timed("trending.rank")
+    def rank_models(models, top_k=None):
+        """
+        Calcula la tendencia de cada artículo a partir de sus modelos (ordenados por artículo).
+        Con `top_k` solo se devuelven los K artículos de mayor tendencia.
+        """
+        articles = [m["key"] for m in models]
+        n = np.array([m["n_points"] for m in models])
+        first = np.array([m["first_value"] for m in models])
+        last = np.array([m["last_value"] for m in models])
+        slope = np.array([m["slope"] for m in models])
+        mean = np.array([m["mean"] for m in models])
+
+        # Con 2 puntos: variación entre el primer y el último registro
+        change_short = ((last - first) / np.maximum(first, 1)) * 100
+        # Con 3 o más: pendiente relativa a la media
+        change_linear = (slope / np.maximum(mean, 1)) * 100
+
+        # Se necesitan al menos 2 puntos
+        valid = np.flatnonzero(n >= 2)
+        short = n[valid] < 3
+
+        # Tendencia: lineal si hay suficientes puntos
+        change_pct = np.where(short, change_short[valid], change_linear[valid])
+        trust = np.where(short, 0.4, np.minimum(0.3 + n[valid] * 0.1, 0.95))
+        # Se ordena por la tendencia redondeada, tal como se informa
+        rounded = np.round(change_pct, 2)
+
+        # Ordenar por tendencia descendente (selección parcial si hay top_k)
         results = []
-
-        for article, art_data in df_grouped.groupby("article"):
-            art_data = art_data.sort_values("date")
-            y = art_data["count"].astype(float).values
-            t = np.arange(len(art_data)).reshape(-1, 1)
-
-            if len(y) < 2:
-                continue
-
-            # Tendencia: lineal si hay suficientes puntos
-            if len(y) < 3:
-                change_pct = ((y[-1] - y[0]) / max(y[0], 1)) * 100
-                trust = 0.4  
-            else:
-                model = LinearRegression()
-                model.fit(t, y)
-                slope = model.coef_[0]
-                change_pct = (slope / max(np.mean(y), 1)) * 100
-                trust = min(0.3 + len(y) * 0.1, 0.95)
-
-            trend_symbol = f"{'+' if change_pct >= 0 else ''}{round(change_pct, 2)}%"
-
+        for j in top_k_indices(rounded, top_k):
             results.append({
-                "article": article,
-                "trend": trend_symbol,
-                "trust": round(trust, 2)
+                "article": articles[valid[j]],
+                "trend": f"{'+' if change_pct[j] >= 0 else ''}{rounded[j]}%",
+                "trust": round(float(trust[j]), 2)
             })
 
-        # Ordenar por tendencia descendente
-        results = sorted(results, key=lambda x: float(x["trend"].replace('%', '')), reverse=True)
-
         return results
\ No newline at end of file
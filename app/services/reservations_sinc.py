@@ -1,21 +1,81 @@
+import hashlib
 import json
+import logging
+import time
 from datetime import datetime
+from typing import List
+from sqlalchemy import delete, insert, select
 from sqlalchemy.orm import Session
-from app.schemas.history_schema import ReservationHistory
+from app.core.cache import bump_data_version, idempotency_cache
+from app.core.database import is_transient_error
+from app.core.metrics import ERRORS, UPSERTS_SKIPPED, UPSERT_BATCH_SIZE, UPSERT_LATENCY
+from app.schemas.history_schema import ReservationArticle, ReservationHistory
+from app.schemas.rollup_schema import RoomHourlyCount
 from app.schemas.sync_schema import ReservationCreate
+from app.services.retention_service import RetentionService
+from app.services.rollup_service import RollupService, split_articles
+from app.services.predict.history_snapshot import history_snapshot
+from app.services.predict.hourly_occupancy_service import hourly_cube
+from app.services.predict.model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Columnas que se sobrescriben cuando la reserva ya existe
+UPSERT_COLUMNS = ["room_name", "people_email", "articles", "date_hour_start", "date_hour_end"]
+
+
+def content_hash(row) -> bytes:
+    """Hash de las columnas de UPSERT_COLUMNS de una fila (objeto o dict) tal como se guardan."""
+    get = row.get if isinstance(row, dict) else lambda c: getattr(row, c)
+    values = [get(c) for c in UPSERT_COLUMNS]
+    payload = "\x1f".join("" if v is None else v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
 
 class DataCollectorService:
 
+    @staticmethod
+    def stored_values(reservation: ReservationCreate):
+        """Valores de UPSERT_COLUMNS con los que se guarda la reserva."""
+        return {
+            "room_name": reservation.room_name,
+            "people_email": reservation.people_email,
+            "articles": ",".join(reservation.articles) if reservation.articles else None,
+            "date_hour_start": reservation.date_hour_start,
+            "date_hour_end": reservation.date_hour_end,
+        }
+
     @staticmethod
     def store_data(reservation: ReservationCreate, db: Session):
-        """Crea o actualiza un registro de reserva en la DB"""
+        """
+        Crea o actualiza un registro de reserva en la DB.
+        Si la reserva llega sin cambios (redelivery o re-publicación) no se escribe nada:
+        con un acierto de la caché de idempotencia ni siquiera se consulta la base.
+        """
+        digest = content_hash(DataCollectorService.stored_values(reservation))
+        if idempotency_cache.matches(reservation.reservation_id, digest):
+            UPSERTS_SKIPPED.inc(reason="cache")
+            return {"reservation_id": reservation.reservation_id, "status": "success", "unchanged": True}
+
+        started = time.perf_counter()
+        UPSERT_BATCH_SIZE.observe(1, mode="single")
         try:
             # Buscar si ya existe por reservation_id
             db_reservation = db.query(ReservationHistory).filter_by(
                 reservation_id=reservation.reservation_id
             ).first()
 
+            if db_reservation and content_hash(db_reservation) == digest:
+                # Mismo contenido que en la base: nada que escribir
+                db.rollback()
+                idempotency_cache.remember({reservation.reservation_id: digest})
+                UPSERTS_SKIPPED.inc(reason="unchanged")
+                return {"reservation_id": reservation.reservation_id, "status": "success", "unchanged": True}
+
             if db_reservation:
+                # Guardar los valores previos para mover los conteos de los rollups
+                previous = RollupService.snapshot(db_reservation)
+
                 # Actualizar campos existentes
                 db_reservation.room_name = reservation.room_name
                 db_reservation.people_email = reservation.people_email
@@ -23,6 +83,11 @@ class DataCollectorService:
                 db_reservation.date_hour_start = reservation.date_hour_start
                 db_reservation.date_hour_end = reservation.date_hour_end
             else:
+                # Una reserva archivada que vuelve a llegar mueve sus conteos en vez de duplicarlos
+                previous = RetentionService.take_archived(db, [reservation.reservation_id]).get(
+                    reservation.reservation_id
+                )
+
                 # Crear nuevo registro
                 db_reservation = ReservationHistory(
                     reservation_id=reservation.reservation_id,
@@ -35,9 +100,239 @@ class DataCollectorService:
                 )
                 db.add(db_reservation)
 
+            current = RollupService.snapshot(db_reservation)
+            DataCollectorService._replace_articles(db, {reservation.reservation_id: current})
+            deltas = RollupService.apply_change(db, previous, current)
+            ModelRegistry.mark_dirty_from_rollups(db, deltas)
+
+            bump_data_version(db)
             db.commit()
+            idempotency_cache.remember({reservation.reservation_id: digest})
+            DataCollectorService._append_snapshot({reservation.reservation_id: current})
+            ModelRegistry.refresh_after_commit(db)
+            DataCollectorService._apply_to_cube(deltas.get(RoomHourlyCount))
             return {"reservation_id": reservation.reservation_id, "status": "success"}
 
         except Exception as e:
             db.rollback()
-            return {"reservation_id": reservation.reservation_id, "status": "error", "error": str(e)}
+            ERRORS.inc(component="upsert")
+            return DataCollectorService._error_result(reservation.reservation_id, e)
+        finally:
+            UPSERT_LATENCY.observe(time.perf_counter() - started, mode="single")
+
+
+    @staticmethod
+    def store_batch(reservations: List[ReservationCreate], db: Session):
+        """
+        Crea o actualiza un lote de reservas con un único upsert nativo del dialecto
+        y un solo commit. Las reservas sin cambios (según la caché de idempotencia o
+        la fila leída de la base) no se escriben.
+        """
+        # Si una reserva llega repetida en el lote gana la última versión
+        latest = {}
+        for reservation in reservations:
+            latest[reservation.reservation_id] = reservation
+
+        values = {rid: DataCollectorService.stored_values(r) for rid, r in latest.items()}
+        digests = {rid: content_hash(v) for rid, v in values.items()}
+        unchanged = {rid for rid in latest if idempotency_cache.matches(rid, digests[rid])}
+        if unchanged:
+            UPSERTS_SKIPPED.inc(len(unchanged), reason="cache")
+        pending = [rid for rid in latest if rid not in unchanged]
+        if not pending:
+            return DataCollectorService._batch_results(latest, unchanged)
+
+        started = time.perf_counter()
+        UPSERT_BATCH_SIZE.observe(len(pending), mode="batch")
+        try:
+            # Valores previos para mover los conteos de los rollups
+            previous = {}
+            for row in db.execute(
+                select(
+                    ReservationHistory.reservation_id,
+                    ReservationHistory.room_name,
+                    ReservationHistory.people_email,
+                    ReservationHistory.date_hour_start,
+                    ReservationHistory.articles,
+                    ReservationHistory.date_hour_end,
+                ).where(ReservationHistory.reservation_id.in_(pending))
+            ):
+                if content_hash(row) == digests[row.reservation_id]:
+                    unchanged.add(row.reservation_id)
+                    continue
+                previous[row.reservation_id] = RollupService.key(
+                    row.room_name, row.date_hour_start, row.articles, row.date_hour_end
+                )
+
+            found = len(unchanged) - (len(latest) - len(pending))
+            if found:
+                UPSERTS_SKIPPED.inc(found, reason="unchanged")
+            changed = [rid for rid in pending if rid not in unchanged]
+            if not changed:
+                # Todo el lote ya estaba guardado: nada que escribir
+                db.rollback()
+                idempotency_cache.remember({rid: digests[rid] for rid in pending})
+                return DataCollectorService._batch_results(latest, unchanged)
+
+            missing = [rid for rid in changed if rid not in previous]
+            if missing:
+                previous.update(RetentionService.take_archived(db, missing))
+
+            fetched_at = datetime.utcnow()
+            rows = [dict(values[rid], reservation_id=rid, fetched_at=fetched_at) for rid in changed]
+
+            db.execute(DataCollectorService._upsert_statement(db, rows))
+
+            current = {
+                row["reservation_id"]: RollupService.key(
+                    row["room_name"], row["date_hour_start"], row["articles"], row["date_hour_end"]
+                )
+                for row in rows
+            }
+            DataCollectorService._replace_articles(db, current)
+            deltas = RollupService.apply_changes(
+                db, [(previous.get(rid), key) for rid, key in current.items()]
+            )
+            ModelRegistry.mark_dirty_from_rollups(db, deltas)
+
+            bump_data_version(db)
+            db.commit()
+            idempotency_cache.remember({rid: digests[rid] for rid in pending})
+            DataCollectorService._append_snapshot(current)
+            ModelRegistry.refresh_after_commit(db)
+            DataCollectorService._apply_to_cube(deltas.get(RoomHourlyCount))
+            return DataCollectorService._batch_results(latest, unchanged)
+
+        except Exception as e:
+            db.rollback()
+            ERRORS.inc(component="upsert")
+            return [DataCollectorService._error_result(rid, e) for rid in latest]
+        finally:
+            UPSERT_LATENCY.observe(time.perf_counter() - started, mode="batch")
+
+    @staticmethod
+    def _error_result(reservation_id: int, error: Exception):
+        # retryable: el mismo mensaje puede guardarse si se reintenta más tarde (p. ej. base caída)
+        return {
+            "reservation_id": reservation_id,
+            "status": "error",
+            "error": str(error),
+            "retryable": is_transient_error(error),
+        }
+
+    @staticmethod
+    def _batch_results(latest, unchanged):
+        return [
+            {"reservation_id": rid, "status": "success", "unchanged": True}
+            if rid in unchanged else {"reservation_id": rid, "status": "success"}
+            for rid in latest
+        ]
+
+    @staticmethod
+    def _append_snapshot(keys):
+        """Agrega al snapshot del historial las reservas ya confirmadas (antes de reentrenar con él)."""
+        try:
+            history_snapshot.append(keys)
+        except Exception as e:
+            # Los datos ya están confirmados: el snapshot se repara en la próxima reconstrucción
+            ERRORS.inc(component="snapshot")
+            logger.error(f"Error appending to history snapshot: {e}")
+
+    @staticmethod
+    def _apply_to_cube(deltas):
+        """Suma al cubo horario de este proceso los deltas ya confirmados."""
+        try:
+            hourly_cube.apply_deltas(deltas)
+        except Exception as e:
+            # Los datos ya están confirmados: el cubo se recarga desde el rollup en la próxima consulta
+            hourly_cube.invalidate()
+            ERRORS.inc(component="hourly_cube")
+            logger.error(f"Error applying deltas to the hourly cube: {e}")
+
+    @staticmethod
+    def _upsert_statement(db: Session, rows):
+        """INSERT multi-fila con resolución de conflictos sobre reservation_id."""
+        table = ReservationHistory.__table__
+        dialect = db.get_bind().dialect.name
+
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+
+            stmt = insert(table).values(rows)
+            return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in UPSERT_COLUMNS})
+
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            stmt = insert(table).values(rows)
+            return stmt.on_conflict_do_update(
+                index_elements=["reservation_id"],
+                set_={c: stmt.excluded[c] for c in UPSERT_COLUMNS},
+            )
+
+        raise NotImplementedError(f"Bulk upsert is not supported for dialect '{dialect}'")
+
+    @staticmethod
+    def _replace_articles(db: Session, keys):
+        """Reemplaza las filas de reservation_articles de cada reserva (dict reservation_id -> RollupKey)."""
+        table = ReservationArticle.__table__
+        db.execute(delete(table).where(table.c.reservation_id.in_(list(keys))))
+
+        rows = [
+            {"reservation_id": rid, "article": article, "date": key.date_hour_start.date()}
+            for rid, key in keys.items()
+            for article in key.articles
+        ]
+        if rows:
+            db.execute(insert(table), rows)
+
+    @staticmethod
+    def backfill_articles(db: Session, chunk_size: int = 5000):
+        """
+        Completa reservation_articles a partir de la columna articles en bases
+        creadas antes de existir la tabla normalizada.
+        Recorre el historial por rangos de id y confirma cada bloque: no mantiene un cursor
+        abierto mientras escribe ni una sola transacción con toda la tabla.
+        """
+        with_articles = ReservationHistory.articles.is_not(None)
+        last = db.execute(
+            select(ReservationHistory.reservation_id, ReservationHistory.articles).where(with_articles)
+            .order_by(ReservationHistory.id.desc()).limit(1)
+        ).first()
+        if last is None:
+            return
+        # Se completa en orden de id: si la última reserva ya tiene sus artículos, no falta nada
+        # (una carga interrumpida se repite desde el principio; reemplazar es idempotente)
+        done = select(ReservationArticle.id).limit(1)
+        if split_articles(last.articles):
+            done = done.where(ReservationArticle.reservation_id == last.reservation_id)
+        done = db.execute(done).first()
+        if done:
+            db.rollback()
+            return
+
+        print("Building reservation_articles from reservation_history")
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(
+                    ReservationHistory.id,
+                    ReservationHistory.reservation_id,
+                    ReservationHistory.room_name,
+                    ReservationHistory.date_hour_start,
+                    ReservationHistory.articles,
+                )
+                .where(with_articles, ReservationHistory.id > last_id)
+                .order_by(ReservationHistory.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return
+            DataCollectorService._replace_articles(
+                db, {r.reservation_id: RollupService.key(*r[2:]) for r in rows}
+            )
+            db.commit()
+            last_id = rows[-1].id
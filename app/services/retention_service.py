@@ -0,0 +1,230 @@
+"""
+Retención del historial crudo.
+Las reservas más antiguas que RETENTION_DAYS se quitan de reservation_history (y de
+reservation_articles): sus conteos ya están en los rollups diarios, horarios y por weekday,
+que es lo que leen los servicios de predicción. Según RETENTION_MODE se mueven a
+reservation_history_archive o se borran.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import DateTime, and_, delete, insert, literal, select, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import ERRORS, timed
+from app.schemas.history_schema import ReservationArticle, ReservationHistory, ReservationHistoryArchive
+from app.schemas.rollup_schema import CompactionWatermark
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+# Columnas de reservation_history que se copian al archivo
+ARCHIVE_COLUMNS = [
+    "reservation_id", "room_name", "people_email", "articles", "date_hour_start", "date_hour_end", "fetched_at",
+]
+
+
+class RetentionService:
+
+    @staticmethod
+    def cutoff(retention_days: Optional[int] = None) -> Optional[date]:
+        """Fecha desde la que se conserva el historial crudo (None = se conserva todo)."""
+        days = settings.retention_days if retention_days is None else retention_days
+        if days <= 0:
+            return None
+        return date.today() - timedelta(days=days)
+
+    @staticmethod
+    @timed("retention.compact")
+    def compact(db: Session, cutoff: date, mode: Optional[str] = None, batch_size: Optional[int] = None) -> int:
+        """
+        Quita del historial crudo las reservas que terminan antes de `cutoff`, por lotes
+        (un commit por lote). Devuelve la cantidad de reservas compactadas.
+        """
+        mode = mode or settings.retention_mode
+        if mode not in ("archive", "delete"):
+            raise ValueError(f"Unknown retention mode '{mode}'")
+        batch_size = batch_size or settings.retention_batch_size
+
+        # Primero la marca: desde acá un rebuild conserva los rollups de los días compactados
+        RetentionService._advance_watermark(db, cutoff)
+        db.commit()
+
+        # Solo reservas que terminan antes del corte: las que lo cruzan siguen aportando franjas horarias
+        limit = datetime.combine(cutoff, datetime.min.time())
+        table = ReservationHistory.__table__
+        expired = (table.c.date_hour_start < limit, table.c.date_hour_end <= limit)
+        # FOR UPDATE: una ingesta no puede modificar el lote entre el archivo y el borrado
+        stmt = select(table.c.id).where(*expired).order_by(table.c.id).limit(batch_size).with_for_update()
+
+        removed = 0
+        while True:
+            try:
+                ids = db.execute(stmt).scalars().all()
+                if not ids:
+                    db.rollback()
+                    break
+
+                # Cada sentencia repite el corte: una reserva que una ingesta movió después del
+                # corte se queda, y el archivo copia exactamente las filas que se borran (con sus
+                # valores actuales) dentro de la misma transacción
+                batch = and_(table.c.id.in_(ids), *expired)
+                if mode == "archive":
+                    db.execute(
+                        insert(ReservationHistoryArchive.__table__).from_select(
+                            ARCHIVE_COLUMNS + ["archived_at"],
+                            select(
+                                *[table.c[c] for c in ARCHIVE_COLUMNS],
+                                literal(datetime.utcnow(), DateTime),
+                            ).where(batch),
+                        )
+                    )
+                db.execute(
+                    delete(ReservationArticle.__table__).where(
+                        ReservationArticle.__table__.c.reservation_id.in_(select(table.c.reservation_id).where(batch))
+                    )
+                )
+                deleted = db.execute(delete(table).where(batch)).rowcount
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            removed += deleted
+
+        return removed
+
+    @staticmethod
+    def run_once(session_factory):
+        """Una pasada del trabajo de retención: particiones del archivo (MySQL) y compactación."""
+        db = session_factory()
+        try:
+            cutoff = RetentionService.cutoff()
+            if settings.retention_mode == "archive" and settings.retention_partition_archive:
+                RetentionService.ensure_archive_partitions(db, through=_next_month(date.today()))
+            removed = RetentionService.compact(db, cutoff)
+            if removed:
+                logger.info(f"Compacted {removed} reservations older than {cutoff}")
+            return removed
+        finally:
+            db.close()
+
+    @staticmethod
+    def _advance_watermark(db: Session, cutoff: date):
+        """La marca de compactación solo avanza."""
+        current = RollupService.compacted_before(db)
+        if current is None:
+            db.execute(insert(CompactionWatermark.__table__).values(id=1, compacted_before=cutoff))
+        elif cutoff > current:
+            db.execute(
+                CompactionWatermark.__table__.update()
+                .where(CompactionWatermark.__table__.c.id == 1)
+                .values(compacted_before=cutoff)
+            )
+
+    @staticmethod
+    def take_archived(db: Session, reservation_ids):
+        """
+        Reactiva reservas archivadas que vuelven a llegar: las quita del archivo y devuelve
+        sus valores (dict reservation_id -> RollupKey) para mover los conteos de los rollups
+        en vez de sumarlos dos veces. Se ejecuta dentro de la transacción del llamador.
+        """
+        if settings.retention_days <= 0 or settings.retention_mode != "archive":
+            return {}
+
+        archive = ReservationHistoryArchive.__table__
+        ids = list(reservation_ids)
+        previous = {
+            row.reservation_id: RollupService.key(
+                row.room_name, row.date_hour_start, row.articles, row.date_hour_end
+            )
+            for row in db.execute(
+                select(
+                    archive.c.reservation_id, archive.c.room_name, archive.c.date_hour_start,
+                    archive.c.articles, archive.c.date_hour_end,
+                ).where(archive.c.reservation_id.in_(ids))
+            )
+        }
+        if previous:
+            db.execute(delete(archive).where(archive.c.reservation_id.in_(list(previous))))
+        return previous
+
+    @staticmethod
+    def ensure_archive_partitions(db: Session, through: date):
+        """
+        MySQL: particiona reservation_history_archive por mes de date_hour_start
+        (RANGE COLUMNS) y agrega los meses que falten hasta `through`. Las consultas por
+        fecha leen solo las particiones del rango y un mes viejo se descarta con DROP PARTITION.
+        En otros motores no hace nada.
+        """
+        if db.get_bind().dialect.name != "mysql":
+            return
+
+        name = ReservationHistoryArchive.__tablename__
+        existing = set(db.execute(
+            text(
+                "SELECT partition_name FROM information_schema.partitions "
+                "WHERE table_schema = DATABASE() AND table_name = :name AND partition_name IS NOT NULL"
+            ),
+            {"name": name},
+        ).scalars())
+
+        monthly = [_partition_month(p) for p in existing if p != "pmax"]
+        if monthly:
+            first = _next_month(max(monthly))
+        else:
+            oldest = db.execute(select(ReservationHistoryArchive.date_hour_start).order_by(
+                ReservationHistoryArchive.date_hour_start).limit(1)).scalar()
+            first = (oldest.date() if oldest else through).replace(day=1)
+
+        months = []
+        month = first
+        while month <= through:
+            months.append(month)
+            month = _next_month(month)
+
+        partitions = ", ".join(
+            f"PARTITION p{m:%Y%m} VALUES LESS THAN ('{_next_month(m):%Y-%m-%d}')" for m in months
+        )
+        tail = "PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+        if not existing:
+            db.execute(text(
+                f"ALTER TABLE {name} PARTITION BY RANGE COLUMNS(date_hour_start) "
+                f"({partitions + ', ' if partitions else ''}{tail})"
+            ))
+        elif months:
+            db.execute(text(f"ALTER TABLE {name} REORGANIZE PARTITION pmax INTO ({partitions}, {tail})"))
+
+
+def _partition_month(partition_name: str) -> date:
+    return datetime.strptime(partition_name[1:], "%Y%m").date()
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def start_retention_job():
+    """Inicia la compactación periódica del historial en un hilo separado (si RETENTION_DAYS > 0)"""
+    if settings.retention_days <= 0:
+        return
+
+    def _retention_thread():
+        from app.core.database import SessionLocal, job_lock
+
+        while True:
+            try:
+                # Cada proceso inicia el hilo, pero solo uno compacta a la vez
+                with job_lock("reservation_retention") as acquired:
+                    if acquired:
+                        RetentionService.run_once(SessionLocal)
+            except Exception as e:
+                ERRORS.inc(component="retention")
+                logger.error(f"Error compacting reservation history: {e}")
+            time.sleep(settings.retention_interval_seconds)
+
+    thread = threading.Thread(target=_retention_thread, name="retention", daemon=True)
+    thread.start()
+    logger.info("Reservation history retention job started")
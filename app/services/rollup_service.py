@@ -0,0 +1,295 @@
+from collections import Counter, namedtuple
+from datetime import date, datetime, time
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.core.cache import bump_data_version
+from app.schemas.history_schema import ReservationArticle, ReservationHistory
+from app.schemas.rollup_schema import (
+    ArticleDailyCount, CompactionWatermark, RoomDailyCount, RoomHourlyCount, RoomWeekdayCount,
+)
+from app.services.hourly_slots import expand_hourly_slots, split_slots, sum_by_slot
+from app.services.predict.history_loader import load_history
+from app.services.sql_expressions import sql_date, sql_weekday
+
+# Campos de una reserva que afectan a los rollups (articles es una tupla de nombres;
+# sin date_hour_end la reserva no mueve el rollup horario)
+RollupKey = namedtuple("RollupKey", ["room_name", "date_hour_start", "articles", "date_hour_end"])
+
+# Filas por INSERT al reconstruir el rollup horario
+HOURLY_INSERT_CHUNK = 10000
+
+
+def split_articles(articles: Optional[str]) -> List[str]:
+    """Separa la columna articles (texto separado por comas) en una lista limpia."""
+    if not articles:
+        return []
+    return [a.strip() for a in articles.split(",") if a.strip()]
+
+
+class RollupService:
+    """
+    Mantiene las tablas de conteos diarios (sala x fecha, artículo x fecha, sala x weekday)
+    y el horario (sala x fecha x hora) a partir de las altas y modificaciones de reservation_history.
+    """
+
+    @staticmethod
+    def key(room_name: str, date_hour_start, articles: Optional[str], date_hour_end=None) -> RollupKey:
+        return RollupKey(room_name, date_hour_start, tuple(split_articles(articles)), date_hour_end)
+
+    @staticmethod
+    def snapshot(reservation: ReservationHistory) -> RollupKey:
+        """Captura los campos de la reserva que alimentan los rollups."""
+        return RollupService.key(
+            reservation.room_name, reservation.date_hour_start, reservation.articles, reservation.date_hour_end
+        )
+
+    @staticmethod
+    def compute_deltas(changes):
+        """
+        Calcula las diferencias de conteo para una lista de pares (old, new).
+        `old` es None para altas nuevas.
+        """
+        rooms, articles, weekdays = Counter(), Counter(), Counter()
+
+        for old, new in changes:
+            for key, sign in ((old, -1), (new, 1)):
+                if key is None:
+                    continue
+                day = key.date_hour_start.date()
+                rooms[(key.room_name, day)] += sign
+                weekdays[(key.room_name, day.weekday())] += sign
+                for art in key.articles:
+                    articles[(art, day)] += sign
+
+        # Descartar claves sin cambios (p. ej. un update que no movió sala ni fecha)
+        return {
+            RoomDailyCount: {k: v for k, v in rooms.items() if v},
+            ArticleDailyCount: {k: v for k, v in articles.items() if v},
+            RoomWeekdayCount: {k: v for k, v in weekdays.items() if v},
+            RoomHourlyCount: RollupService.hourly_deltas(changes),
+        }
+
+    @staticmethod
+    def hourly_deltas(changes):
+        """
+        Deltas del rollup horario: cada reserva suma (o resta, si es el valor previo)
+        1 en cada franja de [date_hour_start, date_hour_end).
+        """
+        keys, signs = [], []
+        for old, new in changes:
+            for key, sign in ((old, -1), (new, 1)):
+                if key is not None and key.date_hour_end is not None:
+                    keys.append(key)
+                    signs.append(sign)
+        if not keys:
+            return {}
+
+        room_labels, room_codes = np.unique([key.room_name for key in keys], return_inverse=True)
+        rows, slots = expand_hourly_slots(
+            [key.date_hour_start for key in keys], [key.date_hour_end for key in keys]
+        )
+        codes, slots, totals = sum_by_slot(room_codes[rows], slots, np.asarray(signs)[rows])
+        days, hours = split_slots(slots)
+
+        return {
+            (str(room_labels[code]), day, int(hour)): int(total)
+            for code, day, hour, total in zip(codes, days.astype(object), hours, totals)
+        }
+
+    @staticmethod
+    def apply_changes(db: Session, changes):
+        """
+        Aplica los deltas de los pares (old, new) dentro de la transacción actual.
+        Devuelve los deltas aplicados por tabla.
+        """
+        all_deltas = RollupService.compute_deltas(changes)
+        for model, deltas in all_deltas.items():
+            RollupService._apply_deltas(db, model, deltas)
+        return all_deltas
+
+    @staticmethod
+    def apply_change(db: Session, old: Optional[RollupKey], new: RollupKey):
+        return RollupService.apply_changes(db, [(old, new)])
+
+    @staticmethod
+    def _apply_deltas(db: Session, model, deltas):
+        """
+        Aplica los deltas de una tabla con incrementos atómicos en la base (no se pierden
+        updates concurrentes): los positivos con un upsert multi-fila y los negativos con
+        un UPDATE por lotes, borrando después los conteos que quedaron en cero.
+        """
+        table = model.__table__
+        key_columns = list(table.primary_key.columns)
+        increments = [(key, delta) for key, delta in deltas.items() if delta > 0]
+        decrements = [(key, delta) for key, delta in deltas.items() if delta < 0]
+
+        if increments:
+            upsert = RollupService.increment_statement(db, table)
+            if upsert is not None:
+                db.execute(upsert, [
+                    {**{col.name: value for col, value in zip(key_columns, key)}, "reservations": delta}
+                    for key, delta in increments
+                ])
+            else:
+                for key, delta in increments:
+                    RollupService._increment_one(db, table, key_columns, key, delta)
+
+        if decrements:
+            # Los parámetros de la clave no pueden llamarse como las columnas del SET
+            conditions = [col == bindparam(f"key_{col.name}") for col in key_columns]
+            keys = [{f"key_{col.name}": value for col, value in zip(key_columns, key)} for key, _ in decrements]
+            db.execute(
+                update(table).where(*conditions).values(reservations=table.c.reservations + bindparam("delta")),
+                [dict(params, delta=delta) for params, (_, delta) in zip(keys, decrements)],
+            )
+            # Un conteo en cero equivale a "sin reservas ese día": se elimina la fila
+            db.execute(delete(table).where(*conditions, table.c.reservations <= 0), keys)
+
+    @staticmethod
+    def increment_statement(db: Session, table, column: str = "reservations"):
+        """INSERT que suma `column` cuando la clave ya existe (None si el dialecto no tiene upsert)."""
+        dialect = db.get_bind().dialect.name
+
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+            stmt = dialect_insert(table)
+            return stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column]})
+
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+            stmt = dialect_insert(table)
+            return stmt.on_conflict_do_update(
+                index_elements=[col.name for col in table.primary_key.columns],
+                set_={column: table.c[column] + stmt.excluded[column]},
+            )
+
+        return None
+
+    @staticmethod
+    def _increment_one(db: Session, table, key_columns, key, delta):
+        conditions = [col == value for col, value in zip(key_columns, key)]
+        result = db.execute(
+            update(table).where(*conditions).values(reservations=table.c.reservations + delta)
+        )
+        if result.rowcount == 0:
+            values = {col.name: value for col, value in zip(key_columns, key)}
+            db.execute(insert(table).values(reservations=delta, **values))
+
+    @staticmethod
+    def compacted_before(db: Session) -> Optional[date]:
+        """Fecha de la última compactación del historial (None si reservation_history está completo)."""
+        return db.execute(
+            select(CompactionWatermark.compacted_before).where(CompactionWatermark.id == 1)
+        ).scalar()
+
+    @staticmethod
+    def rebuild(db: Session):
+        """
+        Recalcula todos los rollups (carga inicial o reparación).
+        Cada tabla se llena con un INSERT ... SELECT ... GROUP BY ejecutado en la base:
+        los de sala sobre reservation_history y el de artículos sobre reservation_articles.
+        Si el historial fue compactado, los días anteriores a la compactación ya no están
+        en reservation_history: se conservan y solo se recalculan los posteriores.
+        El rollup por weekday se deriva del diario, así incluye también los días compactados.
+        """
+        watermark = RollupService.compacted_before(db)
+
+        for model in (RoomDailyCount, ArticleDailyCount, RoomHourlyCount):
+            stmt = delete(model.__table__)
+            if watermark is not None:
+                stmt = stmt.where(model.__table__.c.date >= watermark)
+            db.execute(stmt)
+        db.execute(delete(RoomWeekdayCount.__table__))
+
+        day = sql_date(ReservationHistory.date_hour_start)
+        room_days = (
+            select(ReservationHistory.room_name, day, func.count())
+            .group_by(ReservationHistory.room_name, day)
+        )
+        article_days = (
+            select(ReservationArticle.article, ReservationArticle.date, func.count())
+            .group_by(ReservationArticle.article, ReservationArticle.date)
+        )
+        if watermark is not None:
+            room_days = room_days.where(ReservationHistory.date_hour_start >= datetime.combine(watermark, time.min))
+            article_days = article_days.where(ReservationArticle.date >= watermark)
+
+        db.execute(
+            insert(RoomDailyCount.__table__).from_select(["room_name", "date", "reservations"], room_days)
+        )
+        db.execute(
+            insert(ArticleDailyCount.__table__).from_select(["article", "date", "reservations"], article_days)
+        )
+
+        weekday = sql_weekday(RoomDailyCount.date)
+        db.execute(
+            insert(RoomWeekdayCount.__table__).from_select(
+                ["room_name", "weekday", "reservations"],
+                select(RoomDailyCount.room_name, weekday, func.sum(RoomDailyCount.reservations))
+                .group_by(RoomDailyCount.room_name, weekday),
+            )
+        )
+        RollupService._fill_hourly(db, watermark)
+
+        bump_data_version(db)
+        db.commit()
+
+    @staticmethod
+    def _fill_hourly(db: Session, watermark: Optional[date] = None):
+        """
+        Llena el rollup horario: las franjas de cada reserva se expanden con NumPy
+        (no hay una forma portable de hacerlo en SQL) y se insertan por bloques.
+        Con `watermark` solo se llenan los días desde esa fecha.
+        """
+        conditions = []
+        if watermark is not None:
+            conditions.append(ReservationHistory.date_hour_end > datetime.combine(watermark, time.min))
+        history = load_history(db, ["room_name", "date_hour_start", "date_hour_end"], *conditions)
+        if not len(history):
+            return
+
+        rows, slots = expand_hourly_slots(history["date_hour_start"], history["date_hour_end"])
+        codes, slots, totals = sum_by_slot(history["room_name"][rows], slots, np.ones(len(rows)))
+        days, hours = split_slots(slots)
+        if watermark is not None:
+            keep = days >= np.datetime64(watermark)
+            codes, days, hours, totals = codes[keep], days[keep], hours[keep], totals[keep]
+        labels = history.labels("room_name")
+
+        for i in range(0, len(codes), HOURLY_INSERT_CHUNK):
+            chunk = slice(i, i + HOURLY_INSERT_CHUNK)
+            db.execute(
+                insert(RoomHourlyCount.__table__),
+                [
+                    {"room_name": room, "date": day, "hour": int(hour), "reservations": int(total)}
+                    for room, day, hour, total in zip(
+                        labels[codes[chunk]], days[chunk].astype(object), hours[chunk], totals[chunk]
+                    )
+                ],
+            )
+
+    @staticmethod
+    def ensure_populated(db: Session):
+        """Construye los rollups si están vacíos pero ya existe historial (bases previas)."""
+        has_rollups = db.execute(select(RoomDailyCount.room_name).limit(1)).first()
+        has_history = db.execute(select(ReservationHistory.id).limit(1)).first()
+
+        if has_history and not has_rollups:
+            print("Building daily rollups from reservation_history")
+            RollupService.rebuild(db)
+            return
+
+        # Bases previas al rollup horario
+        has_hourly = db.execute(select(RoomHourlyCount.room_name).limit(1)).first()
+        if has_history and not has_hourly:
+            print("Building hourly rollup from reservation_history")
+            RollupService._fill_hourly(db, RollupService.compacted_before(db))
+            bump_data_version(db)
+            db.commit()
@@ -0,0 +1,63 @@
+"""
+Expresiones SQL dependientes del dialecto para agregar fechas en la base.
+Se compilan a la función nativa de cada motor (MySQL, SQLite, PostgreSQL).
+"""
+
+from sqlalchemy import cast, extract, func, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Date, Integer
+
+
+class sql_date(FunctionElement):
+    """Fecha (sin hora) de una columna DATETIME."""
+    type = Date()
+    inherit_cache = True
+    name = "sql_date"
+
+
+class sql_weekday(FunctionElement):
+    """Día de la semana de una columna DATETIME, 0=lunes .. 6=domingo (como date.weekday())."""
+    type = Integer()
+    inherit_cache = True
+    name = "sql_weekday"
+
+
+def _argument(element):
+    return list(element.clauses)[0]
+
+
+def _const(value: int):
+    # Constantes en línea (no parámetros) para que el SELECT y el GROUP BY coincidan
+    return literal_column(str(value), Integer)
+
+
+@compiles(sql_date)
+def _date_default(element, compiler, **kw):
+    return "CAST(%s AS DATE)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(sql_date, "mysql")
+@compiles(sql_date, "sqlite")
+def _date_function(element, compiler, **kw):
+    return "DATE(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(sql_weekday)
+def _weekday_default(element, compiler, **kw):
+    # ISODOW: 1=lunes .. 7=domingo (PostgreSQL)
+    isodow = cast(extract("isodow", _argument(element)), Integer)
+    return compiler.process(isodow - _const(1), **kw)
+
+
+@compiles(sql_weekday, "mysql")
+def _weekday_mysql(element, compiler, **kw):
+    # DAYOFWEEK: 1=domingo .. 7=sábado
+    return compiler.process((func.dayofweek(_argument(element)) + _const(5)) % _const(7), **kw)
+
+
+@compiles(sql_weekday, "sqlite")
+def _weekday_sqlite(element, compiler, **kw):
+    # strftime('%w'): 0=domingo .. 6=sábado
+    day = cast(func.strftime(literal_column("'%w'"), _argument(element)), Integer)
+    return compiler.process((day + _const(6)) % _const(7), **kw)
@@ -0,0 +1,161 @@
+"""
+Carga masiva de reservas desde archivos JSONL o CSV (un ReservationCreate por línea/fila).
+Lee el archivo en streaming, valida por lotes y guarda cada lote con un upsert multi-fila
+en su propia transacción. Después de cada lote confirmado se guarda un checkpoint con la
+posición en el archivo: si la carga se interrumpe, volver a ejecutarla continúa desde ahí
+(los upserts son idempotentes, así que repetir un lote no duplica datos).
+Al terminar se reentrenan los modelos de las salas y artículos cargados.
+
+Uso: python -m app.tools.backfill reservas.jsonl [--format csv] [--batch-size 1000]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from app.core.cache import commit_data_version
+from app.core.config import settings
+from app.core.database import SessionLocal, init_db
+from app.services.bulk_ingest_service import BulkIngestService, IngestReport
+from app.services.predict.model_registry import ModelRegistry
+
+
+def load_checkpoint(path: str, source: str):
+    """Posición guardada de una carga anterior del mismo archivo (None si no hay)."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("source") != source or checkpoint["offset"] > os.path.getsize(source):
+        raise SystemExit(f"Checkpoint {path} belongs to another file; delete it or use --restart")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint):
+    # Reemplazo atómico: un corte durante la escritura no deja un checkpoint a medias
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def read_batches(path: str, file_format: str, offset: int, batch_size: int):
+    """
+    Genera (registros, posición al terminar el lote) desde `offset`.
+    JSONL: líneas en bytes. CSV: dicts con las columnas del encabezado.
+    """
+    if file_format == "jsonl":
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                batch = [line for line in (f.readline() for _ in range(batch_size)) if line]
+                if not batch:
+                    return
+                yield batch, f.tell()
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            # readline (y no la iteración del archivo) para poder usar tell()
+            lines = iter(f.readline, "")
+            header = next(csv.reader(lines), None)
+            if header is None:
+                return
+            if offset:
+                f.seek(offset)
+            reader = csv.DictReader(lines, fieldnames=header)
+            while True:
+                batch = [row for _, row in zip(range(batch_size), reader)]
+                if not batch:
+                    return
+                yield batch, f.tell()
+
+
+def refresh_models(db, report: IngestReport):
+    """Reentrena los modelos de las claves que cambiaron (marcadas en trend_models_dirty)."""
+    if not report.stored:
+        return
+    refreshed = ModelRegistry.refresh_dirty(db)
+    commit_data_version(db)
+    print(f"Refreshed {refreshed} trend models", file=sys.stderr)
+
+
+def backfill(path: str, file_format: str, batch_size: int, checkpoint_path: str, restart: bool = False):
+    """Carga el archivo completo. Devuelve (IngestReport, error del lote que falló o None)."""
+    source = os.path.abspath(path)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    checkpoint = load_checkpoint(checkpoint_path, source) or {
+        "source": source, "offset": 0, "records": 0, "stored": 0, "invalid": 0,
+    }
+    if checkpoint["records"]:
+        print(f"Resuming {path} after {checkpoint['records']} records", file=sys.stderr)
+
+    report = IngestReport()
+    validate = BulkIngestService.validate_json_lines if file_format == "jsonl" else BulkIngestService.validate_records
+    # Número de línea del primer registro (los CSV tienen encabezado)
+    first_line = checkpoint["records"] + (1 if file_format == "jsonl" else 2)
+    started = time.perf_counter()
+
+    # Los modelos se reentrenan una vez, al final de la carga
+    init_db(refresh_models=False)
+    db = SessionLocal()
+    try:
+        for records, offset in read_batches(path, file_format, checkpoint["offset"], batch_size):
+            invalid_before = report.invalid
+            reservations = validate(records, first_line, report)
+            error = BulkIngestService.store(db, reservations, report)
+            if error is not None:
+                refresh_models(db, report)
+                return report, f"batch starting at line {first_line}: {error}"
+
+            first_line += len(records)
+            checkpoint.update(
+                offset=offset,
+                records=checkpoint["records"] + len(records),
+                stored=checkpoint["stored"] + len(reservations),
+                invalid=checkpoint["invalid"] + report.invalid - invalid_before,
+            )
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - started
+            print(
+                f"{checkpoint['records']} records, {report.stored} stored ({report.stored / elapsed:.0f}/s)",
+                file=sys.stderr,
+            )
+        refresh_models(db, report)
+    finally:
+        db.close()
+
+    # Carga completa: el próximo run empieza de cero
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return report, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load reservations from JSONL or CSV files")
+    parser.add_argument("path", help="JSONL (one ReservationCreate object per line) or CSV file")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="File format (by extension if omitted)")
+    parser.add_argument("--batch-size", type=int, default=settings.bulk_ingest_batch_size,
+                        help="Records validated and stored per transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file (<path>.checkpoint.json by default)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and load from the start")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or f"{args.path}.checkpoint.json"
+
+    report, error = backfill(args.path, file_format, max(args.batch_size, 1), checkpoint_path, args.restart)
+    json.dump(report.as_dict(), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if error is not None:
+        print(f"Backfill stopped at {error}. Run the command again to resume.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Benchmarks de los servicios de predicción sobre datos sintéticos (SQLite embebido).
+Uso: python -m benchmarks.run --sizes 10000 100000 1000000 --output results.json
+"""
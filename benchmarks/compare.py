@@ -0,0 +1,43 @@
+"""
+Compara dos reportes de benchmarks.run (por ejemplo, antes y después de un commit).
+Uso: python -m benchmarks.compare base.json new.json
+"""
+
+import argparse
+import json
+
+
+def load_results(path: str):
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], {(r["rows"], r["benchmark"]): r for r in report["results"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    base_meta, base = load_results(args.base)
+    new_meta, new = load_results(args.new)
+
+    print(f"base: {base_meta.get('revision')}  new: {new_meta.get('revision')}")
+    print(f"{'rows':>9}  {'benchmark':<36} {'base ms':>10} {'new ms':>10} {'ratio':>7} {'peak MiB':>9}")
+
+    for key in sorted(base.keys() & new.keys()):
+        rows, name = key
+        old_time = base[key]["wall_seconds_median"]
+        new_time = new[key]["wall_seconds_median"]
+        ratio = new_time / old_time if old_time else float("inf")
+        print(
+            f"{rows:>9}  {name:<36} {old_time * 1000:10.2f} {new_time * 1000:10.2f}"
+            f" {ratio:7.2f} {new[key]['peak_bytes'] / 2**20:9.2f}"
+        )
+
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{key[0]:>9}  {key[1]:<36} only in {'base' if key in base else 'new'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Presupuesto de tiempo de importación de la app.
+Importa `app.main` en un proceso nuevo, sin base de datos configurada, y verifica que:
+- no se cargan dependencias pesadas o de infraestructura (pandas, sklearn, pika),
+- el import completo entra en el presupuesto (por defecto 1500 ms).
+
+Uso: python -m benchmarks.import_time [--budget-ms 1500] [--module app.main]
+Sale con código 1 si se excede el presupuesto.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 1500
+
+# Módulos que no deben cargarse al importar la app (se importan al primer uso)
+FORBIDDEN_MODULES = ("pandas", "sklearn", "pika")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module: str, runs: int):
+    # Sin base de datos: el import no debe necesitarla
+    env = {k: v for k, v in os.environ.items() if not k.endswith("DATABASE_URL")}
+    env["RABBITMQ_ENABLED"] = "false"
+
+    samples = []
+    modules = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            capture_output=True, text=True, env=env, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        modules = result["modules"]
+
+    return samples, modules
+
+
+def slowest_imports(module: str, top: int):
+    """Módulos con mayor tiempo acumulado según `python -X importtime`."""
+    env = {k: v for k, v in os.environ.items() if not k.endswith("DATABASE_URL")}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    return [
+        {"module": name, "cumulative_ms": round(us / 1000, 1)}
+        for us, name in sorted(rows, reverse=True)[:top]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the cold import time of the app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to report")
+    args = parser.parse_args(argv)
+
+    samples, modules = measure_import(args.module, args.runs)
+    best_ms = min(samples) * 1000
+    forbidden = [m for m in FORBIDDEN_MODULES if m in modules]
+
+    report = {
+        "module": args.module,
+        "import_ms_min": round(best_ms, 1),
+        "import_ms_samples": [round(s * 1000, 1) for s in samples],
+        "budget_ms": args.budget_ms,
+        "within_budget": best_ms <= args.budget_ms,
+        "forbidden_modules_loaded": forbidden,
+        "slowest_imports": slowest_imports(args.module, args.top),
+    }
+    print(json.dumps(report, indent=2))
+
+    if forbidden or best_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Runner de benchmarks: mide tiempo de pared y pico de memoria de cada servicio
+de predicción y de cada ruta HTTP a distintos tamaños de historial.
+
+La base SQLite se llena de forma incremental (10k -> 100k -> 1M filas), así
+cada tamaño reutiliza las filas del anterior. El resultado es un JSON que se
+puede comparar entre commits con `python -m benchmarks.compare`.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Ventana de predicción usada por los benchmarks de ocupación
+WINDOW_DAYS = 7
+
+# Tamaño del lote de ingesta medido en cada tamaño de historial
+INGEST_BATCH_SIZE = 500
+
+# Semilla de los lotes de ingesta (fuera del rango de ids del historial)
+INGEST_ID_BASE = 10**9
+
+
+def measure(fn, repeat: int):
+    """Ejecuta fn `repeat` veces para el tiempo y una vez más con tracemalloc para el pico de memoria."""
+    # Calentamiento: imports diferidos y caché de sentencias de SQLAlchemy
+    fn()
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    # tracemalloc agrega overhead: el pico se mide en una corrida aparte
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_seconds_min": min(times),
+        "wall_seconds_median": statistics.median(times),
+        "peak_bytes": peak,
+        "repeat": repeat,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(db_path: str):
+    """Variables que la app lee al importarse: deben fijarse antes de importar app.*"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.pop("ANALYTICS_DATABASE_URL", None)
+    os.environ.pop("ADMIN_DATABASE_URL", None)
+    # Sin caché de resultados: cada repetición debe recalcular
+    os.environ["RESULT_CACHE_TTL_SECONDS"] = "0"
+    # Sin hilo de refresco: la ingesta reentrena los modelos en línea
+    os.environ["MODEL_REFRESH_INTERVAL_SECONDS"] = "0"
+
+
+def build_benchmarks(config, first_new_id: int, snapshot_dir: str):
+    """
+    Devuelve [(nombre, función)] para el tamaño actual de la base.
+    Los benchmarks `snapshot.*` leen del snapshot del historial en `snapshot_dir`; el resto, de la base.
+    """
+    from fastapi.testclient import TestClient
+    from app.core.cache import idempotency_cache
+    from app.core.config import settings
+    from app.core.database import SessionLocal
+    from app.main import create_app
+    from app.schemas.occupancy_schema import Occupancy
+    from app.schemas.sync_schema import ReservationCreate
+    from app.services.reservations_sinc import DataCollectorService
+    from app.services.rollup_service import RollupService
+    from app.services.predict.history_snapshot import history_snapshot
+    from app.services.predict.hourly_occupancy_service import HourlyOccupancyCube
+    from app.services.predict.model_registry import ModelRegistry
+    from app.services.predict.occupancy_service import OccupancyPredictionService
+    from app.services.predict.occupancy_ranking_service import OccupancyRankingService
+    from app.services.predict.seasonal_patterns_service import SeasonalPatternsService
+    from app.services.predict.trending_resources_service import TrendingResourcesService
+    from benchmarks.synthetic import generate_chunk
+
+    window_start = config.start + timedelta(days=config.days)
+    window = {
+        "date_hour_start": window_start.isoformat(),
+        "date_hour_end": (window_start + timedelta(days=WINDOW_DAYS)).isoformat(),
+    }
+    rooms = [f"Sala {i}" for i in range(config.rooms)]
+    occupancy = {"room_name": rooms[0], **window}
+    batch = [{"room_name": room, **window} for room in rooms]
+    hourly = {
+        "room_name": rooms[0],
+        "date_hour_start": window_start.isoformat(),
+        "date_hour_end": (window_start + timedelta(hours=12)).isoformat(),
+    }
+
+    # Lotes de ingesta: actualizan reservas existentes repartidas en todo el historial.
+    # Se alternan dos versiones para que cada repetición mueva conteos de verdad.
+    target_ids = np.linspace(1, first_new_id - 1, INGEST_BATCH_SIZE, dtype=np.int64).tolist()
+    ingest = []
+    for variant in range(2):
+        history, _ = generate_chunk(config, INGEST_ID_BASE * (variant + 1), INGEST_BATCH_SIZE)
+        ingest.append([
+            ReservationCreate(**dict(
+                row,
+                reservation_id=reservation_id,
+                articles=row["articles"].split(",") if row["articles"] else None,
+            ))
+            for reservation_id, row in zip(target_ids, history)
+        ])
+    ingest_calls = itertools.count()
+
+    def with_session(fn):
+        def run():
+            db = SessionLocal()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+        return run
+
+    def store_ingest(db, reservations):
+        results = DataCollectorService.store_batch(reservations, db)
+        errors = [r for r in results if r["status"] != "success"]
+        if errors:
+            raise RuntimeError(f"Ingest failed: {errors[0]}")
+
+    last_ingested = [ingest[0]]
+
+    def ingest_batch(db):
+        last_ingested[0] = ingest[next(ingest_calls) % 2]
+        store_ingest(db, last_ingested[0])
+
+    def ingest_unchanged(from_cache):
+        # Redelivery del último lote guardado: no escribe nada (con o sin la caché de idempotencia)
+        def run(db):
+            if not from_cache:
+                idempotency_cache.clear()
+            store_ingest(db, last_ingested[0])
+        return run
+
+    def with_snapshot(fn):
+        def run():
+            settings.history_snapshot_dir = snapshot_dir
+            try:
+                return fn()
+            finally:
+                settings.history_snapshot_dir = ""
+        return run
+
+    # Snapshot del tamaño actual para los benchmarks que leen de él
+    with_snapshot(with_session(history_snapshot.rebuild))()
+    since = config.start.date()
+
+    client = TestClient(create_app())
+
+    def request(method, path, body=None):
+        def run():
+            response = client.request(method, f"/api/v1{path}", json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text}")
+        return run
+
+    return [
+        ("pipeline.rollups_rebuild", with_session(RollupService.rebuild)),
+        ("pipeline.models_refresh_all", with_session(ModelRegistry.refresh_all)),
+        ("pipeline.ingest_store_batch", with_session(ingest_batch)),
+        ("pipeline.ingest_store_batch_unchanged", with_session(ingest_unchanged(from_cache=True))),
+        ("pipeline.ingest_store_batch_unchanged_db", with_session(ingest_unchanged(from_cache=False))),
+        ("service.predict_occupancy", with_session(
+            lambda db: OccupancyPredictionService(db).predict_occupancy(**occupancy)
+        )),
+        ("service.predict_occupancy_batch", with_session(
+            lambda db: OccupancyPredictionService(db).predict_occupancy_batch(
+                [Occupancy(**item) for item in batch]
+            )
+        )),
+        ("service.occupancy_ranking", with_session(
+            lambda db: OccupancyRankingService(db).predict_weekly_occupancy()
+        )),
+        ("service.trending_resources", with_session(
+            lambda db: TrendingResourcesService(db).analyze_trending()
+        )),
+        ("service.seasonal_patterns", with_session(
+            lambda db: SeasonalPatternsService(db).analyze_patterns()
+        )),
+        ("service.hourly_cube_load", with_session(lambda db: HourlyOccupancyCube().load(db))),
+        ("service.occupancy_ranking_since", with_session(
+            lambda db: OccupancyRankingService(db).predict_weekly_occupancy(since=since)
+        )),
+        ("snapshot.rebuild", with_snapshot(with_session(history_snapshot.rebuild))),
+        ("snapshot.ingest_store_batch", with_snapshot(with_session(ingest_batch))),
+        ("snapshot.occupancy_ranking_since", with_snapshot(with_session(
+            lambda db: OccupancyRankingService(db).predict_weekly_occupancy(since=since)
+        ))),
+        ("snapshot.trending_resources_since", with_snapshot(with_session(
+            lambda db: TrendingResourcesService(db).analyze_trending(since=since)
+        ))),
+        ("snapshot.seasonal_patterns", with_snapshot(with_session(
+            lambda db: SeasonalPatternsService(db).analyze_patterns()
+        ))),
+        ("snapshot.hourly_cube_load", with_snapshot(with_session(lambda db: HourlyOccupancyCube().load(db)))),
+        ("route.POST /occupancy", request("POST", "/occupancy", occupancy)),
+        ("route.POST /occupancy/batch", request("POST", "/occupancy/batch", batch)),
+        ("route.POST /occupancy/hourly", request("POST", "/occupancy/hourly", hourly)),
+        ("route.GET /occupancy-ranking", request("GET", "/occupancy-ranking")),
+        ("route.GET /trending-resources", request("GET", "/trending-resources")),
+        ("route.GET /seasonal-patterns", request("GET", "/seasonal-patterns")),
+    ]
+
+
+def run(sizes, config, repeat: int, only=None, workdir: str = None):
+    """
+    Llena la base por tamaños crecientes y mide cada benchmark. Requiere configure_environment().
+    El snapshot del historial se escribe en `workdir` (temporal por defecto).
+    """
+    from app.core.database import SessionLocal, init_db
+    from app.services.rollup_service import RollupService
+    from app.services.predict.model_registry import ModelRegistry
+    from benchmarks.synthetic import seed_history
+
+    init_db()
+
+    results = []
+    loaded = 0
+    for size in sorted(sizes):
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            seed_history(db, config, first_id=loaded + 1, count=size - loaded)
+            RollupService.rebuild(db)
+            ModelRegistry.refresh_all(db)
+        finally:
+            db.close()
+        loaded = size
+        print(f"Seeded {size} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        snapshot_dir = os.path.join(workdir or tempfile.mkdtemp(), "history_snapshot")
+        for name, fn in build_benchmarks(config, first_new_id=loaded + 1, snapshot_dir=snapshot_dir):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result = measure(fn, repeat)
+            results.append({"rows": size, "benchmark": name, **result})
+            print(
+                f"  {name:<36} {result['wall_seconds_median'] * 1000:10.2f} ms"
+                f" {result['peak_bytes'] / 2**20:9.2f} MiB",
+                file=sys.stderr,
+            )
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the prediction services on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="History sizes (rows)")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of room/article popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("--only", nargs="*", help="Run only benchmarks whose name contains one of these")
+    parser.add_argument("--workdir", help="Directory for the SQLite file (temporary by default)")
+    parser.add_argument("--output", help="JSON output file (stdout by default)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(args.workdir or tmp, "benchmark.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        configure_environment(db_path)
+
+        from benchmarks.synthetic import SyntheticConfig
+
+        config = SyntheticConfig(
+            rooms=args.rooms, articles=args.articles, days=args.days, skew=args.skew, seed=args.seed,
+        )
+        results = run(args.sizes, config, args.repeat, args.only, args.workdir or tmp)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "synthetic": config.as_dict(),
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
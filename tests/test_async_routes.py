@@ -0,0 +1,109 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+import app.core.database as database
+import app.main as main
+from app.core.cache import result_cache
+from app.core.config import settings
+from app.schemas.sync_schema import ReservationCreate
+from app.services.predict.model_registry import ModelRegistry
+from app.services.reservations_sinc import DataCollectorService
+
+ROOMS = ["Sala 1", "Sala 2", "Sala 3", "Sala 4", "Sala 5"]
+ARTICLES = [None, ["Proyector"], ["Parlante", "Proyector"], ["Pizarra"]]
+
+# (método, ruta, query, cuerpo)
+REQUESTS = [
+    ("post", "/api/v1/occupancy", {}, {"room_name": "Sala 2", "date_hour_start": "2025-04-07T00:00:00", "date_hour_end": "2025-04-11T23:00:00"}),
+    ("post", "/api/v1/occupancy", {}, {"room_name": "Nope", "date_hour_start": "2025-04-07T00:00:00", "date_hour_end": "2025-04-11T23:00:00"}),
+    ("post", "/api/v1/occupancy", {"lookback_days": 900}, {"room_name": "Sala 3", "date_hour_start": "2025-04-07T00:00:00", "date_hour_end": "2025-04-08T00:00:00"}),
+    ("post", "/api/v1/occupancy/batch", {}, [
+        {"room_name": room, "date_hour_start": "2025-04-07T00:00:00", "date_hour_end": "2025-04-09T00:00:00"}
+        for room in ROOMS + ["Nope"]
+    ]),
+    ("post", "/api/v1/occupancy/hourly", {}, {"room_name": "Sala 1", "date_hour_start": "2025-04-07T08:00:00", "date_hour_end": "2025-04-07T18:00:00"}),
+    ("post", "/api/v1/occupancy/hourly", {"lookback_days": 900}, {"room_name": "Sala 4", "date_hour_start": "2025-04-08T08:00:00", "date_hour_end": "2025-04-08T12:00:00"}),
+    ("get", "/api/v1/occupancy-ranking", {}, None),
+    ("get", "/api/v1/occupancy-ranking", {"rooms": ["Sala 1", "Sala 4"], "weekday": "tuesday"}, None),
+    ("get", "/api/v1/occupancy-ranking", {"since": "2025-03-01", "top_k": 3, "limit": 2}, None),
+    ("get", "/api/v1/occupancy-ranking", {"limit": 2, "format": "ndjson"}, None),
+    ("get", "/api/v1/occupancy-ranking", {"cursor": "not-a-cursor"}, None),
+    ("get", "/api/v1/trending-resources", {}, None),
+    ("get", "/api/v1/trending-resources", {"articles": ["Proyector"], "since": "2025-02-15"}, None),
+    ("get", "/api/v1/trending-resources", {"limit": 1, "format": "ndjson"}, None),
+    ("get", "/api/v1/seasonal-patterns", {}, None),
+    ("get", "/api/v1/seasonal-patterns", {"rooms": ["Sala 5"], "lookback_days": 900}, None),
+]
+
+
+def setUpModule():
+    global _directory, _saved, sync_client, async_client
+    _directory = tempfile.mkdtemp()
+    _saved = (settings.database_url, settings.async_mode, result_cache.ttl_seconds)
+    settings.database_url = f"sqlite:///{os.path.join(_directory, 'history.db')}"
+    database.engine = None
+    database.AsyncSessionLocal = None
+    database.init_db(refresh_models=False)
+    # Sin caché: cada app calcula su propio resultado
+    result_cache.ttl_seconds = 0
+
+    rnd = random.Random(9)
+    reservations = []
+    for i in range(300):
+        start = datetime(2025, 1, 6, 8) + timedelta(days=rnd.randrange(80), hours=rnd.randrange(10))
+        reservations.append(ReservationCreate(
+            reservation_id=i + 1, room_name=rnd.choice(ROOMS), people_email="a@b.c",
+            articles=rnd.choice(ARTICLES), date_hour_start=start,
+            date_hour_end=start + timedelta(hours=rnd.randint(1, 3)),
+        ))
+    db = database.SessionLocal()
+    try:
+        DataCollectorService.store_batch(reservations, db)
+        ModelRegistry.refresh_all(db)
+    finally:
+        db.close()
+
+    sync_client = TestClient(main.create_app())
+    settings.async_mode = True
+    async_client = TestClient(main.create_app())
+
+
+def tearDownModule():
+    async_client.close()
+    sync_client.close()
+    asyncio.run(database.dispose_async_database())
+    database.dispose_database()
+    database.engine = None
+    database.AsyncSessionLocal = None
+    settings.database_url, settings.async_mode, result_cache.ttl_seconds = _saved
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+class AsyncRoutesTest(unittest.TestCase):
+
+    def test_async_routes_answer_like_sync_routes(self):
+        statuses = set()
+        for method, path, params, body in REQUESTS:
+            with self.subTest(path=path, params=params):
+                expected = sync_client.request(method, path, params=params, json=body)
+                got = async_client.request(method, path, params=params, json=body)
+
+                self.assertEqual(got.status_code, expected.status_code)
+                self.assertEqual(got.headers.get("x-next-cursor"), expected.headers.get("x-next-cursor"))
+                self.assertEqual(got.headers["content-type"], expected.headers["content-type"])
+                self.assertEqual(got.text, expected.text)
+                statuses.add(got.status_code)
+
+        # Resultados, sala sin historial y cursor inválido
+        self.assertEqual(statuses, {200, 404, 422})
+        # Las rutas async leyeron con el driver async de SQLite
+        self.assertEqual(database.async_engine.url.drivername, "sqlite+aiosqlite")
+
+
+if __name__ == "__main__":
+    unittest.main()
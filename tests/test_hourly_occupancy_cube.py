@@ -0,0 +1,59 @@
+import unittest
+from datetime import date, timedelta
+import numpy as np
+from app.services.predict.hourly_occupancy_service import CUBE_GROWTH_DAYS, HOURS_PER_DAY, HourlyOccupancyCube
+
+
+def loaded_cube(first_day: date, n_days: int, rooms=("Sala 1",)):
+    """Cubo como si se hubiera cargado del rollup, sin base de datos."""
+    cube = HourlyOccupancyCube()
+    cube.rooms = {room: i for i, room in enumerate(rooms)}
+    cube.counts = np.zeros((len(rooms), n_days, HOURS_PER_DAY), dtype=np.int32)
+    cube.first_day = np.datetime64(first_day, "D")
+    cube._loaded_at = 0.0
+    return cube
+
+
+class ApplyDeltasTest(unittest.TestCase):
+
+    def test_grows_both_ends_of_day_axis(self):
+        start = date(2025, 3, 10)
+        cube = loaded_cube(start, 10)
+        cube.counts[0, 3, 9] = 2
+
+        before, after = start - timedelta(days=5), start + timedelta(days=12)
+        cube.apply_deltas({("Sala 1", before, 8): 1, ("Sala 1", after, 17): 3, ("Sala 2", after, 10): 1})
+
+        self.assertEqual(cube.first_day, np.datetime64(before, "D"))
+        # Al final se deja lugar libre para las próximas reservas futuras
+        self.assertEqual(cube.counts.shape, (2, 18 + CUBE_GROWTH_DAYS, HOURS_PER_DAY))
+        self.assertEqual(cube.counts[0, 0, 8], 1)
+        self.assertEqual(cube.counts[0, 17, 17], 3)
+        self.assertEqual(cube.counts[1, 17, 10], 1)
+        # Lo que ya estaba queda en el mismo día
+        self.assertEqual(cube.counts[0, 5 + 3, 9], 2)
+        self.assertEqual(int(cube.counts.sum()), 7)
+
+    def test_grows_only_after(self):
+        start = date(2025, 3, 10)
+        cube = loaded_cube(start, 10)
+        cube.apply_deltas({("Sala 1", start + timedelta(days=14), 12): 1})
+
+        self.assertEqual(cube.first_day, np.datetime64(start, "D"))
+        self.assertEqual(cube.counts.shape, (1, 15 + CUBE_GROWTH_DAYS, HOURS_PER_DAY))
+        self.assertEqual(cube.counts[0, 14, 12], 1)
+
+    def test_no_copy_while_within_headroom(self):
+        start = date(2025, 3, 10)
+        cube = loaded_cube(start, 10)
+        cube.apply_deltas({("Sala 1", start + timedelta(days=10), 12): 1})
+        counts = cube.counts
+
+        cube.apply_deltas({("Sala 1", start + timedelta(days=10 + CUBE_GROWTH_DAYS), 9): 1})
+
+        self.assertIs(cube.counts, counts)
+        self.assertEqual(cube.counts[0, 10 + CUBE_GROWTH_DAYS, 9], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import base64
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+import app.core.database as database
+import app.main as main
+from app.api.responses import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_bounds
+from app.core.cache import result_cache
+from app.core.config import settings
+from app.schemas.sync_schema import ReservationCreate
+from app.services.predict.model_registry import ModelRegistry
+from app.services.reservations_sinc import DataCollectorService
+
+ROOMS = [f"Sala {i}" for i in range(1, 8)]
+ARTICLES = [None, ["Proyector"], ["Parlante"], ["Pizarra", "Proyector"], ["Notebook"], ["Cable HDMI"]]
+
+
+def setUpModule():
+    global _directory, _database_url, client
+    _directory = tempfile.mkdtemp()
+    _database_url = settings.database_url
+    settings.database_url = f"sqlite:///{os.path.join(_directory, 'history.db')}"
+    database.engine = None
+    database.init_db(refresh_models=False)
+
+    rnd = random.Random(5)
+    reservations = []
+    for i in range(400):
+        start = datetime(2025, 1, 6, 8) + timedelta(days=rnd.randrange(70), hours=rnd.randrange(10))
+        reservations.append(ReservationCreate(
+            reservation_id=i + 1, room_name=rnd.choice(ROOMS), people_email="a@b.c",
+            articles=rnd.choice(ARTICLES), date_hour_start=start, date_hour_end=start + timedelta(hours=1),
+        ))
+    db = database.SessionLocal()
+    try:
+        DataCollectorService.store_batch(reservations, db)
+        ModelRegistry.refresh_all(db)
+    finally:
+        db.close()
+    # Resultados cacheados de otra base con la misma versión de datos
+    result_cache.clear()
+    client = TestClient(main.create_app())
+
+
+def tearDownModule():
+    client.close()
+    result_cache.clear()
+    database.dispose_database()
+    database.engine = None
+    settings.database_url = _database_url
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+def walk(path, params):
+    """Recorre todas las páginas siguiendo X-Next-Cursor. Devuelve los cuerpos JSON."""
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params=dict(params, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for offset in (0, 1, 57, 10 ** 6):
+            self.assertEqual(decode_cursor(encode_cursor(offset)), offset)
+        self.assertEqual(decode_cursor(None), 0)
+
+    def test_invalid_cursors(self):
+        negative = base64.urlsafe_b64encode(json.dumps({"offset": -1}).encode()).decode()
+        for cursor in ("not-a-cursor", negative, encode_cursor(3)[:-2]):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+
+    def test_page_bounds(self):
+        self.assertEqual(page_bounds(5, 2, None), (0, 2, encode_cursor(2)))
+        self.assertEqual(page_bounds(5, 2, encode_cursor(4)), (4, 5, None))
+        self.assertEqual(page_bounds(5, None, encode_cursor(1)), (1, 5, None))
+        # Un cursor más allá del final da una página vacía y ninguna siguiente
+        self.assertEqual(page_bounds(5, 2, encode_cursor(9)), (5, 5, None))
+
+
+class RankingPaginationTest(unittest.TestCase):
+
+    def test_pages_concatenate_to_full_ranking(self):
+        full = client.get("/api/v1/occupancy-ranking").json()["ranking"]
+        pages = walk("/api/v1/occupancy-ranking", {"limit": 3})
+
+        self.assertEqual(len(pages), 3)
+        for day, rooms in full.items():
+            self.assertEqual([entry for page in pages for entry in page["ranking"][day]], rooms)
+
+    def test_pages_of_filtered_top_k(self):
+        params = {"rooms": ROOMS[:5], "weekday": "wednesday", "top_k": 4}
+        full = client.get("/api/v1/occupancy-ranking", params=params).json()["ranking"]
+        pages = walk("/api/v1/occupancy-ranking", dict(params, limit=3))
+
+        self.assertEqual(list(full), ["wednesday"])
+        self.assertEqual(len(full["wednesday"]), 4)
+        self.assertEqual([len(page["ranking"]["wednesday"]) for page in pages], [3, 1])
+        self.assertEqual([e for page in pages for e in page["ranking"]["wednesday"]], full["wednesday"])
+
+    def test_ndjson_page(self):
+        full = client.get("/api/v1/occupancy-ranking").json()["ranking"]
+        response = client.get("/api/v1/occupancy-ranking", params={"limit": 2, "format": "ndjson"})
+
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        expected = [{"day": day, **entry} for day, rooms in full.items() for entry in rooms[:2]]
+        self.assertEqual(rows, expected)
+        self.assertEqual(response.headers[NEXT_CURSOR_HEADER], encode_cursor(2))
+
+    def test_invalid_cursor_is_422(self):
+        response = client.get("/api/v1/occupancy-ranking", params={"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 422)
+
+
+class TrendingPaginationTest(unittest.TestCase):
+
+    def test_pages_concatenate_to_full_list(self):
+        full = client.get("/api/v1/trending-resources").json()
+        pages = walk("/api/v1/trending-resources", {"limit": 2})
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([item for page in pages for item in page], full)
+
+    def test_top_k_then_pages(self):
+        full = client.get("/api/v1/trending-resources").json()
+        pages = walk("/api/v1/trending-resources", {"top_k": 3, "limit": 2})
+        self.assertEqual([item for page in pages for item in page], full[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import func, inspect, insert, select, text
+import app.core.database as database
+from app.core.cache import idempotency_cache
+from app.core.config import settings
+from app.schemas.history_schema import ReservationHistory
+from app.schemas.sync_schema import ReservationCreate
+from app.services.reservations_sinc import DataCollectorService
+from app.services.rollup_service import RollupService
+
+ROLLUP_TABLES = ["room_daily_counts", "article_daily_counts", "room_weekday_counts", "room_hourly_counts"]
+
+
+def setUpModule():
+    global _directory, _database_url
+    _directory = tempfile.mkdtemp()
+    _database_url = settings.database_url
+    settings.database_url = f"sqlite:///{os.path.join(_directory, 'history.db')}"
+    database.engine = None
+    database.init_db(refresh_models=False)
+
+
+def tearDownModule():
+    database.dispose_database()
+    database.engine = None
+    settings.database_url = _database_url
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+def reservation(reservation_id, room, day, hour, hours=1, articles=None):
+    start = datetime(2025, 3, day, hour)
+    return ReservationCreate(
+        reservation_id=reservation_id, room_name=room, people_email="a@b.c", articles=articles,
+        date_hour_start=start, date_hour_end=start.replace(hour=hour + hours),
+    )
+
+
+def rollups(db):
+    return {table: sorted(map(tuple, db.execute(text(f"SELECT * FROM {table}")))) for table in ROLLUP_TABLES}
+
+
+class UpsertRollupDeltasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = database.SessionLocal()
+        self.db.execute(ReservationHistory.__table__.delete())
+        self.db.commit()
+        RollupService.rebuild(self.db)
+        idempotency_cache.clear()
+
+    def tearDown(self):
+        self.db.close()
+
+    def assert_rollups_match_rebuild(self):
+        incremental = rollups(self.db)
+        RollupService.rebuild(self.db)
+        self.assertEqual(incremental, rollups(self.db))
+
+    def reservation_ids(self):
+        return self.db.execute(
+            select(ReservationHistory.reservation_id).order_by(ReservationHistory.reservation_id)
+        ).scalars().all()
+
+    def test_batch_then_updates_keep_one_row_and_move_counts(self):
+        results = DataCollectorService.store_batch([
+            reservation(1, "Sala 1", 3, 9, articles=["Proyector"]),
+            reservation(2, "Sala 1", 3, 11, hours=2),
+            reservation(3, "Sala 2", 4, 8, articles=["Proyector", "Parlante"]),
+        ], self.db)
+        self.assertTrue(all(r["status"] == "success" for r in results))
+
+        # Cambio de sala, de día y horario, y de artículos de reservas existentes
+        self.assertEqual(
+            DataCollectorService.store_data(reservation(1, "Sala 2", 5, 14, articles=["Parlante"]), self.db)["status"],
+            "success",
+        )
+        results = DataCollectorService.store_batch([
+            reservation(2, "Sala 3", 3, 11, hours=3),
+            reservation(3, "Sala 2", 4, 8),
+            reservation(4, "Sala 1", 6, 10),
+        ], self.db)
+        self.assertTrue(all(r["status"] == "success" for r in results))
+
+        self.assertEqual(self.reservation_ids(), [1, 2, 3, 4])
+        self.assert_rollups_match_rebuild()
+        # Las reservas que cambiaron de sala o de día ya no cuentan donde estaban
+        self.assertEqual(
+            rollups(self.db)["room_daily_counts"],
+            [("Sala 1", "2025-03-06", 1), ("Sala 2", "2025-03-04", 1), ("Sala 2", "2025-03-05", 1), ("Sala 3", "2025-03-03", 1)],
+        )
+
+    def test_repeated_reservation_in_batch_keeps_last_version(self):
+        DataCollectorService.store_batch([reservation(7, "Sala 1", 10, 9)], self.db)
+        results = DataCollectorService.store_batch([
+            reservation(7, "Sala 2", 11, 9),
+            reservation(8, "Sala 1", 11, 9),
+            reservation(7, "Sala 3", 12, 15, articles=["Pizarra"]),
+        ], self.db)
+
+        # Un resultado por reserva
+        self.assertEqual([(r["reservation_id"], r["status"]) for r in results], [(7, "success"), (8, "success")])
+        row = self.db.execute(
+            select(ReservationHistory.room_name, ReservationHistory.articles)
+            .where(ReservationHistory.reservation_id == 7)
+        ).one()
+        self.assertEqual(tuple(row), ("Sala 3", "Pizarra"))
+        self.assertEqual(self.reservation_ids(), [7, 8])
+        self.assert_rollups_match_rebuild()
+
+    def test_unchanged_reservation_does_not_move_counts(self):
+        first = reservation(9, "Sala 1", 13, 9, articles=["Proyector"])
+        DataCollectorService.store_batch([first], self.db)
+        before = rollups(self.db)
+        idempotency_cache.clear()
+
+        self.assertTrue(DataCollectorService.store_data(first, self.db).get("unchanged"))
+        self.assertTrue(DataCollectorService.store_batch([first], self.db)[0].get("unchanged"))
+        self.assertEqual(rollups(self.db), before)
+
+
+class UniqueIndexMigrationTest(unittest.TestCase):
+
+    def test_duplicates_removed_before_unique_index(self):
+        table = ReservationHistory.__table__
+        with database.engine.begin() as conn:
+            conn.execute(table.delete())
+            # Base previa: sin índice único y con la misma reserva guardada varias veces
+            conn.execute(text("DROP INDEX ix_reservation_history_reservation_id"))
+            conn.execute(text("CREATE INDEX ix_reservation_history_reservation_id ON reservation_history (reservation_id)"))
+            row = {"people_email": "a@b.c", "date_hour_end": datetime(2025, 3, 3, 10), "fetched_at": datetime(2025, 3, 1)}
+            conn.execute(insert(table), [
+                dict(row, reservation_id=1, room_name="Sala vieja", date_hour_start=datetime(2025, 3, 3, 9)),
+                dict(row, reservation_id=2, room_name="Sala 1", date_hour_start=datetime(2025, 3, 3, 9)),
+                dict(row, reservation_id=1, room_name="Sala nueva", date_hour_start=datetime(2025, 3, 3, 9)),
+            ])
+
+        self.assertEqual(database.ensure_indexes(), 1)
+
+        indexes = {ix["name"]: ix for ix in inspect(database.engine).get_indexes("reservation_history")}
+        self.assertTrue(indexes["ix_reservation_history_reservation_id"]["unique"])
+        with database.engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.reservation_id, table.c.room_name).order_by(table.c.reservation_id)
+            ).all()
+            self.assertEqual([tuple(r) for r in rows], [(1, "Sala nueva"), (2, "Sala 1")])
+            self.assertEqual(conn.execute(select(func.count()).select_from(table)).scalar(), 2)
+        # Nada que migrar la segunda vez
+        self.assertEqual(database.ensure_indexes(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
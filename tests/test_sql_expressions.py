@@ -0,0 +1,71 @@
+import sqlite3
+import unittest
+from datetime import date, datetime, timedelta
+from sqlalchemy import column, create_engine, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.types import DateTime
+from app.services.sql_expressions import sql_date, sql_weekday
+
+# Una semana completa (lunes 2025-03-03 .. domingo 2025-03-09), a distintas horas
+WEEK = [datetime(2025, 3, 3, 8) + timedelta(days=i, hours=2 * i) for i in range(7)]
+
+
+def compiled(expression, dialect) -> str:
+    return str(expression.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+class SqlWeekdayTest(unittest.TestCase):
+
+    def test_sqlite_matches_date_weekday(self):
+        engine = create_engine("sqlite://")
+        with engine.connect() as conn:
+            for moment in WEEK:
+                with self.subTest(day=moment.date()):
+                    weekday = conn.execute(select(sql_weekday(moment))).scalar()
+                    self.assertEqual(weekday, moment.weekday())
+
+    def test_mysql_mapping_of_dayofweek(self):
+        sql = compiled(sql_weekday(column("d", DateTime)), mysql.dialect())
+        self.assertEqual(sql, "(dayofweek(d) + 5) %% 7")
+        # DAYOFWEEK de MySQL: 1=domingo .. 7=sábado
+        self.assert_evaluates_to_weekday(sql.replace("%%", "%"), "dayofweek", lambda d: d.isoweekday() % 7 + 1)
+
+    def test_postgresql_mapping_of_isodow(self):
+        sql = compiled(sql_weekday(column("d", DateTime)), postgresql.dialect())
+        self.assertEqual(sql, "CAST(EXTRACT(isodow FROM d) AS INTEGER) - 1")
+        # EXTRACT(isodow) de PostgreSQL: 1=lunes .. 7=domingo
+        self.assert_evaluates_to_weekday(
+            sql.replace("EXTRACT(isodow FROM d)", "isodow(d)"), "isodow", lambda d: d.isoweekday()
+        )
+
+    def assert_evaluates_to_weekday(self, sql: str, function: str, native):
+        """Evalúa la expresión compilada en SQLite, con la función nativa del motor emulada."""
+        conn = sqlite3.connect(":memory:")
+        conn.create_function(function, 1, lambda d: native(date.fromisoformat(d[:10])))
+        for moment in WEEK:
+            with self.subTest(day=moment.date()):
+                weekday = conn.execute(f"SELECT {sql} FROM (SELECT ? AS d)", (moment.isoformat(" "),))
+                self.assertEqual(weekday.fetchone()[0], moment.weekday())
+
+    def test_constants_are_inlined_for_group_by(self):
+        for dialect in (mysql.dialect(), postgresql.dialect(), sqlite.dialect()):
+            with self.subTest(dialect=dialect.name):
+                self.assertEqual(sql_weekday(column("d", DateTime)).compile(dialect=dialect).params, {})
+
+
+class SqlDateTest(unittest.TestCase):
+
+    def test_per_dialect(self):
+        d = column("d", DateTime)
+        self.assertEqual(compiled(sql_date(d), mysql.dialect()), "DATE(d)")
+        self.assertEqual(compiled(sql_date(d), sqlite.dialect()), "DATE(d)")
+        self.assertEqual(compiled(sql_date(d), postgresql.dialect()), "CAST(d AS DATE)")
+
+    def test_sqlite_drops_time(self):
+        engine = create_engine("sqlite://")
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(select(sql_date(datetime(2025, 3, 9, 23, 30)))).scalar(), date(2025, 3, 9))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import unittest
+from datetime import date, datetime, timedelta
+import numpy as np
+from app.services.predict.history_loader import ColumnarResult
+from app.services.predict.model_registry import DEFAULT_ROOM_CAPACITY, ModelRegistry
+from app.services.predict.occupancy_ranking_service import N_FUTURE_DAYS, OccupancyRankingService
+from app.services.predict.occupancy_service import OccupancyPredictionService
+from app.services.predict.trend_engine import fit_linear_trends
+from app.services.predict.trending_resources_service import TrendingResourcesService
+
+try:
+    from sklearn.linear_model import LinearRegression
+except ImportError:
+    LinearRegression = None
+
+# Series diarias fijas por clave: 1, 2 y 3 puntos (fallbacks) y series más largas con huecos.
+# Ningún resultado cae justo en la mitad de un redondeo a 2 decimales: ahí la diferencia en el
+# último bit entre LinearRegression y el ajuste agrupado puede cambiar el valor informado.
+SERIES = {
+    "Sala A": [(date(2025, 3, 3), 4.0)],
+    "Sala B": [(date(2025, 3, 4), 2.0), (date(2025, 3, 6), 7.0)],
+    "Sala C": [(date(2025, 3, 3), 5.0), (date(2025, 3, 5), 1.0), (date(2025, 3, 10), 7.0)],
+    "Sala D": [(date(2025, 2, 1) + timedelta(days=d), float(v)) for d, v in
+               zip([0, 1, 2, 4, 7, 8, 9, 13, 14, 20, 21, 27], [3, 5, 4, 8, 6, 9, 12, 10, 14, 13, 17, 16])],
+    "Sala E": [(date(2025, 1, 6) + timedelta(days=d), float(v)) for d, v in
+               zip(range(0, 40, 3), [20, 18, 19, 15, 14, 16, 11, 9, 10, 7, 6, 4, 5, 2])],
+}
+
+
+def linear_regression(y):
+    """Recta de referencia y = intercept + slope * t con t = 0..n-1 (LinearRegression si está instalado)."""
+    t = np.arange(len(y), dtype=np.float64)
+    if LinearRegression is not None:
+        model = LinearRegression().fit(t.reshape(-1, 1), y)
+        return float(model.coef_[0]), float(model.intercept_)
+    slope, intercept = np.polyfit(t, y, 1)
+    return float(slope), float(intercept)
+
+
+def history_of(series):
+    """ColumnarResult como lo devuelve load_columns sobre un rollup diario (ordenado por clave y fecha)."""
+    labels = sorted(series)
+    rows = [(code, day, count) for code, key in enumerate(labels) for day, count in series[key]]
+    data = {
+        "key": np.array([r[0] for r in rows], dtype=np.int32),
+        "date": np.array([r[1] for r in rows], dtype="datetime64[D]"),
+        "count": np.array([r[2] for r in rows], dtype=np.float64),
+    }
+    return ColumnarResult(data, {"key": labels})
+
+
+def baseline_denom(y):
+    return max(float(np.percentile(y, 90)), float(y.max()), DEFAULT_ROOM_CAPACITY, 1.0)
+
+
+def baseline_ranking(series):
+    """Ranking semanal como se calculaba con un LinearRegression por sala."""
+    days = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+    expected = {}
+    for room in sorted(series):
+        dates = [d for d, _ in series[room]]
+        y = np.array([v for _, v in series[room]])
+        if len(y) < 3:
+            by_weekday = {}
+            for d, v in series[room]:
+                by_weekday.setdefault(d.weekday(), []).append(v)
+            preds = [
+                float(np.mean(by_weekday.get((dates[-1] + timedelta(days=i)).weekday(), y)))
+                for i in range(1, N_FUTURE_DAYS + 1)
+            ]
+        else:
+            slope, intercept = linear_regression(y)
+            preds = [intercept + slope * t for t in range(len(y), len(y) + N_FUTURE_DAYS)]
+        preds = np.clip(preds, 0, None)
+
+        by_weekday = {wk: [] for wk in range(7)}
+        for i in range(N_FUTURE_DAYS):
+            by_weekday[(dates[-1] + timedelta(days=i + 1)).weekday()].append(preds[i])
+        denom = baseline_denom(y)
+        expected[room] = {
+            wk: min(round(float(np.mean(by_weekday[wk])) / denom, 2), 1.0) if by_weekday[wk] else 0.0
+            for wk in range(5)
+        }
+
+    return {"ranking": {
+        day: sorted(
+            [{"room": room, "expected_occupancy": values[i]} for room, values in expected.items()],
+            key=lambda x: x["expected_occupancy"], reverse=True,
+        )
+        for i, day in enumerate(days)
+    }}
+
+
+def baseline_trending(series):
+    """Tendencia por artículo como se calculaba con un LinearRegression por artículo."""
+    results = []
+    for article in sorted(series):
+        y = np.array([v for _, v in series[article]])
+        if len(y) < 2:
+            continue
+        if len(y) < 3:
+            change_pct = ((y[-1] - y[0]) / max(y[0], 1)) * 100
+            trust = 0.4
+        else:
+            slope, _ = linear_regression(y)
+            change_pct = (slope / max(np.mean(y), 1)) * 100
+            trust = min(0.3 + len(y) * 0.1, 0.95)
+        results.append({
+            "article": article,
+            "trend": f"{'+' if change_pct >= 0 else ''}{round(change_pct, 2)}%",
+            "trust": round(trust, 2),
+        })
+    return sorted(results, key=lambda x: float(x["trend"].replace("%", "")), reverse=True)
+
+
+def baseline_occupancy(series, room, start: datetime, end: datetime):
+    """Probabilidad de ocupación como se calculaba con un LinearRegression por sala."""
+    y = np.array([v for _, v in series[room]])
+    if len(y) < 2:
+        mean_pred = float(y.mean())
+    else:
+        slope, intercept = linear_regression(y)
+        t_future = np.arange(len(y), len(y) + (end - start).days + 1)
+        mean_pred = float(np.mean(np.clip(intercept + slope * t_future, 0, None)))
+    probability = min(mean_pred / baseline_denom(y), 1.0)
+    return {
+        "room": room,
+        "occupation_probability": round(probability, 2),
+        "trend": OccupancyPredictionService.trend_of(probability),
+    }
+
+
+class FitLinearTrendsTest(unittest.TestCase):
+
+    def test_matches_linear_regression_per_group(self):
+        history = history_of(SERIES)
+        fit = fit_linear_trends(history["key"], history["count"], len(SERIES))
+
+        for i, key in enumerate(sorted(SERIES)):
+            y = np.array([v for _, v in SERIES[key]])
+            self.assertEqual(fit.n[i], len(y))
+            self.assertAlmostEqual(fit.mean[i], y.mean())
+            self.assertEqual(fit.maximum[i], y.max())
+            if len(y) == 1:
+                # Un solo punto: sin pendiente, la recta es la media
+                self.assertEqual(fit.slope[i], 0.0)
+                self.assertAlmostEqual(fit.intercept[i], y[0])
+                continue
+            slope, intercept = linear_regression(y)
+            self.assertAlmostEqual(fit.slope[i], slope, places=9)
+            self.assertAlmostEqual(fit.intercept[i], intercept, places=9)
+
+    def test_groups_in_any_row_order(self):
+        # Las filas de distintos grupos pueden venir intercaladas si cada grupo está en orden cronológico
+        codes = np.array([1, 0, 1, 2, 0, 1, 2, 2])
+        y = np.array([3.0, 1.0, 5.0, 9.0, 2.0, 4.0, 7.0, 8.0])
+        fit = fit_linear_trends(codes, y, 3)
+
+        for group in range(3):
+            slope, intercept = linear_regression(y[codes == group])
+            self.assertAlmostEqual(fit.slope[group], slope, places=9)
+            self.assertAlmostEqual(fit.intercept[group], intercept, places=9)
+            np.testing.assert_array_equal(fit.rows_of(group), np.flatnonzero(codes == group))
+
+
+class ServicesMatchBaselineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.models = ModelRegistry._fit_models("room", history_of(SERIES))
+
+    def test_ranking(self):
+        self.assertEqual(OccupancyRankingService.rank_models(self.models), baseline_ranking(SERIES))
+
+    def test_ranking_top_k_is_prefix_of_full_ranking(self):
+        full = baseline_ranking(SERIES)["ranking"]
+        result = OccupancyRankingService.rank_models(self.models, ["tuesday"], top_k=2)
+        self.assertEqual(result, {"ranking": {"tuesday": full["tuesday"][:2]}})
+
+    def test_trending(self):
+        models = ModelRegistry._fit_models("article", history_of(SERIES))
+        self.assertEqual(TrendingResourcesService.rank_models(models), baseline_trending(SERIES))
+
+    def test_occupancy(self):
+        start, end = datetime(2025, 3, 17, 9), datetime(2025, 3, 21, 18)
+        for model in self.models:
+            with self.subTest(room=model["key"]):
+                self.assertEqual(
+                    OccupancyPredictionService.predict_from_fit(model["key"], model, start, end),
+                    baseline_occupancy(SERIES, model["key"], start, end),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()